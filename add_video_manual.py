@@ -84,4 +84,6 @@ def main():
     print(f"\n✨ 任務完成！影片 「{video_info['title']}」 已新增。")
 
 if __name__ == "__main__":
+    from tasks import log
+    log.setup("add_video_manual")
     main()
@@ -0,0 +1,78 @@
+"""
+Faults - stand-in 伺服器共用的延遲與錯誤注入
+每一類端點 (route) 一組設定：固定延遲 + 隨機抖動，以及以某個機率回傳錯誤狀態碼。
+亂數以 seed 固定，同樣的設定與請求順序得到同樣的結果。
+
+規格字串 (CLI 的 --fault 參數)：
+    rss:latency=0.05,jitter=0.02,error_rate=0.01,status=503
+"""
+
+import time
+import random
+import threading
+
+
+class Fault:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, status: int = 503):
+        """
+        :param latency: 每個請求固定延遲 (秒)
+        :param jitter: 額外的隨機延遲上限 (秒)
+        :param error_rate: 回傳錯誤的機率 (0~1)
+        :param status: 錯誤時的 HTTP 狀態碼
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.status = status
+
+    def to_dict(self) -> dict:
+        return {"latency": self.latency, "jitter": self.jitter, "error_rate": self.error_rate, "status": self.status}
+
+
+def parse_fault(spec: str) -> tuple[str, Fault]:
+    """'rss:latency=0.05,error_rate=0.01' -> ('rss', Fault(...))"""
+    route, _, options = spec.partition(":")
+    if not route or not options:
+        raise ValueError(f"invalid fault spec: {spec!r} (expected route:key=value,...)")
+    fields = {}
+    for option in options.split(","):
+        key, _, value = option.partition("=")
+        key = key.strip()
+        if key not in ("latency", "jitter", "error_rate", "status"):
+            raise ValueError(f"unknown fault option: {key!r}")
+        fields[key] = int(value) if key == "status" else float(value)
+    return route.strip(), Fault(**fields)
+
+
+class FaultInjector:
+    def __init__(self, faults: dict[str, Fault] | None = None, seed: int = 0):
+        self.faults = dict(faults or {})
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = {}  # route -> 請求數
+        self.injected = {}  # route -> 注入的錯誤數
+
+    def apply(self, route: str) -> int | None:
+        """
+        在處理請求前呼叫：依設定睡眠，需要注入錯誤時回傳狀態碼，否則回傳 None。
+        """
+        fault = self.faults.get(route) or self.faults.get("*")
+        with self._lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            if fault is None:
+                return None
+            delay = fault.latency + self._random.uniform(0, fault.jitter)
+            failed = self._random.random() < fault.error_rate
+            if failed:
+                self.injected[route] = self.injected.get(route, 0) + 1
+        if delay > 0:
+            time.sleep(delay)
+        return fault.status if failed else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "injected_errors": dict(self.injected),
+                "faults": {route: fault.to_dict() for route, fault in self.faults.items()},
+            }
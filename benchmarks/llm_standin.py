@@ -0,0 +1,314 @@
+"""
+LLM Stand-in - 本機模擬 OpenAI 相容 API 的測試伺服器 (只用標準函式庫)
+支援：
+- POST /v1/chat/completions (含 stream=True 的 SSE)
+- POST /v1/files、GET /v1/files/{id}、GET /v1/files/{id}/content
+- POST /v1/batches、GET /v1/batches、GET /v1/batches/{id}、POST /v1/batches/{id}/cancel
+回應內容是根據 prompt 產生的固定格式 Markdown 摘要，不呼叫任何真正的模型。
+可模擬延遲 (--ttft 第一個 token 前的等待、--chunk-delay 每個串流 chunk 的間隔)
+與錯誤 (--fault chat:error_rate=0.05,status=429，見 benchmarks/faults.py)。
+
+用法：
+    python -m benchmarks.llm_standin --port 8765 --batch-delay 2
+    python -m benchmarks.llm_standin --ttft 0.4 --chunk-delay 0.02 --fault chat:error_rate=0.02
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 LLM_API_KEY=standin python -m tasks.batch_summarizer submit
+"""
+
+import json
+import time
+import uuid
+import threading
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from benchmarks.faults import FaultInjector, parse_fault
+
+# 串流回應每個 chunk 的字元數
+CHUNK_CHARS = 16
+
+
+class StandinState:
+    def __init__(self, batch_delay: float = 2.0, ttft: float = 0.0, chunk_delay: float = 0.0,
+                 faults: FaultInjector | None = None):
+        self.batch_delay = batch_delay
+        self.ttft = ttft
+        self.chunk_delay = chunk_delay
+        self.faults = faults or FaultInjector()
+        self.files = {}    # id -> {'meta': dict, 'content': bytes}
+        self.batches = {}  # id -> dict
+        self.lock = threading.Lock()
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> dict:
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        meta = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[file_id] = {"meta": meta, "content": content}
+        return meta
+
+
+def fake_completion_text(messages: list[dict]) -> str:
+    """依最後一則 user 訊息產生固定格式的摘要 (長度與輸入大致成比例)"""
+    prompt = ""
+    for message in reversed(messages or []):
+        if message.get("role") == "user":
+            prompt = str(message.get("content", ""))
+            break
+    excerpt = " ".join(prompt.split()[-40:])[:200]
+    return (
+        "## 內容摘要\n"
+        f"(stand-in) 本段內容約 {len(prompt)} 字元。{excerpt}\n\n"
+        "## 主要問題\n* 模擬問題一\n* 模擬問題二\n\n"
+        "## 有條理的內容整理\n**[模擬類別]**\n* 模擬細節\n\n"
+        "## 精煉亮點\n模擬行動指引"
+    )
+
+
+def completion_body(request: dict) -> dict:
+    content = fake_completion_text(request.get("messages"))
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages") or []) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "standin"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def run_batch(state: StandinState, batch_id: str) -> None:
+    """背景處理 batch：validating -> in_progress -> finalizing -> completed"""
+    with state.lock:
+        batch = state.batches[batch_id]
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        input_content = state.files[batch["input_file_id"]]["content"]
+    time.sleep(state.batch_delay)
+
+    outputs, errors = [], []
+    for line in input_content.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            body = completion_body(item["body"])
+            outputs.append({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": item.get("custom_id"),
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": body},
+                "error": None,
+            })
+        except (ValueError, KeyError) as e:
+            errors.append({"custom_id": None, "response": None, "error": {"code": "invalid_request", "message": str(e)}})
+
+    with state.lock:
+        if batch["status"] == "cancelling":
+            batch["status"] = "cancelled"
+            batch["cancelled_at"] = int(time.time())
+            return
+        batch["status"] = "finalizing"
+    output = state.add_file(f"{batch_id}_output.jsonl", "batch_output",
+                            "".join(json.dumps(o, ensure_ascii=False) + "\n" for o in outputs).encode("utf-8"))
+    error_file = None
+    if errors:
+        error_file = state.add_file(f"{batch_id}_errors.jsonl", "batch_output",
+                                    "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in errors).encode("utf-8"))
+    with state.lock:
+        batch.update(
+            status="completed",
+            completed_at=int(time.time()),
+            output_file_id=output["id"],
+            error_file_id=error_file["id"] if error_file else None,
+            request_counts={"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)},
+        )
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    state: StandinState = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self) -> None:
+        self._send_json(404, {"error": {"message": f"Unknown route {self.command} {self.path}", "type": "invalid_request_error"}})
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _path_parts(self) -> list[str]:
+        path = urlparse(self.path).path
+        if path.startswith("/v1"):
+            path = path[3:]
+        return [p for p in path.split("/") if p]
+
+    def do_GET(self):
+        parts = self._path_parts()
+        state = self.state
+        with state.lock:
+            if parts == ["batches"]:
+                data = sorted(state.batches.values(), key=lambda b: b["created_at"], reverse=True)
+                return self._send_json(200, {"object": "list", "data": [dict(b) for b in data], "has_more": False})
+            if len(parts) == 2 and parts[0] == "batches" and parts[1] in state.batches:
+                return self._send_json(200, dict(state.batches[parts[1]]))
+            if len(parts) == 2 and parts[0] == "files" and parts[1] in state.files:
+                return self._send_json(200, state.files[parts[1]]["meta"])
+            if len(parts) == 3 and parts[0] == "files" and parts[2] == "content" and parts[1] in state.files:
+                content = state.files[parts[1]]["content"]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+        self._not_found()
+
+    def do_POST(self):
+        parts = self._path_parts()
+        body = self._read_body()
+        if parts == ["chat", "completions"]:
+            return self._chat_completions(json.loads(body or b"{}"))
+        if parts == ["files"]:
+            return self._upload_file(body)
+        if parts == ["batches"]:
+            return self._create_batch(json.loads(body or b"{}"))
+        if len(parts) == 3 and parts[0] == "batches" and parts[2] == "cancel":
+            with self.state.lock:
+                batch = self.state.batches.get(parts[1])
+                if batch is not None:
+                    if batch["status"] in ("validating", "in_progress"):
+                        batch["status"] = "cancelling"
+                    return self._send_json(200, dict(batch))
+        self._not_found()
+
+    def _chat_completions(self, request: dict) -> None:
+        state = self.state
+        status = state.faults.apply("chat")
+        if status is not None:
+            return self._send_json(status, {"error": {"message": "injected failure", "type": "server_error"}})
+        body = completion_body(request)
+        content = body["choices"][0]["message"]["content"]
+        if not request.get("stream"):
+            time.sleep(state.ttft + state.chunk_delay * (len(content) // CHUNK_CHARS + 1))
+            return self._send_json(200, body)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        time.sleep(state.ttft)
+        for start in range(0, len(content), CHUNK_CHARS):
+            if start and state.chunk_delay:
+                time.sleep(state.chunk_delay)
+            chunk = {
+                "id": body["id"],
+                "object": "chat.completion.chunk",
+                "created": body["created"],
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": content[start:start + CHUNK_CHARS]}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        if (request.get("stream_options") or {}).get("include_usage"):
+            # 與 OpenAI 相同：最後一個 chunk 不含 choices，只有 usage
+            usage_chunk = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"],
+                           "model": body["model"], "choices": [], "usage": body["usage"]}
+            self.wfile.write(f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _upload_file(self, body: bytes) -> None:
+        # multipart/form-data：以 email parser 解析 (標準函式庫沒有現成的 multipart 解析器)
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=default_policy).parsebytes(header + body)
+        purpose, filename, content = "batch", "upload.jsonl", b""
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "purpose":
+                purpose = part.get_content().strip() if part.get_content_maintype() == "text" else part.get_payload(decode=True).decode()
+            elif name == "file":
+                filename = part.get_filename() or filename
+                content = part.get_payload(decode=True) or b""
+        self._send_json(200, self.state.add_file(filename, purpose, content))
+
+    def _create_batch(self, request: dict) -> None:
+        state = self.state
+        with state.lock:
+            if request.get("input_file_id") not in state.files:
+                return self._send_json(400, {"error": {"message": "input_file_id not found", "type": "invalid_request_error"}})
+            batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+            batch = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request.get("endpoint"),
+                "input_file_id": request["input_file_id"],
+                "completion_window": request.get("completion_window", "24h"),
+                "status": "validating",
+                "output_file_id": None,
+                "error_file_id": None,
+                "errors": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "metadata": request.get("metadata"),
+            }
+            state.batches[batch_id] = batch
+        threading.Thread(target=run_batch, args=(state, batch_id), daemon=True).start()
+        self._send_json(200, dict(batch))
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, batch_delay: float = 2.0, ttft: float = 0.0,
+                chunk_delay: float = 0.0, faults: FaultInjector | None = None) -> ThreadingHTTPServer:
+    """建立 (尚未啟動的) stand-in 伺服器；port=0 時自動選擇可用的 port。狀態在 server.RequestHandlerClass.state"""
+    state = StandinState(batch_delay, ttft=ttft, chunk_delay=chunk_delay, faults=faults)
+    handler = type("BoundStandinHandler", (StandinHandler,), {"state": state})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="每個 batch 的模擬處理秒數")
+    parser.add_argument("--ttft", type=float, default=0.0, help="第一個 token 前的延遲 (秒)")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="串流 chunk 之間的延遲 (秒)")
+    parser.add_argument("--fault", action="append", default=[], help="錯誤注入，例如 chat:error_rate=0.05,status=429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faults = FaultInjector(dict(parse_fault(spec) for spec in args.fault), seed=args.seed)
+    server = make_server(args.host, args.port, args.batch_delay, args.ttft, args.chunk_delay, faults)
+    print(f"🧪 LLM stand-in 伺服器啟動: http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,461 @@
+"""
+Benchmark - 以本機 stand-in 取代 YouTube 與 LLM 的端到端效能測試
+情境：
+- sweep：N 個頻道的 check_updates。冷啟動 (解析 channel_id、每個頻道處理最新一部) 之後，
+  每個頻道上傳 --new-videos 部新影片再跑一次 (穩定狀態)
+- videos_api：videos.json 有 N 部影片時 GET /api/videos 的延遲 (循序與並行)
+- chat：--chat-streams 個同時進行的 /api/chat 串流 (第一個位元組時間、完成時間)
+所有狀態 (videos.json、SQLite、逐字稿、logs) 寫在暫存目錄，不影響專案資料，也不會連到真正的 YouTube 或 LLM。
+結果輸出為 JSON；key_metrics 可與先前的結果比較 (--baseline)，退化超過 --max-regression 時 exit 1。
+
+用法：
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --scenarios sweep --channels 50 --new-videos 2 --llm-ttft 0.5
+    python -m benchmarks.run --youtube-fault "*:latency=0.05" --llm-fault chat:error_rate=0.05,status=429
+    python -m benchmarks.run --baseline bench.json --max-regression 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from benchmarks import llm_standin, youtube_standin
+from benchmarks.faults import FaultInjector, parse_fault
+
+SCENARIOS = ("sweep", "videos_api", "chat")
+CHAT_VIDEO_ID = "benchchat01"
+CHAT_QUESTION = "請用三點整理這部影片的重點"
+
+
+def _percentiles(values: list[float]) -> dict:
+    """秒 -> 毫秒的平均與百分位數"""
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(p):
+        return round(values[min(len(values) - 1, int(round(p * (len(values) - 1))))] * 1000, 2)
+
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": pick(0.5),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(values[-1] * 1000, 2),
+    }
+
+
+def _metric(value, better: str, unit: str) -> dict:
+    return {"value": value, "better": better, "unit": unit}
+
+
+def _serve(server) -> str:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> str | None:
+    try:
+        proc = subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=5)
+        return proc.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def prepare_environment(args, workdir: str, youtube_base: str, llm_base: str) -> None:
+    """
+    在匯入 tasks 模組之前設定環境變數並切換到暫存目錄。
+    明確設為空字串的變數不會被 .env (load_dotenv 不覆寫已存在的變數) 填回，確保不連到外部服務。
+    """
+    os.environ.update({
+        "YOUTUBE_BASE_URL": youtube_base,
+        "LLM_BASE_URL": f"{llm_base}/v1",
+        "LLM_API_KEY": "standin",
+        "LLM_MODEL": args.llm_model,
+        "LLM_FALLBACK_BASE_URL": "",
+        "LLM_FALLBACK_MODEL": "",
+        "GEMINI_API_KEY": "",
+        "LLM_DAILY_BUDGET_USD": "",
+        "LLM_DAILY_TOKEN_BUDGET": "",
+        # 節流是對 YouTube 的禮貌設定，不是管線本身的效能；預設關閉以量測管線
+        "YOUTUBE_MIN_INTERVAL": str(args.youtube_min_interval),
+        "YOUTUBE_INTERVAL_JITTER": "0",
+        "TRANSCRIPT_DIR": os.path.join(workdir, "transcripts"),
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "LOG_CONSOLE": "1" if args.verbose else "0",
+        "MONITOR_NODE_ID": "benchmark",
+        "SWEEP_WORKER_AUTOSTART": "0",
+    })
+    os.chdir(workdir)
+    from tasks import log
+    log.setup("benchmark")
+
+
+# === 情境：check_updates ===
+
+def _sweep_phase(check_updates) -> dict:
+    from tasks import metrics
+
+    metrics.reset()
+    started = time.perf_counter()
+    videos = check_updates()
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "videos": videos,
+        "videos_per_s": round(videos / seconds, 3) if seconds else None,
+        "stages": metrics.summarize(metrics.snapshot(), "pipeline_stage_seconds"),
+    }
+
+
+def run_sweep(args, youtube_state) -> tuple[dict, dict]:
+    from tasks import channel_registry, llm_usage, pipeline_trace
+    from tasks.monitor_task import check_updates
+
+    # 空資料庫會匯入預設頻道，換成 stand-in 的頻道
+    for channel in channel_registry.list_channels():
+        channel_registry.remove_channel(channel['url'])
+    for index in range(args.channels):
+        channel_registry.add_channel(youtube_standin.channel_url(index))
+
+    cold = _sweep_phase(check_updates)
+    youtube_state.publish(args.new_videos)
+    steady = _sweep_phase(check_updates)
+
+    usage = llm_usage.rollup(hours=1, group_by="feature")
+    outcomes = pipeline_trace.stats(hours=1, group_by="outcome")
+    result = {
+        "channels": args.channels,
+        "new_videos_per_channel": args.new_videos,
+        "phases": {"cold": cold, "steady": steady},
+        "outcomes": {name: group["videos"] for name, group in outcomes["groups"].items()},
+        "llm": {
+            "calls": usage["total_calls"],
+            "cost_usd": usage["total_cost_usd"],
+            "prompt_tokens": sum(g["prompt_tokens"] for g in usage["groups"].values()),
+            "completion_tokens": sum(g["completion_tokens"] for g in usage["groups"].values()),
+        },
+    }
+    key_metrics = {
+        "sweep.cold_s": _metric(cold["seconds"], "lower", "s"),
+        "sweep.steady_s": _metric(steady["seconds"], "lower", "s"),
+        "sweep.steady_videos_per_s": _metric(steady["videos_per_s"], "higher", "videos/s"),
+    }
+    return result, key_metrics
+
+
+# === 情境：HTTP API ===
+
+def start_api() -> tuple:
+    """在背景執行緒啟動 dashboard_server (不執行 lifespan：不啟動排程器與 sweep worker)"""
+    import uvicorn
+    import dashboard_server
+
+    port = _free_port()
+    config = uvicorn.Config(dashboard_server.app, host="127.0.0.1", port=port, lifespan="off",
+                            log_config=None, access_log=False)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.monotonic() + 15
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("API server did not start within 15 seconds")
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def _load(func, total: int, concurrency: int) -> tuple[list, float]:
+    """以 concurrency 個執行緒執行 func 共 total 次，回傳 (結果, 總秒數)"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: func(), range(total)))
+    return results, time.perf_counter() - started
+
+
+def _seed_videos(count: int, summary_ratio: float) -> None:
+    summary = llm_standin.fake_completion_text([{"role": "user", "content": "benchmark " * 200}])
+    videos = []
+    for i in range(count):
+        video_id = f"api{i:08d}"
+        videos.append({
+            "id": video_id,
+            "title": f"Benchmark Video {i}",
+            "link": f"https://www.youtube.com/watch?v={video_id}",
+            "published": datetime.fromtimestamp(1700000000 + i * 3600).isoformat(),
+            "channel_title": f"Bench Channel {i % 50:03d}",
+            "tags": ["benchmark", f"topic{i % 20}"],
+        })
+        if i < count * summary_ratio:
+            with open(f"summary_{video_id}.md", 'w', encoding='utf-8') as f:
+                f.write(summary)
+    tmp_path = "videos.json.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(videos, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, "videos.json")
+
+
+def run_videos_api(args, api_base: str) -> tuple[dict, dict]:
+    import requests
+
+    _seed_videos(args.videos, args.summary_ratio)
+    local = threading.local()
+
+    def fetch():
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.get(f"{api_base}/api/videos", timeout=60)
+            return time.perf_counter() - started, response.status_code == 200, len(response.content)
+        except requests.RequestException:
+            return time.perf_counter() - started, False, 0
+
+    for _ in range(3):
+        fetch()  # 暖機 (匯入、檔案系統快取)
+    sequential = [fetch() for _ in range(args.api_requests_sequential)]
+    concurrent, seconds = _load(fetch, args.api_requests, args.api_concurrency)
+
+    result = {
+        "videos": args.videos,
+        "summary_ratio": args.summary_ratio,
+        "response_bytes": sequential[-1][2] if sequential else None,
+        "sequential": _percentiles([r[0] for r in sequential]),
+        "concurrent": {
+            "concurrency": args.api_concurrency,
+            "requests_per_s": round(len(concurrent) / seconds, 2),
+            "errors": sum(not r[1] for r in concurrent),
+            **_percentiles([r[0] for r in concurrent]),
+        },
+    }
+    key_metrics = {
+        "videos_api.sequential_p50_ms": _metric(result["sequential"].get("p50_ms"), "lower", "ms"),
+        "videos_api.concurrent_p95_ms": _metric(result["concurrent"].get("p95_ms"), "lower", "ms"),
+        "videos_api.requests_per_s": _metric(result["concurrent"]["requests_per_s"], "higher", "req/s"),
+    }
+    return result, key_metrics
+
+
+def _seed_chat_transcript(youtube_state) -> None:
+    from tasks.summarizer import get_transcript_path
+
+    with open(get_transcript_path(CHAT_VIDEO_ID), 'w', encoding='utf-8') as f:
+        json.dump(youtube_state.transcript_segments(CHAT_VIDEO_ID), f, ensure_ascii=False)
+
+
+def run_chat(args, api_base: str, youtube_state) -> tuple[dict, dict]:
+    import requests
+
+    _seed_chat_transcript(youtube_state)
+    payload = {"video_id": CHAT_VIDEO_ID, "messages": [{"role": "user", "content": CHAT_QUESTION}]}
+
+    def stream():
+        started = time.perf_counter()
+        first_byte, size, ok = None, 0, False
+        try:
+            with requests.post(f"{api_base}/api/chat", json=payload, stream=True, timeout=120) as response:
+                body = b""
+                for chunk in response.iter_content(chunk_size=None):
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                    body += chunk
+                size = len(body)
+                # 串流中的錯誤以 "[Error: ...]" 文字回傳，狀態碼仍是 200
+                ok = response.status_code == 200 and b"[Error" not in body
+        except requests.RequestException:
+            pass
+        return first_byte, time.perf_counter() - started, size, ok
+
+    stream()  # 暖機：第一次請求會建立正規化逐字稿快取
+    results, seconds = [], 0.0
+    for _ in range(args.chat_rounds):
+        batch, elapsed = _load(stream, args.chat_streams, args.chat_streams)
+        results.extend(batch)
+        seconds += elapsed
+
+    ok = [r for r in results if r[3]]
+    result = {
+        "concurrent_streams": args.chat_streams,
+        "rounds": args.chat_rounds,
+        "streams": len(results),
+        "errors": len(results) - len(ok),
+        "streams_per_s": round(len(results) / seconds, 2) if seconds else None,
+        "time_to_first_byte": _percentiles([r[0] for r in ok if r[0] is not None]),
+        "total": _percentiles([r[1] for r in ok]),
+        "avg_response_bytes": round(sum(r[2] for r in ok) / len(ok)) if ok else None,
+    }
+    key_metrics = {
+        "chat.ttfb_p95_ms": _metric(result["time_to_first_byte"].get("p95_ms"), "lower", "ms"),
+        "chat.total_p95_ms": _metric(result["total"].get("p95_ms"), "lower", "ms"),
+        "chat.error_rate": _metric(round(result["errors"] / len(results), 4) if results else None, "lower", "ratio"),
+    }
+    return result, key_metrics
+
+
+# === 比較 ===
+
+def compare(report: dict, baseline: dict, max_regression: float) -> list[dict]:
+    """
+    與基準結果比較 key_metrics；變差的幅度 (相對於基準) 超過 max_regression 的列為退化。
+    基準值為 0 或缺少的指標不比較。
+    """
+    regressions = []
+    for name, metric in report["key_metrics"].items():
+        previous = (baseline.get("key_metrics") or {}).get(name)
+        if not previous or not previous.get("value") or metric["value"] is None:
+            continue
+        change = (metric["value"] - previous["value"]) / previous["value"]
+        worse = change if metric["better"] == "lower" else -change
+        if worse > max_regression:
+            regressions.append({
+                "metric": name,
+                "baseline": previous["value"],
+                "current": metric["value"],
+                "change": round(change, 4),
+            })
+    return regressions
+
+
+def run(args) -> dict:
+    scenarios = args.scenarios or list(SCENARIOS)
+    youtube_faults = FaultInjector(dict(parse_fault(spec) for spec in args.youtube_fault), seed=args.seed)
+    llm_faults = FaultInjector(dict(parse_fault(spec) for spec in args.llm_fault), seed=args.seed)
+    youtube_state = youtube_standin.YouTubeState(
+        args.channels, segments=args.segments, shorts_rate=args.shorts_rate, upcoming_rate=args.upcoming_rate,
+        no_captions_rate=args.no_captions_rate, seed=args.seed, faults=youtube_faults,
+    )
+    youtube_server = youtube_standin.make_server(port=0, state=youtube_state)
+    llm_server = llm_standin.make_server(port=0, batch_delay=0.5, ttft=args.llm_ttft,
+                                         chunk_delay=args.llm_chunk_delay, faults=llm_faults)
+    youtube_base, llm_base = _serve(youtube_server), _serve(llm_server)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="youtube-learn-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    previous_cwd = os.getcwd()
+    prepare_environment(args, workdir, youtube_base, llm_base)
+
+    report = {
+        "benchmark": "youtube-learn",
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "scenarios": {},
+        "key_metrics": {},
+    }
+    api_server = None
+    try:
+        for name in scenarios:
+            print(f"▶️ {name}", file=sys.stderr)
+            started = time.perf_counter()
+            try:
+                if name == "sweep":
+                    result, key_metrics = run_sweep(args, youtube_state)
+                else:
+                    if api_server is None:
+                        api_server, api_base = start_api()
+                    if name == "videos_api":
+                        result, key_metrics = run_videos_api(args, api_base)
+                    else:
+                        result, key_metrics = run_chat(args, api_base, youtube_state)
+            except Exception as e:
+                result, key_metrics = {"error": f"{type(e).__name__}: {e}"}, {}
+            result["wall_s"] = round(time.perf_counter() - started, 3)
+            report["scenarios"][name] = result
+            report["key_metrics"].update(key_metrics)
+    finally:
+        if api_server is not None:
+            api_server.should_exit = True
+        youtube_server.shutdown()
+        llm_server.shutdown()
+        os.chdir(previous_cwd)
+        if not args.workdir and not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report["standins"] = {"youtube": youtube_state.stats(), "llm": llm_faults.stats()}
+    report["workdir"] = workdir if (args.workdir or args.keep_workdir) else None
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against local YouTube and LLM stand-ins")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, help="預設全部")
+    parser.add_argument("--output", help="結果 JSON 的輸出路徑 (預設印到 stdout)")
+    parser.add_argument("--baseline", help="先前的結果 JSON，比較 key_metrics")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="容許的退化比例 (預設 0.2 = 20%%)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="狀態目錄 (預設為暫存目錄，結束後刪除)")
+    parser.add_argument("--keep-workdir", action="store_true", help="保留暫存目錄 (查看 logs / traces)")
+    parser.add_argument("--verbose", action="store_true", help="log 也輸出到 stderr")
+    # sweep
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--new-videos", type=int, default=2, help="穩定狀態時每個頻道的新影片數")
+    parser.add_argument("--segments", type=int, default=300, help="每部影片的逐字稿段數")
+    parser.add_argument("--shorts-rate", type=float, default=0.1)
+    parser.add_argument("--upcoming-rate", type=float, default=0.05)
+    parser.add_argument("--no-captions-rate", type=float, default=0.05)
+    parser.add_argument("--youtube-min-interval", type=float, default=0.0, help="YOUTUBE_MIN_INTERVAL (預設不節流)")
+    # /api/videos
+    parser.add_argument("--videos", type=int, default=2000)
+    parser.add_argument("--summary-ratio", type=float, default=0.8, help="有摘要的影片比例")
+    parser.add_argument("--api-requests", type=int, default=200)
+    parser.add_argument("--api-requests-sequential", type=int, default=20)
+    parser.add_argument("--api-concurrency", type=int, default=8)
+    # /api/chat
+    parser.add_argument("--chat-streams", type=int, default=16, help="同時進行的串流數")
+    parser.add_argument("--chat-rounds", type=int, default=3)
+    # stand-ins
+    parser.add_argument("--llm-model", default="gpt-4o-mini", help="回報用的模型名稱 (決定成本估算)")
+    parser.add_argument("--llm-ttft", type=float, default=0.0, help="LLM 第一個 token 前的延遲 (秒)")
+    parser.add_argument("--llm-chunk-delay", type=float, default=0.0, help="LLM 串流 chunk 之間的延遲 (秒)")
+    parser.add_argument("--llm-fault", action="append", default=[], help="例如 chat:error_rate=0.05,status=429")
+    parser.add_argument("--youtube-fault", action="append", default=[],
+                        help="例如 rss:latency=0.05,error_rate=0.01 (route: channel/rss/shorts/watch/player/timedtext/*)")
+    args = parser.parse_args()
+
+    report = run(args)
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        report["comparison"] = {"baseline": args.baseline, "max_regression": args.max_regression,
+                                "regressions": regressions}
+        if regressions:
+            exit_code = 1
+    if any("error" in result for result in report["scenarios"].values()):
+        exit_code = exit_code or 2
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"📊 結果已寫入 {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    for regression in (report.get("comparison") or {}).get("regressions", []):
+        print(f"❌ 效能退化: {regression['metric']} {regression['baseline']} -> {regression['current']} "
+              f"({regression['change']:+.1%})", file=sys.stderr)
+    sys.exit(exit_code)
@@ -0,0 +1,323 @@
+"""
+YouTube Stand-in - 本機模擬 YouTube 的測試伺服器 (只用標準函式庫)
+涵蓋監控與逐字稿抓取會用到的端點：
+- GET /@{handle}、/@{handle}/videos：頻道頁 (含 "externalId")
+- GET /feeds/videos.xml?channel_id=...：頻道 RSS (Atom，最新 15 部)
+- HEAD/GET /shorts/{id}：Shorts 回 200，一般影片 303 轉到 /watch
+- GET /watch?v=...：影片頁 (含 INNERTUBE_API_KEY；即將直播的影片含 "status":"UPCOMING")
+- POST /youtubei/v1/player：字幕清單 (youtube-transcript-api 使用)
+- GET /api/timedtext?v=...：逐字稿 XML
+頻道與影片由 seed 決定，每部影片的逐字稿用不同的字詞組成 (不會被 dedup 判定為重複)。
+以 publish() 模擬頻道上傳新影片。
+
+用法：
+    python -m benchmarks.youtube_standin --port 8766 --channels 20
+    YOUTUBE_BASE_URL=http://127.0.0.1:8766 python -m tasks.monitor_task
+"""
+
+import json
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+from benchmarks.faults import FaultInjector, parse_fault
+
+RSS_ENTRIES = 15
+VOCABULARY_SIZE = 4000
+WORDS_PER_SEGMENT = 12
+_SYLLABLES = ("ka", "to", "ri", "mon", "sel", "da", "vin", "lo", "pra", "tek", "nu", "shi", "gar", "bel", "or", "quin")
+
+
+def channel_handle(index: int) -> str:
+    return f"bench{index:03d}"
+
+
+def channel_url(index: int) -> str:
+    """頻道清單中使用的 (正式) 網址；YOUTUBE_BASE_URL 會把它導向 stand-in"""
+    return f"https://www.youtube.com/@{channel_handle(index)}"
+
+
+def _vocabulary(seed: int) -> list[str]:
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+class YouTubeState:
+    def __init__(self, channels: int = 10, videos_per_channel: int = RSS_ENTRIES, segments: int = 300,
+                 shorts_rate: float = 0.0, upcoming_rate: float = 0.0, no_captions_rate: float = 0.0,
+                 seed: int = 0, faults: FaultInjector | None = None):
+        """
+        :param segments: 每部影片的逐字稿段數 (每段約 12 個字)
+        :param shorts_rate / upcoming_rate / no_captions_rate: 新影片為 Shorts、即將直播、關閉字幕的機率
+        """
+        self.segments = segments
+        self.shorts_rate = shorts_rate
+        self.upcoming_rate = upcoming_rate
+        self.no_captions_rate = no_captions_rate
+        self.faults = faults or FaultInjector(seed=seed)
+        self.lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._vocabulary = _vocabulary(seed)
+        self._start = datetime.now(timezone.utc) - timedelta(days=30)
+        self.channels = []   # index -> {'handle', 'channel_id', 'title', 'videos' (新的在前)}
+        self.by_handle = {}
+        self.by_channel_id = {}
+        self.videos = {}     # video_id -> {'id', 'title', 'published', 'channel', 'kind'}
+        for index in range(channels):
+            channel = {
+                "handle": channel_handle(index),
+                "channel_id": f"UCbench{index:017d}",
+                "title": f"Bench Channel {index:03d}",
+                "videos": [],
+                "uploaded": 0,
+            }
+            self.channels.append(channel)
+            self.by_handle[channel["handle"]] = channel
+            self.by_channel_id[channel["channel_id"]] = channel
+            for _ in range(videos_per_channel):
+                self._upload(channel)
+
+    def _upload(self, channel: dict) -> dict:
+        index = self.channels.index(channel)
+        number = channel["uploaded"]
+        channel["uploaded"] += 1
+        roll = self._random.random()
+        if roll < self.shorts_rate:
+            kind = "short"
+        elif roll < self.shorts_rate + self.upcoming_rate:
+            kind = "upcoming"
+        elif roll < self.shorts_rate + self.upcoming_rate + self.no_captions_rate:
+            kind = "no_captions"
+        else:
+            kind = "normal"
+        video = {
+            "id": f"bm{index:03d}v{number:05d}",
+            "title": f"{channel['title']} Episode {number}",
+            "published": (self._start + timedelta(hours=number)).isoformat(),
+            "channel": channel,
+            "kind": kind,
+        }
+        channel["videos"].insert(0, video)
+        self.videos[video["id"]] = video
+        return video
+
+    def publish(self, per_channel: int = 1) -> list[str]:
+        """每個頻道上傳 per_channel 部新影片，回傳新影片 id"""
+        with self.lock:
+            return [self._upload(channel)["id"] for channel in self.channels for _ in range(per_channel)]
+
+    def transcript_segments(self, video_id: str) -> list[dict]:
+        rng = random.Random(video_id)
+        segments = []
+        for i in range(self.segments):
+            words = [rng.choice(self._vocabulary) for _ in range(WORDS_PER_SEGMENT)]
+            segments.append({"text": " ".join(words), "start": i * 4.0, "duration": 4.0})
+        return segments
+
+    def rss(self, channel: dict) -> str:
+        entries = []
+        for video in channel["videos"][:RSS_ENTRIES]:
+            entries.append(
+                "<entry>"
+                f"<id>yt:video:{video['id']}</id>"
+                f"<yt:videoId>{video['id']}</yt:videoId>"
+                f"<yt:channelId>{channel['channel_id']}</yt:channelId>"
+                f"<title>{escape(video['title'])}</title>"
+                f'<link rel="alternate" href="https://www.youtube.com/watch?v={video["id"]}"/>'
+                f"<author><name>{escape(channel['title'])}</name></author>"
+                f"<published>{video['published']}</published>"
+                "</entry>"
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">'
+            f"<title>{escape(channel['title'])}</title>" + "".join(entries) + "</feed>"
+        )
+
+    def stats(self) -> dict:
+        with self.lock:
+            kinds = {}
+            for video in self.videos.values():
+                kinds[video["kind"]] = kinds.get(video["kind"], 0) + 1
+        return {"channels": len(self.channels), "videos": len(self.videos), "kinds": kinds, **self.faults.stats()}
+
+
+class YouTubeHandler(BaseHTTPRequestHandler):
+    state: YouTubeState = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "text/html; charset=utf-8",
+              headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _route(self) -> str | None:
+        path = urlparse(self.path).path
+        if path.startswith("/@"):
+            return "channel"
+        if path == "/feeds/videos.xml":
+            return "rss"
+        if path.startswith("/shorts/"):
+            return "shorts"
+        if path == "/watch":
+            return "watch"
+        if path == "/youtubei/v1/player":
+            return "player"
+        if path == "/api/timedtext":
+            return "timedtext"
+        return None
+
+    def _handle(self) -> None:
+        route = self._route()
+        if route is None:
+            return self._send(404, b"not found", "text/plain")
+        status = self.state.faults.apply(route)
+        if status is not None:
+            return self._send(status, b"injected failure", "text/plain")
+        getattr(self, f"_{route}")()
+
+    def do_GET(self):
+        self._handle()
+
+    def do_HEAD(self):
+        self._handle()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._body = self.rfile.read(length) if length else b""
+        self._handle()
+
+    def _query(self, key: str) -> str | None:
+        return (parse_qs(urlparse(self.path).query).get(key) or [None])[0]
+
+    def _video(self, video_id: str | None) -> dict | None:
+        with self.state.lock:
+            return self.state.videos.get(video_id)
+
+    def _channel(self):
+        handle = urlparse(self.path).path.split("/")[1][1:]
+        channel = self.state.by_handle.get(handle)
+        if channel is None:
+            return self._send(404, b"channel not found", "text/plain")
+        data = {"metadata": {"channelMetadataRenderer": {"title": channel["title"], "externalId": channel["channel_id"]}}}
+        page = f"<html><head><title>{escape(channel['title'])}</title></head><body>" \
+               f"<script>var ytInitialData = {json.dumps(data, separators=(',', ':'))};</script></body></html>"
+        self._send(200, page.encode("utf-8"))
+
+    def _rss(self):
+        channel = self.state.by_channel_id.get(self._query("channel_id"))
+        if channel is None:
+            return self._send(404, b"feed not found", "text/plain")
+        with self.state.lock:
+            feed = self.state.rss(channel)
+        self._send(200, feed.encode("utf-8"), "application/atom+xml; charset=UTF-8")
+
+    def _shorts(self):
+        video_id = urlparse(self.path).path.rsplit("/", 1)[-1]
+        video = self._video(video_id)
+        if video is not None and video["kind"] == "short":
+            return self._send(200, b"<html>shorts</html>")
+        self._send(303, headers={"Location": f"/watch?v={video_id}"})
+
+    def _watch(self):
+        video = self._video(self._query("v"))
+        if video is None:
+            return self._send(404, b"video not found", "text/plain")
+        status = "UPCOMING" if video["kind"] == "upcoming" else "OK"
+        page = (
+            f"<html><head><title>{escape(video['title'])}</title></head><body><script>"
+            f'ytcfg.set({{"INNERTUBE_API_KEY":"standin-key"}});'
+            f'var ytInitialPlayerResponse = {{"playabilityStatus":{{"status":"{status}"}}}};'
+            "</script></body></html>"
+        )
+        self._send(200, page.encode("utf-8"))
+
+    def _player(self):
+        try:
+            video_id = json.loads(self._body or b"{}").get("videoId")
+        except json.JSONDecodeError:
+            video_id = None
+        video = self._video(video_id)
+        if video is None:
+            payload = {"playabilityStatus": {"status": "ERROR", "reason": "This video is unavailable"}}
+        elif video["kind"] == "upcoming":
+            payload = {"playabilityStatus": {"status": "LIVE_STREAM_OFFLINE", "reason": "This live event will begin soon."}}
+        elif video["kind"] == "no_captions":
+            payload = {"playabilityStatus": {"status": "OK"}}
+        else:
+            base = f"http://{self.headers.get('Host')}"
+            payload = {
+                "playabilityStatus": {"status": "OK"},
+                "captions": {"playerCaptionsTracklistRenderer": {
+                    "captionTracks": [{
+                        "baseUrl": f"{base}/api/timedtext?v={video_id}&lang=en",
+                        "name": {"runs": [{"text": "English"}]},
+                        "languageCode": "en",
+                        "isTranslatable": False,
+                    }],
+                    "translationLanguages": [],
+                }},
+            }
+        self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _timedtext(self):
+        video = self._video(self._query("v"))
+        if video is None or video["kind"] in ("upcoming", "no_captions"):
+            return self._send(404, b"", "text/xml")
+        body = "".join(
+            f'<text start="{s["start"]}" dur="{s["duration"]}">{escape(s["text"])}</text>'
+            for s in self.state.transcript_segments(video["id"])
+        )
+        xml = f'<?xml version="1.0" encoding="utf-8" ?><transcript>{body}</transcript>'
+        self._send(200, xml.encode("utf-8"), "text/xml; charset=UTF-8")
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8766, state: YouTubeState | None = None) -> ThreadingHTTPServer:
+    """建立 (尚未啟動的) stand-in 伺服器；port=0 時自動選擇可用的 port。狀態在 server.RequestHandlerClass.state"""
+    handler = type("BoundYouTubeHandler", (YouTubeHandler,), {"state": state or YouTubeState()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="YouTube stand-in server (channel pages, RSS, shorts, watch, transcripts)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--segments", type=int, default=300, help="每部影片的逐字稿段數")
+    parser.add_argument("--shorts-rate", type=float, default=0.0)
+    parser.add_argument("--upcoming-rate", type=float, default=0.0)
+    parser.add_argument("--no-captions-rate", type=float, default=0.0)
+    parser.add_argument("--fault", action="append", default=[],
+                        help="延遲 / 錯誤注入，例如 rss:latency=0.05,error_rate=0.01 (route: channel/rss/shorts/watch/player/timedtext/*)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faults = FaultInjector(dict(parse_fault(spec) for spec in args.fault), seed=args.seed)
+    state = YouTubeState(args.channels, segments=args.segments, shorts_rate=args.shorts_rate,
+                         upcoming_rate=args.upcoming_rate, no_captions_rate=args.no_captions_rate,
+                         seed=args.seed, faults=faults)
+    server = make_server(args.host, args.port, state)
+    print(f"🧪 YouTube stand-in 伺服器啟動: http://{args.host}:{server.server_address[1]} ({args.channels} 個頻道)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
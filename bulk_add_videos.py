@@ -0,0 +1,175 @@
+import sys
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# 將專案根目錄加入 sys.path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from add_video_manual import get_video_id, get_video_info
+from tasks.monitor_task import add_videos_to_db
+from tasks.ingest_pipeline import run_pipeline
+from tasks import llm_usage
+
+DEFAULT_REPORT = "bulk_ingest_report.json"
+VIDEOS_FILE = "videos.json"
+
+
+def parse_video_ids(lines):
+    """
+    從多行輸入解析 Video ID (支援 URL 或 11 碼 ID，忽略空行與 # 註解)，並去除重複。
+    :return: (有效 ID 列表, 無效輸入列表)
+    """
+    ids, invalid, seen = [], [], set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        video_id = get_video_id(line) if "youtube.com" in line or "youtu.be" in line else line
+        if not video_id or len(video_id) != 11:
+            invalid.append(line)
+            continue
+        if video_id not in seen:
+            seen.add(video_id)
+            ids.append(video_id)
+    return ids, invalid
+
+
+def load_existing_ids():
+    if not os.path.exists(VIDEOS_FILE):
+        return set()
+    try:
+        with open(VIDEOS_FILE, 'r', encoding='utf-8') as f:
+            return {v.get('id') for v in json.load(f)}
+    except (json.JSONDecodeError, OSError):
+        return set()
+
+
+class BulkReport:
+    """可續跑的處理報告：記錄每部影片的狀態，每次 flush 以原子方式寫入"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {'started_at': datetime.now().isoformat(), 'items': {}}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                pass
+
+    def status(self, video_id):
+        return self.data['items'].get(video_id, {}).get('status')
+
+    def mark(self, video_id, status, **fields):
+        self.data['items'][video_id] = {'status': status, **fields, 'at': datetime.now().isoformat()}
+
+    def flush(self):
+        self.data['updated_at'] = datetime.now().isoformat()
+        counts = {}
+        for item in self.data['items'].values():
+            counts[item['status']] = counts.get(item['status'], 0) + 1
+        self.data['counts'] = counts
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.start = time.time()
+
+    def step(self, video_id, message):
+        self.done += 1
+        elapsed = time.time() - self.start
+        eta = elapsed / self.done * (self.total - self.done)
+        print(f"[{self.done}/{self.total}] {video_id} {message} (已耗時 {elapsed:.0f}s, 預估剩餘 {eta:.0f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次新增多部 YouTube 影片")
+    parser.add_argument("input", nargs="?", default="-", help="URL/ID 清單檔案，'-' 或省略代表 stdin")
+    parser.add_argument("--workers", type=int, default=4, help="並行抓取資訊與逐字稿的數量")
+    parser.add_argument("--commit-every", type=int, default=20, help="每處理幾部影片寫入一次資料庫 (也是檢查每日 LLM 預算的批次大小)")
+    parser.add_argument("--report", default=DEFAULT_REPORT, help="處理報告路徑 (重新執行時會略過已完成的影片)")
+    args = parser.parse_args()
+
+    if args.input == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+    video_ids, invalid = parse_video_ids(lines)
+    for line in invalid:
+        print(f"❌ 無效的 Video ID 或 URL: {line}")
+
+    report = BulkReport(args.report)
+    existing = load_existing_ids()
+    todo = [vid for vid in video_ids if vid not in existing and report.status(vid) not in ('done', 'no_summary')]
+    print(f"🚀 共 {len(video_ids)} 部影片，已存在 {len(video_ids) - len(todo)} 部，待處理 {len(todo)} 部")
+    if not todo:
+        return
+
+    # 1. 並行獲取基本資訊
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        infos = list(executor.map(get_video_info, todo))
+
+    progress = Progress(len(infos))
+    pending = []
+
+    def commit():
+        if pending:
+            add_videos_to_db(pending)
+            pending.clear()
+        report.flush()
+
+    def on_done(video_info, summary_content):
+        video_info['has_summary'] = bool(summary_content)
+        status = 'done' if summary_content else 'no_summary'
+        report.mark(video_info['id'], status, title=video_info['title'])
+        pending.append(video_info)
+        progress.step(video_info['id'], f"{'✅' if summary_content else '⚠️ 無摘要'} {video_info['title']}")
+        if len(pending) >= args.commit_every:
+            commit()
+
+    # 已有摘要檔 (例如上次中斷在寫入資料庫前) 的影片不需重新生成
+    to_summarize = []
+    for info in infos:
+        if os.path.exists(f"summary_{info['id']}.md"):
+            on_done(info, True)
+        else:
+            to_summarize.append(info)
+
+    # 2. 逐字稿並行預取 + 摘要生成，每 commit_every 部為一批
+    batch_size = max(1, args.commit_every)
+    budget_paused = False
+    try:
+        for offset in range(0, len(to_summarize), batch_size):
+            # 達到每日 LLM 預算就在批次之間停下，重新執行時會依報告從未完成的影片繼續
+            if llm_usage.budget_exceeded():
+                print(f"💸 已達每日 LLM 預算，暫停處理 (剩餘 {len(to_summarize) - offset} 部未摘要)")
+                budget_paused = True
+                break
+            run_pipeline(to_summarize[offset:offset + batch_size], on_done, prefetch_workers=args.workers, source="bulk")
+            commit()
+    finally:
+        commit()
+
+    counts = report.data.get('counts', {})
+    if budget_paused:
+        print(f"\n⏸️ 已暫停！{counts}，預算重置後重新執行相同指令即可繼續，報告: {args.report}")
+    else:
+        print(f"\n✨ 批次處理完成！{counts}，報告: {args.report}")
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("bulk_add_videos")
+    main()
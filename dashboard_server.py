@@ -1,49 +1,57 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
+import codecs
 import json
 import os
 import sys
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 from contextlib import asynccontextmanager
-from apscheduler.schedulers.background import BackgroundScheduler
 
 # Add 'tasks' module path
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
-from tasks.monitor_task import check_updates
 
-# Initialize Scheduler
-scheduler = BackgroundScheduler()
-
-# Global state for update status (Must be defined before lifespan uses run_update_wrapper)
-is_update_running = False
-last_update_result = None
-
-def run_update_wrapper():
-    global is_update_running, last_update_result
-    is_update_running = True
-    try:
-        count = check_updates()
-        last_update_result = {"count": count, "timestamp": datetime.now().isoformat()}
-    except Exception as e:
-        print(f"Update failed: {e}")
-    finally:
-        is_update_running = False
+# Structured logging: records are queued and written to logs/api.jsonl off the request path
+from tasks import log
+log.setup("api")
+logger = log.get_logger("dashboard_server")
+from tasks.monitor_task import update_video_fields, toggle_video_read
+from tasks.summarizer import get_summary_path, get_partial_summary_path
+from tasks.dedup import ignore_duplicate, reset as reset_fingerprints
+from tasks.circuit_breaker import breaker_status, NEGATIVE_CACHE_FILE
+from tasks.embeddings import related_videos, reset as reset_embeddings
+from tasks.keyword_extractor import reset as reset_keyword_index
+from tasks.batch_summarizer import reset_jobs as reset_batch_jobs
+from tasks.backfill import backfill_summary, backfill_status, reset_state as reset_backfill_state, DEFAULT_BATCH_SIZE as DEFAULT_BACKFILL_BATCH_SIZE
+
+from tasks.update_runner import get_update_status, is_update_running
+from tasks.control_channel import active_commands, worker_status
+from tasks import channel_registry, pipeline_trace, profiler, llm_usage
+from tasks.sweep_worker import ensure_worker, request_update, request_backfill, request_channel_resolve, request_resummarize, active_backfill_channels, UPDATE
+from scheduler import TaskScheduler
+
+# Scheduler: jobs come from schedule_config.yaml and persist in SQLite.
+# With several uvicorn workers only the one holding the scheduler lock runs them.
+# Jobs only enqueue commands; the sweep worker process does the actual ingestion.
+task_scheduler = TaskScheduler()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Start scheduler
-    print("⏰ Starting Scheduler...")
-    # Schedule check_updates every 1 hour (3600 seconds)
-    # Using run_update_wrapper to ensure state consistency
-    scheduler.add_job(run_update_wrapper, 'interval', hours=4, id='check_updates_job')
-    scheduler.start()
+    # Startup: make sure the sweep worker is up (it outlives API restarts)
+    ensure_worker()
+    # SIGUSR1 toggles on-demand profiling (shared with the sweep worker)
+    profiler.install_signal_handler()
+    # Start scheduler
+    logger.info("⏰ Starting Scheduler...")
+    task_scheduler.start()
     yield
     # Shutdown: Stop scheduler
-    print("⏰ Stopping Scheduler...")
-    scheduler.shutdown()
+    logger.info("⏰ Stopping Scheduler...")
+    task_scheduler.stop()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -63,62 +71,142 @@ app.add_middleware(
 # === Level 1 Observability: Metrics Middleware ===
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from tasks import metrics
 import time
 
-# Metrics Storage (In-Memory)
-metrics = {
-    "total_requests": 0,
-    "total_errors": 0,
-    "last_request_time": None,
-    "avg_latency_ms": 0.0,
-    "uptime_start": datetime.now().isoformat()
-}
+server_started = datetime.now().isoformat()
 
 class MetricsMiddleware(BaseHTTPMiddleware):
+    """
+    Latency histogram per route template, method and status, plus an in-flight gauge.
+    For streaming responses the latency covers the time until headers are sent.
+    """
     async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        
-        # Track Request
-        metrics["total_requests"] += 1
-        metrics["last_request_time"] = datetime.now().isoformat()
-        
+        start_time = time.perf_counter()
+        status = 500  # Unhandled exception
+        metrics.gauge_add("http_requests_in_flight", 1)
         try:
             response = await call_next(request)
-            
-            # Track Error (HTTP 500+)
-            if response.status_code >= 500:
-                metrics["total_errors"] += 1
-                
+            status = response.status_code
             return response
-        except Exception as e:
-            # Track Unhandled Exception
-            metrics["total_errors"] += 1
-            raise e
         finally:
-            # Calculate Latency
-            process_time = (time.time() - start_time) * 1000 # ms
-            
-            # Simple moving average for latency (to keep it stable but responsive)
-            # New Avg = 0.9 * Old + 0.1 * New
-            if metrics["avg_latency_ms"] == 0:
-                 metrics["avg_latency_ms"] = process_time
-            else:
-                 metrics["avg_latency_ms"] = (metrics["avg_latency_ms"] * 0.9) + (process_time * 0.1)
+            metrics.gauge_add("http_requests_in_flight", -1)
+            # Route template (e.g. /api/mindmap/{video_id}) keeps label cardinality bounded
+            route = getattr(request.scope.get("route"), "path", None)
+            if route is None:
+                route = "unmatched" if request.url.path.startswith("/api") else "static"
+            metrics.observe(
+                "http_request_duration_seconds", time.perf_counter() - start_time,
+                route=route, method=request.method, status=status
+            )
 
 app.add_middleware(MetricsMiddleware)
 
+def _request_totals(snapshot: dict) -> dict:
+    total = errors = 0
+    for h in snapshot["histograms"]:
+        if h["name"] == "http_request_duration_seconds":
+            total += h["count"]
+            if int(h["labels"]["status"]) >= 500:
+                errors += h["count"]
+    return {"total_requests": total, "total_errors": errors}
+
 @app.get("/api/health_stats")
 def get_health_stats():
     """
     Expose monitoring metrics for the dashboard.
     """
+    api_snapshot = metrics.snapshot()
+    worker_snapshot = metrics.load_snapshot()
     return {
         "status": "healthy",
-        "metrics": metrics,
-        "scheduler_running": scheduler.running
+        "metrics": {
+            **_request_totals(api_snapshot),
+            "uptime_start": server_started,
+            "routes": metrics.summarize(api_snapshot, "http_request_duration_seconds"),
+            "pipeline_stages": metrics.summarize(worker_snapshot, "pipeline_stage_seconds") if worker_snapshot else [],
+            "sweeps": metrics.summarize(worker_snapshot, "sweep_duration_seconds") if worker_snapshot else [],
+        },
+        "scheduler": task_scheduler.status(),
+        "llm_budget": llm_usage.budget_status(),
+        "circuit_breakers": breaker_status(),
+        "llm_providers": provider_status()
     }
+
+@app.get("/api/pipeline_stats")
+def get_pipeline_stats(hours: float = 24, by: str = "channel"):
+    """
+    Aggregate per-video pipeline traces over the last `hours`, grouped by
+    channel, source, outcome, hour or day: outcomes, transcript sources, tokens and step timings.
+    """
+    try:
+        return pipeline_trace.stats(hours=hours, group_by=by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/llm_usage")
+def get_llm_usage(hours: float = 24, by: str = "feature"):
+    """
+    LLM token and cost rollup over the last `hours`, grouped by feature, source, model,
+    provider, channel, video or day, plus today's spend against the daily budget.
+    """
+    try:
+        return {**llm_usage.rollup(hours=hours, group_by=by), "budget": llm_usage.budget_status()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/videos/{video_id}/trace")
+def get_video_trace(video_id: str):
+    """
+    Every recorded trip of one video through the pipeline (oldest first).
+    """
+    return {"video_id": video_id, "traces": pipeline_trace.get_traces(video_id)}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus text format: this API process plus the sweep worker's latest snapshot.
+    """
+    snapshots = {"api": metrics.snapshot()}
+    worker_snapshot = metrics.load_snapshot()
+    if worker_snapshot:
+        snapshots["worker"] = worker_snapshot
+    return PlainTextResponse(metrics.render_prometheus(snapshots), media_type="text/plain; version=0.0.4")
 # ===============================================
 
+# === On-demand profiling ===
+class ProfilingRequest(BaseModel):
+    enabled: bool
+    targets: Optional[List[str]] = None
+    duration_s: Optional[float] = profiler.PROFILE_DEFAULT_DURATION
+
+@app.get("/api/admin/profiling")
+def get_profiling():
+    return profiler.status()
+
+@app.post("/api/admin/profiling")
+def set_profiling(request: ProfilingRequest):
+    """
+    Toggle profiling for the API and the sweep worker. Turns itself off after duration_s (null = never).
+    """
+    if not request.enabled:
+        return profiler.disable()
+    try:
+        return profiler.enable(request.targets, request.duration_s)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/admin/profiles")
+def list_profiles():
+    return {"profiles": profiler.list_profiles(), **profiler.status()}
+
+@app.get("/api/admin/profiles/{name}")
+def download_profile(name: str):
+    path = profiler.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name)
+
 class Video(BaseModel):
     id: str
     title: str
@@ -129,6 +217,7 @@ class Video(BaseModel):
     is_read: bool = False
 
 @app.get("/api/videos", response_model=List[dict])
+@profiler.profiled("/api/videos")
 def get_videos():
     videos = []
     if os.path.exists(VIDEOS_FILE):
@@ -136,16 +225,20 @@ def get_videos():
             with open(VIDEOS_FILE, 'r', encoding='utf-8') as f:
                 videos = json.load(f)
         except Exception as e:
-            print(f"Error loading videos: {e}")
+            logger.error(f"Error loading videos: {e}")
     
     # Enrich with summary data
     results = []
     for v in videos:
         summary_path = f"summary_{v['id']}.md"
+        if not os.path.exists(summary_path) and v.get('duplicate_of'):
+            # 重複上傳沿用原影片的摘要
+            summary_path = f"summary_{v['duplicate_of']}.md"
         v['has_summary'] = os.path.exists(summary_path)
         v['preview'] = ""
         v['highlight'] = ""
-        v['tags'] = []
+        # 標籤由 keyword_extractor 離線擷取並存在 videos.json
+        v['tags'] = v.get('tags') or []
         
         if v['has_summary']:
             try:
@@ -163,22 +256,6 @@ def get_videos():
                     if "## 精煉亮點" in content:
                          highlight_part = content.split("## 精煉亮點")[1].strip()
                          v['highlight'] = highlight_part.split('\n')[0].replace('*', '').strip()
-                    # Extract Tags (approximate: text after '## 標籤' or 'Tags')
-                    if "## 標籤" in content:
-                        tags_part = content.split("## 標籤")[1].split("##")[0]
-                        v['tags'] = [t.strip().replace('#', '') for t in tags_part.split() if t.strip()]
-                    elif "## Tags" in content: 
-                         tags_part = content.split("## Tags")[1].split("##")[0]
-                         v['tags'] = [t.strip().replace('#', '') for t in tags_part.split() if t.strip()]
-                    
-                    # If extraction failed, add mock tags based on title/channel
-                    if not v['tags']:
-                         if "AI" in v['title'] or "Intelligence" in v['title']:
-                             v['tags'].append("Artificial Intelligence")
-                         if "Python" in v['title']:
-                             v['tags'].append("Python")
-                         if not v['tags']:
-                             v['tags'] = ["Tech", "Software"]
 
             except:
                 pass
@@ -187,9 +264,23 @@ def get_videos():
     
     return results
 
+def _find_video(video_id: str) -> dict | None:
+    if not os.path.exists(VIDEOS_FILE):
+        return None
+    with open(VIDEOS_FILE, 'r', encoding='utf-8') as f:
+        for v in json.load(f):
+            if v.get('id') == video_id:
+                return v
+    return None
+
 @app.get("/api/summary/{video_id}")
 def get_summary(video_id: str):
-    filename = f"summary_{video_id}.md"
+    filename = get_summary_path(video_id)
+    if not os.path.exists(filename):
+        video = _find_video(video_id)
+        if video and video.get('duplicate_of'):
+            # 重複上傳：回傳原影片的摘要
+            filename = get_summary_path(video['duplicate_of'])
     if not os.path.exists(filename):
         raise HTTPException(status_code=404, detail="Summary not found")
     
@@ -200,48 +291,138 @@ def get_summary(video_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/videos/{video_id}/related")
+def get_related_videos(video_id: str, k: int = 10):
+    """以本地向量 (cosine 相似度) 找出相關影片；還沒有向量的影片 (由 worker 或 python -m tasks.embeddings 計算) 回傳空列表"""
+    videos = {}
+    if os.path.exists(VIDEOS_FILE):
+        with open(VIDEOS_FILE, 'r', encoding='utf-8') as f:
+            videos = {v['id']: v for v in json.load(f)}
+    if video_id not in videos:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    results = []
+    for related_id, score in related_videos(video_id, k=max(1, min(k, 50))):
+        video = videos.get(related_id)
+        if video is None:
+            continue
+        results.append({
+            "id": related_id,
+            "title": video.get("title"),
+            "channel_title": video.get("channel_title"),
+            "published": video.get("published"),
+            "score": round(score, 4),
+        })
+    return results
+
+@app.delete("/api/videos/{video_id}/duplicate")
+def unlink_duplicate(video_id: str):
+    """覆寫重複判定：取消 duplicate_of 並交由 sweep worker 為這部影片產生自己的摘要"""
+    video = _find_video(video_id)
+    if video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    if not video.get('duplicate_of'):
+        return {"status": "not_duplicate"}
+    ignore_duplicate(video_id)
+    update_video_fields({video_id: {'duplicate_of': None}})
+    command = request_resummarize(video)
+    return {"status": "resummarizing", "previous_duplicate_of": video['duplicate_of'], "command_id": command['id']}
+
+SUMMARY_STREAM_POLL_SECONDS = 0.25
+SUMMARY_STREAM_STALL_SECONDS = 120
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def _poll_summary(partial_path: str, final_path: str, offset: int) -> tuple[str, bytes | str | None]:
+    """
+    讀取一次摘要檔 (阻塞 IO，在 worker thread 執行)。
+    :return: ("partial", 新增的位元組) / ("done", 最終內容) / ("missing", None)
+    """
+    try:
+        with open(partial_path, 'rb') as f:
+            f.seek(offset)
+            return "partial", f.read()
+    except FileNotFoundError:
+        pass
+    # save_summary 先放好正式檔才刪除 .part，.part 消失時正式檔一定已存在
+    try:
+        with open(final_path, 'r', encoding='utf-8') as f:
+            return "done", f.read()
+    except FileNotFoundError:
+        return "missing", None
+
+@app.get("/api/summary/{video_id}/stream")
+async def stream_summary(video_id: str):
+    """
+    Stream a summary while it is still being generated (Server-Sent Events).
+    Emits `partial` events with new text, then a `done` event with the final content.
+    """
+    final_path = get_summary_path(video_id)
+    partial_path = get_partial_summary_path(video_id)
+    if not os.path.exists(final_path) and not os.path.exists(partial_path):
+        raise HTTPException(status_code=404, detail="Summary not found")
+
+    async def generate():
+        offset = 0
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        last_growth = time.time()
+        while True:
+            # 檔案 IO 不在 event loop 上執行，避免慢速磁碟拖慢其他請求
+            kind, data = await asyncio.to_thread(_poll_summary, partial_path, final_path, offset)
+            if kind == "done":
+                yield _sse("done", {"content": data})
+                return
+            if kind == "missing":
+                yield _sse("error", {"detail": "Summary generation failed"})
+                return
+            if data:
+                offset += len(data)
+                last_growth = time.time()
+                chunk = decoder.decode(data)
+                if chunk:
+                    yield _sse("partial", {"delta": chunk})
+
+            if time.time() - last_growth > SUMMARY_STREAM_STALL_SECONDS:
+                yield _sse("error", {"detail": "Summary generation stalled"})
+                return
+            await asyncio.sleep(SUMMARY_STREAM_POLL_SECONDS)
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
 @app.post("/api/videos/{video_id}/toggle_read")
 def toggle_read(video_id: str):
     if not os.path.exists(VIDEOS_FILE):
         raise HTTPException(status_code=404, detail="No videos database found")
-    
-    try:
-        updated_video = None
-        with open(VIDEOS_FILE, 'r', encoding='utf-8') as f:
-            videos = json.load(f)
-        
-        for v in videos:
-            if v['id'] == video_id:
-                # Toggle current state, default to False if missing
-                current_state = v.get('is_read', False)
-                v['is_read'] = not current_state
-                updated_video = v
-                break
-        
-        if updated_video:
-            with open(VIDEOS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(videos, f, indent=2, ensure_ascii=False)
-            return updated_video
-        else:
-            raise HTTPException(status_code=404, detail="Video not found")
-            
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # 與 worker 共用 videos.json 的跨程序鎖，避免覆蓋掉同時寫入的新影片
+    updated_video = toggle_video_read(video_id)
+    if updated_video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return updated_video
 
 # === Chat API ===
-from tasks.summarizer import get_transcript_text
-from openai import OpenAI
+from tasks.summarizer import get_transcript_text, get_transcript_path
+from tasks.context_packer import pack_chat
+from tasks.llm_gateway import chat_completion_stream, is_configured as llm_configured, provider_status
+from tasks.adaptive_concurrency import INTERACTIVE
+from starlette.concurrency import iterate_in_threadpool
 
-# Reuse env vars for Chat
-CHAT_API_KEY = os.getenv("LLM_API_KEY")
-CHAT_BASE_URL = os.getenv("LLM_BASE_URL")
+# Reuse env vars for Chat (providers are configured in tasks.llm_gateway)
 CHAT_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
 
+CHAT_SYSTEM_TEMPLATE = """
+    You are an AI assistant helping a user understand a YouTube video.
+    Below is the transcript.
+    
+    Transcript:
+    {transcript}
+    ([...] marks parts omitted to fit the context window)
+    """
+
 class ChatRequest(BaseModel):
     video_id: str
     messages: List[dict] # [{"role": "user", "content": "..."}]
 
-from fastapi.responses import StreamingResponse
 
 from tasks.rag_service import get_or_create_store, chat_with_store_stream, is_file_indexed
 from tasks.mindmap_generator import generate_mindmap, mindmap_exists as check_mindmap_exists
@@ -259,9 +440,10 @@ async def chat_with_video(request: ChatRequest):
 
     # >>> Strategy 1: Gemini RAG (Preferred if key exists) <<<
     if gemini_key:
-        print(f"Using Gemini RAG for video {video_id}")
+        logger.info(f"Using Gemini RAG for video {video_id}", extra={"video_id": video_id})
         
-        # Generator for streaming RAG response
+        # Generator for streaming RAG response (profiled here: the handler itself returns immediately)
+        @profiler.profiled("/api/chat")
         async def rag_generate():
             try:
                 # 1. Check/Prepare Knowledge Base
@@ -271,7 +453,7 @@ async def chat_with_video(request: ChatRequest):
                      yield "---\n"
                 
                 # This might take a few seconds if not indexed
-                transcript_path = os.path.abspath(f"transcripts/{video_id}.json")
+                transcript_path = os.path.abspath(get_transcript_path(video_id))
                 if not os.path.exists(transcript_path):
                      # Ensure we have the transcript first
                      get_transcript_text(video_id, save_to_file=True)
@@ -283,18 +465,18 @@ async def chat_with_video(request: ChatRequest):
                 
                 # Pass file_obj.name or file_obj depending on what chat_with_store_stream expects
                 # Updated rag_service handles both.
-                rag_stream = chat_with_store_stream(file_obj, messages)
+                rag_stream = chat_with_store_stream(file_obj, messages, video_id=video_id)
                 for chunk in rag_stream:
                     yield chunk
                     
             except Exception as e:
-                print(f"RAG Error: {e}")
+                logger.error(f"RAG Error: {e}", extra={"video_id": video_id})
                 yield f"\n[Error: {str(e)}]"
 
         return StreamingResponse(rag_generate(), media_type="text/event-stream")
 
     # >>> Strategy 2: Original Context Stuffing (Fallback) <<<
-    if not CHAT_API_KEY or not CHAT_BASE_URL:
+    if not llm_configured():
          raise HTTPException(status_code=500, detail="No LLM configuration found (GEMINI_API_KEY or LLM_API_KEY).")
 
     # ... (Keep existing Logic for OpenAI/Local LLM) ...
@@ -302,28 +484,22 @@ async def chat_with_video(request: ChatRequest):
     if not transcript_text:
          raise HTTPException(status_code=404, detail="Transcript not available.")
          
-    system_prompt = f"""
-    You are an AI assistant helping a user understand a YouTube video.
-    Below is the transcript.
-    
-    Transcript:
-    {transcript_text[:200000]} 
-    (Truncated if too long)
-    """
-    full_messages = [{"role": "system", "content": system_prompt}] + messages
+    # 以 token 預算打包逐字稿與對話歷史 (取代字元截斷)
+    system_prompt, kept_messages = pack_chat(CHAT_SYSTEM_TEMPLATE, "{transcript}", transcript_text, messages, model=CHAT_MODEL)
+    full_messages = [{"role": "system", "content": system_prompt}] + kept_messages
     
     try:
-        client = OpenAI(api_key=CHAT_API_KEY, base_url=CHAT_BASE_URL)
-        def generate():
-            stream = client.chat.completions.create(
-                model=CHAT_MODEL,
-                messages=full_messages,
-                temperature=0.7,
-                stream=True 
-            )
-            for chunk in stream:
-                 if chunk.choices[0].delta.content:
-                     yield chunk.choices[0].delta.content
+        # Async generator so the profile starts and stops on the event loop thread;
+        # the blocking LLM stream is read in the threadpool
+        @profiler.profiled("/api/chat")
+        async def generate():
+            try:
+                stream = chat_completion_stream(full_messages, temperature=0.7, feature="chat", video_id=video_id, priority=INTERACTIVE)
+                async for delta in iterate_in_threadpool(stream):
+                    yield delta
+            except Exception as e:
+                logger.error(f"Chat LLM Error: {e}", extra={"video_id": video_id})
+                yield f"\n[Error: {str(e)}]"
 
         return StreamingResponse(generate(), media_type="text/event-stream")
         
@@ -344,45 +520,128 @@ async def get_mindmap(video_id: str):
         if mermaid_code:
             return {"mermaid": mermaid_code}
         else:
-            raise HTTPException(status_code=404, detail="無法生成心智圖，請確認逐字稿存在")
+            raise HTTPException(status_code=404, detail="無法生成心智圖，請確認摘要或逐字稿存在")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成心智圖時發生錯誤: {str(e)}")
 
 
 @app.get("/api/status")
 def get_status():
-    return {
-        "is_updating": is_update_running,
-        "last_update_result": last_update_result
-    }
+    status = get_update_status()
+    queued = active_commands(UPDATE)
+    status["is_updating"] = status["is_updating"] or bool(queued)
+    status["queued_update"] = queued[0] if queued else None
+    status["worker"] = worker_status()
+    return status
 
 @app.post("/api/refresh")
-def refresh_data(background_tasks: BackgroundTasks):
+def refresh_data():
     """
-    Manually trigger the update process in the background.
+    Ask the sweep worker to check for updates.
     """
-    global is_update_running
-    if is_update_running:
+    if is_update_running() or active_commands(UPDATE):
          return {"status": "Busy", "message": "Update already in progress."}
-         
-    background_tasks.add_task(run_update_wrapper)
-    return {"status": "Update started", "message": "The system is checking for updates in the background."}
+
+    command = request_update()
+    message = "The system is checking for updates in the background."
+    if not worker_status()["alive"]:
+        message = "Update queued; it will run when the sweep worker starts (python -m tasks.sweep_worker)."
+    return {"status": "Update started", "message": message, "command_id": command["id"]}
+
+# === Backfill API ===
+class BackfillRequest(BaseModel):
+    channel_url: str
+    batch_size: int = Field(DEFAULT_BACKFILL_BATCH_SIZE, gt=0)
+    limit: Optional[int] = Field(None, gt=0)
+    relist: bool = False
+
+@app.post("/api/backfill")
+def start_backfill(request: BackfillRequest):
+    """
+    Start (or resume) a full-channel backfill in the sweep worker.
+    """
+    status = backfill_summary(request.channel_url)
+    if request.channel_url in active_backfill_channels():
+        status["running"] = True
+        return {"status": "Busy", "message": "Backfill already queued or running for this channel.", "backfill": status}
+
+    command, _ = request_backfill(
+        request.channel_url,
+        batch_size=request.batch_size, limit=request.limit, relist=request.relist
+    )
+    return {"status": "Backfill started", "backfill": status, "command_id": command["id"]}
+
+@app.get("/api/backfill")
+def get_backfill_status():
+    # Backfills run in the sweep worker, so "running" comes from the control channel
+    active = active_backfill_channels()
+    backfills = backfill_status()
+    for status in backfills:
+        status["running"] = status["channel_url"] in active
+    return {"backfills": backfills}
+
+# === Channel Registry API ===
+class ChannelRequest(BaseModel):
+    url: str
+
+def _channel_view(channel: dict) -> dict:
+    # 舊版資料庫仍有 lease_* 欄位，不對外輸出
+    view = {k: v for k, v in channel.items() if not k.startswith("lease_")}
+    view["status"] = channel_registry.channel_status(channel)
+    return view
+
+@app.get("/api/channels")
+def get_channels():
+    """
+    Monitored channels with their resolve status.
+    """
+    return {"channels": [_channel_view(c) for c in channel_registry.list_channels()]}
+
+@app.post("/api/channels")
+def create_channel(request: ChannelRequest):
+    """
+    Add a channel. It is picked up by the next sweep without a restart;
+    the channel id is resolved and the feed warmed in the sweep worker.
+    """
+    url = channel_registry.normalize_channel_url(request.url)
+    if not url:
+        raise HTTPException(status_code=400, detail="Not a YouTube channel URL (expected https://www.youtube.com/@handle or /channel/UC...)")
+
+    created = channel_registry.add_channel(url)
+    channel = channel_registry.get_channel(url)
+    command_id = None
+    if not channel["channel_id"]:
+        # New, or a previous resolve failed: (re)try in the background
+        command_id = request_channel_resolve(url)["id"]
+    return {
+        "status": "Channel added" if created else "Channel already exists",
+        "channel": _channel_view(channel),
+        "command_id": command_id,
+    }
+
+@app.delete("/api/channels")
+def delete_channel(url: str):
+    """
+    Stop monitoring a channel. Videos already in the database are kept.
+    """
+    if not channel_registry.remove_channel(channel_registry.normalize_channel_url(url) or url):
+        raise HTTPException(status_code=404, detail="Channel not found")
+    return {"status": "Channel removed", "url": url}
 
 @app.post("/api/reset")
 def reset_system():
     """
     DANGER: Clears all data to allow full re-ingestion.
     """
-    global is_update_running
-    if is_update_running:
-        raise HTTPException(status_code=400, detail="Cannot reset while update is running.")
+    if is_update_running() or active_commands():
+        raise HTTPException(status_code=400, detail="Cannot reset while update or backfill is running.")
 
     # Files to remove
-    files_to_remove = [VIDEOS_FILE, "monitor_state.json", "new_videos.txt"]
+    files_to_remove = [VIDEOS_FILE, "new_videos.txt", NEGATIVE_CACHE_FILE]
     
     # Remove summary files
     for f in os.listdir("."):
-        if f.startswith("summary_") and f.endswith(".md"):
+        if f.startswith("summary_") and f.endswith((".md", ".md.part", ".md.tmp")):
             files_to_remove.append(f)
 
     deleted = []
@@ -392,9 +651,29 @@ def reset_system():
                 os.remove(f)
                 deleted.append(f)
             except Exception as e:
-                print(f"Error removing {f}: {e}")
-                
-    return {"status": "System Reset", "deleted_files": deleted}
+                logger.error(f"Error removing {f}: {e}")
+
+    # Channel progress lives in the registry; keep the channel list and resolved ids
+    channel_registry.reset_progress()
+
+    # Stores derived from the deleted videos: re-ingested videos must not see stale
+    # document frequencies, vectors, duplicate signatures/overrides or backfill cursors
+    reset_stores = {
+        "keyword_index": reset_keyword_index,
+        "embeddings": reset_embeddings,
+        "fingerprints": reset_fingerprints,
+        "backfill_state": reset_backfill_state,
+        "batch_jobs": reset_batch_jobs,
+    }
+    cleared = []
+    for name, reset in reset_stores.items():
+        try:
+            reset()
+            cleared.append(name)
+        except Exception as e:
+            logger.error(f"Error resetting {name}: {e}")
+
+    return {"status": "System Reset", "deleted_files": deleted, "cleared_stores": cleared}
 
 # Mount Frontend Static Files
 # Ensure this is after API routes so they are processed first
@@ -403,12 +682,13 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DIST_DIR = os.path.join(BASE_DIR, "dashboard", "dist")
 
 if os.path.exists(DIST_DIR):
-    print(f"✅ Mounting static files from: {DIST_DIR}")
+    logger.info(f"✅ Mounting static files from: {DIST_DIR}")
     app.mount("/", StaticFiles(directory=DIST_DIR, html=True), name="static")
 else:
-    print(f"⚠️ Warning: dashboard/dist not found at: {DIST_DIR}")
-    print("Run 'npm run build' in dashboard/ folder.")
+    logger.warning(f"⚠️ Warning: dashboard/dist not found at: {DIST_DIR}")
+    logger.warning("Run 'npm run build' in dashboard/ folder.")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # log_config=None: uvicorn's own records go through the root queue handler (request latency lives in /metrics)
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None, access_log=False)
@@ -1,4 +1,7 @@
 from tasks.summarizer import summarize_video, save_summary
+from tasks import log
+
+log.setup("manual_summary")
 
 video_id = "2hgjgycOU_0"
 video_title = "Inside The Startup Building Reusable Rockets"
@@ -1,22 +1,53 @@
+"""
+排程器 - dashboard_server 與 scheduler.py 共用
+- 任務存放在 SQLite (SCHEDULER_DB)，重啟後沿用原本的下次執行時間，不會重置間隔
+- 錯過的執行 (程序停機期間) 合併成一次補跑 (coalesce)，同一任務不會重疊執行 (max_instances=1)
+- 以檔案鎖保證同一台主機只有一個程序擁有排程；其他程序 (多個 uvicorn worker、
+  另外啟動的 scheduler.py) 進入待命，定期重試，擁有者結束後接手
+"""
+
 import yaml
 import time
 import importlib
 import os
+import threading
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
+from tasks.process_lock import ProcessLock
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
 CONFIG_PATH = 'schedule_config.yaml'
+SCHEDULER_DB = os.getenv("SCHEDULER_DB", "scheduler_jobs.sqlite")
+SCHEDULER_LOCK_FILE = "scheduler.lock"
+# 待命程序重試取得排程擁有權的間隔 (秒)
+SCHEDULER_LOCK_RETRY = int(os.getenv("SCHEDULER_LOCK_RETRY", "30"))
+# 停機期間錯過的執行，在這個時間 (秒) 內仍會補跑一次
+SCHEDULER_MISFIRE_GRACE = int(os.getenv("SCHEDULER_MISFIRE_GRACE", str(24 * 3600)))
 
 class TaskScheduler:
     def __init__(self, config_path=CONFIG_PATH):
-        self.scheduler = BackgroundScheduler()
+        self.scheduler = BackgroundScheduler(
+            jobstores={'default': SQLAlchemyJobStore(url=f"sqlite:///{SCHEDULER_DB}")},
+            job_defaults={
+                'coalesce': True,
+                'max_instances': 1,
+                'misfire_grace_time': SCHEDULER_MISFIRE_GRACE,
+            },
+        )
         self.config_path = config_path
+        self.lock = ProcessLock(SCHEDULER_LOCK_FILE)
+        self._stop_event = threading.Event()
+        self._standby_thread = None
         
     def load_config(self):
         """載入配置檔案"""
         if not os.path.exists(self.config_path):
-            print(f"❌ 找不到配置檔案: {self.config_path}")
+            logger.error(f"❌ 找不到配置檔案: {self.config_path}")
             return []
             
         with open(self.config_path, 'r', encoding='utf-8') as f:
@@ -30,23 +61,12 @@ class TaskScheduler:
             module = importlib.import_module(module_path)
             return getattr(module, func_name)
         except (ImportError, AttributeError, ValueError) as e:
-            print(f"❌ 無法載入函數 {func_path}: {e}")
+            logger.error(f"❌ 無法載入函數 {func_path}: {e}")
             return None
     
-    def add_job(self, job_config):
-        """添加單個任務到排程器"""
-        job_id = job_config['id']
-        func_path = job_config['func']
-        func = self.get_function(func_path)
-        
-        if not func:
-            print(f"⚠️ 跳過任務 {job_id}: 無法找函數")
-            return
-
+    def build_trigger(self, job_config):
+        """依配置建立觸發器；不支援的類型回傳 None"""
         trigger_type = job_config['trigger']
-        args = job_config.get('args', [])
-        
-        trigger = None
         if trigger_type == 'interval':
             trigger_params = {
                 'weeks': job_config.get('weeks', 0),
@@ -56,14 +76,9 @@ class TaskScheduler:
                 'seconds': job_config.get('seconds', 0),
             }
             trigger_params = {k: v for k, v in trigger_params.items() if v > 0}
-            if not trigger_params:
-                 # 預設如果沒有參數，設為 1 分鐘以便測試，或報錯
-                 # 與其報錯，不如預設 30 分鐘? 不，應該依據 yaml.
-                 # 如果 yaml 只寫 trigger: interval 但沒寫時間
-                 pass 
-            trigger = IntervalTrigger(**trigger_params)
-            
-        elif trigger_type == 'cron':
+            return IntervalTrigger(**trigger_params)
+
+        if trigger_type == 'cron':
             trigger_params = {
                 'year': job_config.get('year'),
                 'month': job_config.get('month'),
@@ -75,44 +90,107 @@ class TaskScheduler:
                 'second': job_config.get('second', 0),
             }
             trigger_params = {k: v for k, v in trigger_params.items() if v is not None}
-            trigger = CronTrigger(**trigger_params)
-        else:
-            print(f"⚠️ 跳過任務 {job_id}: 不支援的觸發類型 {trigger_type}")
+            return CronTrigger(**trigger_params)
+
+        return None
+
+    def add_job(self, job_config):
+        """
+        添加單個任務到排程器。SQLite 中已有相同設定的任務時保留原本的下次執行時間，
+        設定有變動才取代。
+        """
+        job_id = job_config['id']
+        func_path = job_config['func']
+        # 持久化的任務以 "module:func" 字串保存，這裡只確認能載入
+        if not self.get_function(func_path):
+            logger.warning(f"⚠️ 跳過任務 {job_id}: 無法找函數")
             return
-        
-        if trigger:
-            self.scheduler.add_job(
-                func=func,
-                trigger=trigger,
-                args=args,
-                id=job_id,
-                replace_existing=True
-            )
-            print(f"✅ 已添加任務: {job_id}")
-    
-    def start(self):
-        """啟動排程器"""
+
+        args = list(job_config.get('args', []))
+        trigger = self.build_trigger(job_config)
+        if trigger is None:
+            logger.warning(f"⚠️ 跳過任務 {job_id}: 不支援的觸發類型 {job_config['trigger']}")
+            return
+
+        existing = self.scheduler.get_job(job_id)
+        if (existing and existing.func_ref == func_path
+                and str(existing.trigger) == str(trigger) and list(existing.args) == args):
+            logger.info(f"✅ 沿用任務: {job_id} (下次執行於 {existing.next_run_time})")
+            return
+
+        self.scheduler.add_job(
+            func=func_path,
+            trigger=trigger,
+            args=args,
+            id=job_id,
+            replace_existing=True
+        )
+        logger.info(f"✅ 已添加任務: {job_id}")
+
+    def _start_owner(self):
+        """取得擁有權後：載入配置、同步 SQLite 中的任務並開始執行"""
         jobs = self.load_config()
-        print(f"載入 {len(jobs)} 個任務配置...")
+        logger.info(f"載入 {len(jobs)} 個任務配置...")
+        # 先以暫停狀態啟動，任務同步完成前不會觸發任何 (補跑的) 執行
+        self.scheduler.start(paused=True)
+        configured = set()
         for job in jobs:
             try:
                 self.add_job(job)
+                configured.add(job['id'])
             except Exception as e:
-                print(f"❌ 添加任務 {job.get('id')} 失敗: {e}")
-        
-        if self.scheduler.get_jobs():
-            self.scheduler.start()
-            print("🚀 排程器已啟動")
-            self.list_jobs()
-        else:
-            print("⚠️ 沒有有效任務，排程器未啟動")
-    
+                logger.error(f"❌ 添加任務 {job.get('id')} 失敗: {e}")
+
+        for job in self.scheduler.get_jobs():
+            if job.id not in configured:
+                job.remove()
+                logger.info(f"🗑️ 移除已不在配置中的任務: {job.id}")
+
+        self.scheduler.resume()
+        logger.info(f"🚀 排程器已啟動 (PID {os.getpid()})")
+        self.list_jobs()
+
+    def _standby_loop(self):
+        while not self._stop_event.wait(SCHEDULER_LOCK_RETRY):
+            if self.lock.acquire():
+                logger.info("🔑 已取得排程擁有權")
+                self._start_owner()
+                return
+
+    def start(self):
+        """啟動排程器；已有其他程序擁有排程時進入待命"""
+        if self.lock.acquire():
+            self._start_owner()
+            return
+
+        logger.info(f"⏸️ 排程由其他程序擁有 (PID {self.lock.owner_pid()})，本程序待命")
+        self._stop_event.clear()
+        self._standby_thread = threading.Thread(target=self._standby_loop, name="scheduler-standby", daemon=True)
+        self._standby_thread.start()
+
     def stop(self):
-        """停止排程器"""
+        """停止排程器並釋放擁有權"""
+        self._stop_event.set()
+        if self._standby_thread:
+            self._standby_thread.join(timeout=5)
+            self._standby_thread = None
         if self.scheduler.running:
             self.scheduler.shutdown()
-            print("🛑 排程器已停止")
-    
+            logger.info("🛑 排程器已停止")
+        self.lock.release()
+
+    def status(self):
+        """排程狀態 (供 API 顯示)；待命中的程序看不到任務清單"""
+        owner = self.lock.held and self.scheduler.running
+        return {
+            "owner": owner,
+            "owner_pid": os.getpid() if owner else self.lock.owner_pid(),
+            "jobs": [
+                {"id": job.id, "next_run_time": job.next_run_time.isoformat() if job.next_run_time else None}
+                for job in self.scheduler.get_jobs()
+            ] if owner else [],
+        }
+
     def list_jobs(self):
         """列出所有任務"""
         jobs = self.scheduler.get_jobs()
@@ -122,6 +200,8 @@ class TaskScheduler:
         print("")
 
 if __name__ == '__main__':
+    from tasks import log
+    log.setup("scheduler")
     scheduler = TaskScheduler()
     scheduler.start()
     
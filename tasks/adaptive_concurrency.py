@@ -0,0 +1,145 @@
+"""
+Adaptive Concurrency - 以 AIMD (加法增、乘法減) 控制同時進行的 LLM 請求數
+- 請求成功且延遲健康：上限每輪 (約一個視窗的請求) 加 1
+- 遇到 429 / 逾時：上限減半，並遵守 Retry-After 暫停放行
+讓 backfill 等大量工作自動貼近供應商的實際容量，不需手動調整。
+- 互動請求 (/api/chat) 優先：批次工作 (摘要、backfill) 最多使用 上限 - LLM_INTERACTIVE_RESERVED 個名額 (至少 1)，
+  保留的名額只給互動請求；有互動請求在等待時，釋出的名額也先給它
+"""
+
+import os
+import time
+import threading
+
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+MIN_LIMIT = float(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+MAX_LIMIT = float(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+INITIAL_LIMIT = float(os.getenv("LLM_INITIAL_CONCURRENCY", "2"))
+# 超過這個延遲 (秒) 視為不健康，不再加大上限
+LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "30"))
+BACKOFF_FACTOR = 0.5
+# 沒有 Retry-After 時的預設暫停秒數
+DEFAULT_RETRY_AFTER = 5.0
+# 保留給互動請求的名額 (批次工作不可使用)
+INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", "1"))
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+SUCCESS = "success"
+OVERLOADED = "overloaded"  # 429 / 逾時 / 5xx 過載
+ERROR = "error"            # 其他錯誤：不調整上限
+
+
+class AIMDLimiter:
+    def __init__(self, name: str, initial: float = INITIAL_LIMIT, min_limit: float = MIN_LIMIT,
+                 max_limit: float = MAX_LIMIT, latency_target: float = LATENCY_TARGET,
+                 reserved: int = INTERACTIVE_RESERVED):
+        self.name = name
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.reserved = max(0, reserved)
+        self.in_flight = 0
+        self.waiting_interactive = 0
+        self.blocked_until = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self.last_decrease_at = 0.0
+        self._cond = threading.Condition()
+
+    def _batch_capacity(self) -> int:
+        return max(1, int(self.limit) - self.reserved)
+
+    def _admits(self, priority: str) -> bool:
+        if priority == INTERACTIVE:
+            return self.in_flight < self._batch_capacity() + self.reserved
+        return self.waiting_interactive == 0 and self.in_flight < self._batch_capacity()
+
+    def acquire(self, timeout: float | None = None, priority: str = BATCH) -> bool:
+        """
+        等待直到有可用名額 (且不在 Retry-After 暫停期間)；逾時回傳 False。
+        :param priority: INTERACTIVE (使用者正在等待的請求) 或 BATCH
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            if priority == INTERACTIVE:
+                self.waiting_interactive += 1
+            try:
+                while True:
+                    now = time.time()
+                    if now >= self.blocked_until and self._admits(priority):
+                        self.in_flight += 1
+                        return True
+                    if deadline is not None and now >= deadline:
+                        return False
+                    waits = [1.0]
+                    if self.blocked_until > now:
+                        waits.append(self.blocked_until - now)
+                    if deadline is not None:
+                        waits.append(deadline - now)
+                    self._cond.wait(max(0.01, min(waits)))
+            finally:
+                if priority == INTERACTIVE:
+                    self.waiting_interactive -= 1
+                    # 放棄等待時讓被擋住的批次工作重新檢查
+                    self._cond.notify_all()
+
+    def release(self, outcome: str, latency: float | None = None, retry_after: float | None = None) -> None:
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.time()
+            if outcome == OVERLOADED:
+                # 同一波過載 (約一個延遲目標內) 只減一次，避免連續砍到底
+                if now - self.last_decrease_at > min(self.latency_target, 5.0):
+                    self.limit = max(self.min_limit, self.limit * BACKOFF_FACTOR)
+                    self.decreases += 1
+                    self.last_decrease_at = now
+                    logger.info(f"📉 LLM 併發上限下調 ({self.name}): {self.limit:.2f}")
+                pause = retry_after if retry_after is not None else DEFAULT_RETRY_AFTER
+                self.blocked_until = max(self.blocked_until, now + pause)
+            elif outcome == SUCCESS and (latency is None or latency <= self.latency_target):
+                # 每個成功請求加 1/limit，約等於每輪加 1 (批次名額用滿即視為飽和)
+                if self.in_flight + 1 >= self._batch_capacity() and self.limit < self.max_limit:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                    self.increases += 1
+            self._cond.notify_all()
+
+    def status(self) -> dict:
+        with self._cond:
+            blocked_for = max(0.0, self.blocked_until - time.time())
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "batch_capacity": self._batch_capacity(),
+                "waiting_interactive": self.waiting_interactive,
+                "blocked_for_s": round(blocked_for, 1),
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+
+def classify_error(error: Exception) -> tuple[str, float | None]:
+    """
+    把例外分類為 OVERLOADED 或 ERROR，並取出 Retry-After (秒)。
+    OpenAI SDK 的 RateLimitError / APITimeoutError / 5xx 都帶有 status_code 或型別名稱可判斷。
+    """
+    status = getattr(error, "status_code", None)
+    name = type(error).__name__.lower()
+    retry_after = None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                retry_after = float(value)
+            except ValueError:
+                retry_after = None
+    if status == 429 or "ratelimit" in name or "timeout" in name or isinstance(error, TimeoutError) or status in (502, 503, 504):
+        return OVERLOADED, retry_after
+    return ERROR, retry_after
@@ -0,0 +1,239 @@
+"""
+Backfill - 匯入頻道的完整上傳歷史
+以 yt-dlp flat playlist 列出頻道所有影片 (不下載媒體)，分批交給 ingest pipeline，
+每批完成後寫入檢查點 (backfill_state.json)，中斷後可從上次位置繼續。
+"""
+
+import os
+import sys
+import json
+import threading
+from datetime import datetime, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tasks.rate_limit import youtube_limiter
+from tasks.ingest_pipeline import run_pipeline
+from tasks.monitor_task import update_video_db
+from tasks import llm_usage
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+BACKFILL_STATE_FILE = "backfill_state.json"
+DEFAULT_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "10"))
+
+_state_lock = threading.Lock()
+_running = set()  # 目前正在執行 backfill 的頻道
+
+
+def load_backfill_state() -> dict:
+    if os.path.exists(BACKFILL_STATE_FILE):
+        try:
+            with open(BACKFILL_STATE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+    return {}
+
+
+def save_backfill_state(state: dict) -> None:
+    tmp_path = f"{BACKFILL_STATE_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, BACKFILL_STATE_FILE)
+
+
+def reset_state() -> None:
+    """清除所有頻道的 backfill 進度 (系統重置時使用)"""
+    with _state_lock:
+        if os.path.exists(BACKFILL_STATE_FILE):
+            os.remove(BACKFILL_STATE_FILE)
+
+
+def _update_channel_state(channel_url: str, **fields) -> dict:
+    with _state_lock:
+        state = load_backfill_state()
+        entry = state.setdefault(channel_url, {})
+        entry.update(fields)
+        entry['updated_at'] = datetime.now().isoformat()
+        save_backfill_state(state)
+        return entry
+
+
+def _uploads_url(channel_url: str) -> str:
+    """頻道網址統一指向 /videos 分頁 (排除 Shorts)"""
+    base = channel_url.rstrip('/')
+    for suffix in ('/videos', '/featured', '/shorts', '/streams'):
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+    return f"{base}/videos"
+
+
+def _entry_published(entry: dict) -> str:
+    timestamp = entry.get('timestamp') or entry.get('release_timestamp')
+    if timestamp:
+        return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+    upload_date = entry.get('upload_date')
+    if upload_date:
+        return datetime.strptime(upload_date, "%Y%m%d").replace(tzinfo=timezone.utc).isoformat()
+    return ""
+
+
+def list_channel_uploads(channel_url: str) -> list[dict]:
+    """
+    列出頻道所有上傳影片 (由舊到新)，只擷取清單不下載。
+    :return: video_info dict 列表
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        'extract_flat': 'in_playlist',
+        'skip_download': True,
+        'quiet': True,
+        'no_warnings': True,
+        # 讓 flat 清單也帶有 (近似) 發布時間
+        'extractor_args': {'youtubetab': {'approximate_date': ['']}},
+    }
+    youtube_limiter.wait()
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(_uploads_url(channel_url), download=False)
+
+    channel_title = info.get('channel') or info.get('uploader') or "Unknown"
+    videos = []
+    for entry in info.get('entries') or []:
+        video_id = entry.get('id')
+        if not video_id or entry.get('live_status') in ('is_upcoming', 'is_live'):
+            continue
+        videos.append({
+            'id': video_id,
+            'title': entry.get('title') or f"Video {video_id}",
+            'link': f"https://www.youtube.com/watch?v={video_id}",
+            'published': _entry_published(entry),
+            'channel_title': channel_title,
+        })
+    # 頻道分頁由新到舊排列，backfill 從最舊的開始
+    videos.reverse()
+    return videos
+
+
+def _existing_video_ids() -> set:
+    if not os.path.exists("videos.json"):
+        return set()
+    try:
+        with open("videos.json", 'r', encoding='utf-8') as f:
+            return {v.get('id') for v in json.load(f)}
+    except (json.JSONDecodeError, OSError):
+        return set()
+
+
+def run_backfill(channel_url: str, batch_size: int = DEFAULT_BATCH_SIZE, limit: int | None = None, relist: bool = False) -> dict:
+    """
+    執行 (或繼續) 頻道 backfill。
+    :param batch_size: 每批處理的影片數；每批結束寫入檢查點
+    :param limit: 本次最多處理的影片數 (None 表示全部)
+    :param relist: 重新列出頻道影片清單 (保留已處理的進度)
+    :return: 頻道 backfill 狀態
+    :raises ValueError: batch_size 或 limit 不是正整數 (否則游標永遠不會前進)
+    """
+    if batch_size <= 0:
+        raise ValueError(f"batch_size must be positive, got {batch_size}")
+    if limit is not None and limit <= 0:
+        raise ValueError(f"limit must be positive, got {limit}")
+    with _state_lock:
+        if channel_url in _running:
+            raise RuntimeError(f"Backfill already running for {channel_url}")
+        _running.add(channel_url)
+
+    try:
+        entry = load_backfill_state().get(channel_url, {})
+        if relist or not entry.get('videos'):
+            logger.info(f"📜 列出頻道完整影片清單: {channel_url}")
+            _update_channel_state(channel_url, status='listing')
+            videos = list_channel_uploads(channel_url)
+            entry = _update_channel_state(
+                channel_url,
+                videos=videos,
+                cursor=entry.get('cursor', 0) if relist else 0,
+                processed=entry.get('processed', 0) if relist else 0,
+                skipped=entry.get('skipped', 0) if relist else 0,
+                listed_at=datetime.now().isoformat(),
+            )
+            logger.info(f"📜 共 {len(videos)} 部影片")
+
+        videos = entry['videos']
+        cursor = entry.get('cursor', 0)
+        processed = entry.get('processed', 0)
+        skipped = entry.get('skipped', 0)
+        end = len(videos) if limit is None else min(len(videos), cursor + limit)
+        _update_channel_state(channel_url, status='running', total=len(videos))
+
+        budget_paused = False
+        while cursor < end:
+            # 達到每日 LLM 預算就在批次之間停下，之後重新觸發 backfill 會從檢查點繼續
+            if llm_usage.budget_exceeded():
+                logger.warning(f"💸 已達每日 LLM 預算，暫停 backfill: {channel_url} ({cursor}/{len(videos)})")
+                budget_paused = True
+                break
+            batch = videos[cursor:min(cursor + batch_size, end)]
+            existing = _existing_video_ids()
+            todo = [v for v in batch if v['id'] not in existing]
+            skipped += len(batch) - len(todo)
+            logger.info(f"📦 Backfill {channel_url}: {cursor + 1}-{cursor + len(batch)} / {len(videos)} (新影片 {len(todo)})")
+
+            run_pipeline(todo, lambda video_info, summary: update_video_db(video_info), source="backfill")
+
+            processed += len(todo)
+            cursor += len(batch)
+            # 檢查點：整批完成後才推進游標
+            _update_channel_state(channel_url, cursor=cursor, processed=processed, skipped=skipped)
+
+        status = 'done' if cursor >= len(videos) else ('budget_paused' if budget_paused else 'paused')
+        logger.info(f"✅ Backfill {status}: {channel_url} ({cursor}/{len(videos)})")
+        entry = _update_channel_state(channel_url, status=status)
+    except Exception as e:
+        logger.error(f"❌ Backfill 失敗 ({channel_url}): {e}")
+        entry = _update_channel_state(channel_url, status='error', last_error=str(e))
+    finally:
+        with _state_lock:
+            _running.discard(channel_url)
+
+    return backfill_summary(channel_url, entry)
+
+
+def backfill_summary(channel_url: str, entry: dict | None = None) -> dict:
+    """回傳不含完整影片清單的狀態摘要 (供 API 使用)"""
+    if entry is None:
+        entry = load_backfill_state().get(channel_url, {})
+    summary = {k: v for k, v in entry.items() if k != 'videos'}
+    summary['channel_url'] = channel_url
+    summary['total'] = len(entry.get('videos', []))
+    summary['running'] = channel_url in _running
+    return summary
+
+
+def backfill_status() -> list[dict]:
+    return [backfill_summary(url, entry) for url, entry in load_backfill_state().items()]
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("backfill")
+
+    import argparse
+
+    def positive_int(value):
+        number = int(value)
+        if number <= 0:
+            raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+        return number
+
+    parser = argparse.ArgumentParser(description="Backfill a YouTube channel's full upload history")
+    parser.add_argument("channel_url")
+    parser.add_argument("--batch-size", type=positive_int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--limit", type=positive_int, default=None, help="最多處理的影片數")
+    parser.add_argument("--relist", action="store_true", help="重新列出頻道影片清單")
+    args = parser.parse_args()
+
+    result = run_backfill(args.channel_url, batch_size=args.batch_size, limit=args.limit, relist=args.relist)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,444 @@
+"""
+Batch Summarizer - 以 OpenAI 相容的 Batch API 大量產生摘要
+大量 backfill 時不再逐部同步呼叫 summarize_video，而是：
+1. 收集待摘要的影片並預取逐字稿
+2. 寫成 batch JSONL (batches/{job_id}.jsonl) 並上傳 (files.create purpose="batch")
+3. 建立 batch job，輪詢直到完成
+4. 下載結果，透過 save_summary 與 videos.json 回寫
+每個步驟的進度都記錄在 batch_jobs.json，程式重啟後執行 resume 即可從中斷處繼續。
+可用 benchmarks/llm_standin.py 在本機模擬 Batch API 端點測試。
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tasks.llm_gateway import get_providers, LLMUnavailable
+from tasks.summarizer import build_summary_messages, clean_summary, get_summary_path, save_summary, SUMMARY_TEMPERATURE
+from tasks.ingest_pipeline import prefetch_transcript, PREFETCH_WORKERS
+from tasks.monitor_task import add_videos_to_db
+from tasks.embeddings import add_videos as add_embeddings
+from tasks.dedup import check_duplicate
+from tasks import llm_usage
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+BATCH_JOBS_FILE = "batch_jobs.json"
+BATCH_DIR = "batches"
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+# 單一 batch job 的請求數上限，超過會拆成多個 job
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "500"))
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "60"))
+
+# 本地 job 狀態
+PREPARED = "prepared"        # JSONL 已寫好，尚未建立遠端 batch
+SUBMITTED = "submitted"      # 遠端 batch 處理中
+DOWNLOADED = "downloaded"    # 結果已下載，尚未全部回寫
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (PREPARED, SUBMITTED, DOWNLOADED)
+# 遠端 batch 的終止狀態 (expired / cancelled 仍可能有部分結果)
+REMOTE_TERMINAL = ("completed", "failed", "expired", "cancelled")
+
+_jobs_lock = threading.Lock()
+
+
+def load_jobs() -> dict:
+    if os.path.exists(BATCH_JOBS_FILE):
+        try:
+            with open(BATCH_JOBS_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+    return {}
+
+
+def save_jobs(jobs: dict) -> None:
+    tmp_path = f"{BATCH_JOBS_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(jobs, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, BATCH_JOBS_FILE)
+
+
+def _update_job(job_id: str, **fields) -> dict:
+    with _jobs_lock:
+        jobs = load_jobs()
+        job = jobs.setdefault(job_id, {})
+        job.update(fields)
+        job['updated_at'] = datetime.now().isoformat()
+        save_jobs(jobs)
+        return job
+
+
+def reset_jobs() -> list[str]:
+    """
+    刪除 batch job 紀錄與 JSONL (系統重置時使用)。
+    尚未完成的 job 不會再被 resume，遠端已產生的結果也不會回寫。
+    :return: 被放棄的未完成 job id
+    """
+    with _jobs_lock:
+        jobs = load_jobs()
+        dropped = [job_id for job_id, job in jobs.items() if job.get('status') in ACTIVE_STATUSES]
+        if os.path.exists(BATCH_JOBS_FILE):
+            os.remove(BATCH_JOBS_FILE)
+        if os.path.isdir(BATCH_DIR):
+            for name in os.listdir(BATCH_DIR):
+                if name.endswith(".jsonl"):
+                    os.remove(os.path.join(BATCH_DIR, name))
+    if dropped:
+        logger.warning(f"⚠️ 已放棄未完成的 batch job: {', '.join(dropped)}")
+    return dropped
+
+
+def _client():
+    """Batch 一律使用主要供應商 (LLM_BASE_URL / LLM_MODEL)"""
+    providers = get_providers()
+    if not providers:
+        raise LLMUnavailable("LLM_API_KEY / LLM_BASE_URL not configured")
+    return providers[0].client, providers[0].model
+
+
+def _load_video_db() -> list[dict]:
+    if not os.path.exists("videos.json"):
+        return []
+    try:
+        with open("videos.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return []
+
+
+def _ids_in_active_jobs() -> set:
+    ids = set()
+    for job in load_jobs().values():
+        if job.get('status') in ACTIVE_STATUSES:
+            ids.update(job.get('videos', {}))
+    return ids
+
+
+def pending_from_db(limit: int | None = None) -> list[dict]:
+    """videos.json 中還沒有摘要檔的影片 (由舊到新)"""
+    queued = _ids_in_active_jobs()
+    videos = [
+        v for v in reversed(_load_video_db())
+        if v.get('id') and v['id'] not in queued and not os.path.exists(get_summary_path(v['id']))
+    ]
+    return videos[:limit] if limit else videos
+
+
+def pending_from_backfill(channel_url: str, limit: int | None = None) -> list[dict]:
+    """backfill 清單中尚未進入資料庫的影片 (需先以 tasks.backfill 列出清單)"""
+    from tasks.backfill import load_backfill_state, list_channel_uploads, _update_channel_state
+
+    entry = load_backfill_state().get(channel_url, {})
+    videos = entry.get('videos')
+    if not videos:
+        logger.info(f"📜 列出頻道完整影片清單: {channel_url}")
+        videos = list_channel_uploads(channel_url)
+        _update_channel_state(channel_url, videos=videos, cursor=0, processed=0, skipped=0,
+                              listed_at=datetime.now().isoformat(), status='paused')
+    existing = {v.get('id') for v in _load_video_db()} | _ids_in_active_jobs()
+    pending = [v for v in videos if v['id'] not in existing]
+    return pending[:limit] if limit else pending
+
+
+def _request_line(video_id: str, messages: list[dict], model: str) -> dict:
+    return {
+        "custom_id": video_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": model, "messages": messages, "temperature": SUMMARY_TEMPERATURE},
+    }
+
+
+def prepare_jobs(videos: list[dict], max_requests: int = BATCH_MAX_REQUESTS) -> list[str]:
+    """
+    預取逐字稿並寫出 batch JSONL。沒有逐字稿或判定為重複的影片直接寫入資料庫 (與同步流程一致)。
+    :return: 建立的本地 job id 列表
+    """
+    _, model = _client()
+    os.makedirs(BATCH_DIR, exist_ok=True)
+
+    requests = []
+    skipped = []
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="batch-prefetch") as executor:
+        futures = [(video_info, executor.submit(prefetch_transcript, video_info)) for video_info in videos]
+        for video_info, future in futures:
+            try:
+                transcript_text = future.result()
+            except Exception as e:
+                logger.error(f"❌ 預取逐字稿失敗 ({video_info['id']}): {e}")
+                transcript_text = None
+            if not transcript_text:
+                logger.warning(f"⚠️ 無逐字稿，略過摘要: {video_info['id']}")
+                skipped.append(video_info)
+                continue
+            original = check_duplicate(video_info, transcript_text)
+            if original:
+                video_info['duplicate_of'] = original
+                skipped.append(video_info)
+                continue
+            requests.append((video_info, _request_line(video_info['id'], build_summary_messages(transcript_text, model), model)))
+
+    if skipped:
+        add_videos_to_db(skipped)
+
+    job_ids = []
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for offset in range(0, len(requests), max_requests):
+        chunk = requests[offset:offset + max_requests]
+        job_id = f"batch_{stamp}_{offset // max_requests}"
+        input_path = os.path.join(BATCH_DIR, f"{job_id}.jsonl")
+        with open(input_path, 'w', encoding='utf-8') as f:
+            for _, line in chunk:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        _update_job(
+            job_id,
+            status=PREPARED,
+            created_at=datetime.now().isoformat(),
+            model=model,
+            input_path=input_path,
+            videos={video_info['id']: video_info for video_info, _ in chunk},
+            applied=[],
+        )
+        logger.info(f"📝 已寫出 batch 請求: {input_path} ({len(chunk)} 部影片)")
+        job_ids.append(job_id)
+    return job_ids
+
+
+def _find_remote_batch(client, job_id: str):
+    """建立 batch 後、寫入狀態前中斷時，以 metadata 找回已建立的 batch，避免重複送出"""
+    try:
+        for batch in client.batches.list(limit=100):
+            if (getattr(batch, 'metadata', None) or {}).get('local_job_id') == job_id:
+                return batch
+    except Exception as e:
+        logger.warning(f"⚠️ 查詢既有 batch 失敗: {e}")
+    return None
+
+
+def submit_job(job_id: str) -> dict:
+    client, _ = _client()
+    job = load_jobs()[job_id]
+
+    input_file_id = job.get('input_file_id')
+    if input_file_id:
+        existing = _find_remote_batch(client, job_id)
+        if existing is not None:
+            return _update_job(job_id, status=SUBMITTED, batch_id=existing.id, remote_status=existing.status)
+    else:
+        with open(job['input_path'], 'rb') as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        input_file_id = uploaded.id
+        _update_job(job_id, input_file_id=input_file_id)
+
+    batch = client.batches.create(
+        input_file_id=input_file_id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+        metadata={"local_job_id": job_id},
+    )
+    logger.info(f"🚀 已送出 batch {job_id}: {batch.id}")
+    return _update_job(job_id, status=SUBMITTED, batch_id=batch.id, remote_status=batch.status,
+                       submitted_at=datetime.now().isoformat())
+
+
+def _download(client, file_id: str, path: str) -> None:
+    content = client.files.content(file_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content.read())
+    os.replace(tmp_path, path)
+
+
+def poll_job(job_id: str) -> dict:
+    """查詢遠端 batch 狀態；結束時下載結果檔"""
+    client, _ = _client()
+    job = load_jobs()[job_id]
+    batch = client.batches.retrieve(job['batch_id'])
+    counts = getattr(batch, 'request_counts', None)
+    fields = {'remote_status': batch.status}
+    if counts is not None:
+        fields['request_counts'] = {'total': counts.total, 'completed': counts.completed, 'failed': counts.failed}
+    if batch.status not in REMOTE_TERMINAL:
+        return _update_job(job_id, **fields)
+
+    if batch.output_file_id:
+        output_path = os.path.join(BATCH_DIR, f"{job_id}.output.jsonl")
+        _download(client, batch.output_file_id, output_path)
+        fields['output_path'] = output_path
+    if getattr(batch, 'error_file_id', None):
+        error_path = os.path.join(BATCH_DIR, f"{job_id}.errors.jsonl")
+        _download(client, batch.error_file_id, error_path)
+        fields['error_path'] = error_path
+    logger.info(f"📥 Batch {job_id} 結束 ({batch.status})，開始回寫結果")
+    return _update_job(job_id, status=DOWNLOADED, finished_at=datetime.now().isoformat(), **fields)
+
+
+def _read_results(output_path: str | None) -> dict:
+    """:return: {video_id: (摘要內容, usage)}"""
+    results = {}
+    if not output_path or not os.path.exists(output_path):
+        return results
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get('response') or {}
+            if item.get('error') or response.get('status_code') != 200:
+                logger.warning(f"⚠️ Batch 請求失敗 ({item.get('custom_id')}): {item.get('error') or response.get('status_code')}")
+                continue
+            try:
+                content = response['body']['choices'][0]['message']['content'] or ""
+            except (KeyError, IndexError, TypeError):
+                continue
+            if content.strip():
+                results[item['custom_id']] = (content, response['body'].get('usage'))
+    return results
+
+
+def apply_job(job_id: str) -> dict:
+    """
+    把結果回寫為摘要檔並寫入資料庫。逐部記錄 applied，重複執行不會重複回寫。
+    沒有結果的影片仍會寫入資料庫 (之後可由 pending_from_db 再次排入)。
+    """
+    job = load_jobs()[job_id]
+    results = _read_results(job.get('output_path'))
+    applied = set(job.get('applied', []))
+    summarized = []
+    for video_id, video_info in job['videos'].items():
+        if video_id in applied:
+            continue
+        content, usage = results.get(video_id, (None, None))
+        if content:
+            save_summary(video_id, clean_summary(content))
+            summarized.append(video_info)
+            llm_usage.record(
+                "summary", "batch", job.get('model'), **llm_usage.usage_fields(usage),
+                video_id=video_id, channel=video_info.get('channel_title'), source="batch",
+                price_factor=llm_usage.BATCH_PRICE_FACTOR,
+            )
+        add_videos_to_db([video_info])
+        applied.add(video_id)
+        _update_job(job_id, applied=sorted(applied))
+    if summarized:
+        add_embeddings(summarized)
+
+    remote_status = job.get('remote_status')
+    status = DONE if remote_status == "completed" else FAILED
+    logger.info(f"✅ Batch {job_id} 回寫完成: {len(summarized)}/{len(job['videos'])} 部影片取得摘要")
+    return _update_job(job_id, status=status, summarized=job.get('summarized', 0) + len(summarized))
+
+
+def advance_job(job_id: str) -> dict:
+    """依目前狀態推進一步 (送出 / 輪詢 / 回寫)"""
+    status = load_jobs()[job_id].get('status')
+    if status == PREPARED:
+        # 已送出的 job 照常輪詢與回寫；尚未送出的等預算重置後再送
+        if llm_usage.budget_exceeded():
+            logger.warning(f"💸 已達每日 LLM 預算，暫緩送出 batch {job_id}")
+            return load_jobs()[job_id]
+        return submit_job(job_id)
+    if status == SUBMITTED:
+        return poll_job(job_id)
+    if status == DOWNLOADED:
+        return apply_job(job_id)
+    return load_jobs()[job_id]
+
+
+def resume_jobs(wait: bool = True, poll_interval: float = BATCH_POLL_INTERVAL, job_ids: list[str] | None = None) -> list[dict]:
+    """
+    推進所有未完成的 job；wait=True 時持續輪詢直到全部結束。
+    :return: 各 job 的狀態摘要
+    """
+    while True:
+        jobs = load_jobs()
+        active = [job_id for job_id in (job_ids or jobs) if jobs.get(job_id, {}).get('status') in ACTIVE_STATUSES]
+        for job_id in active:
+            try:
+                # 狀態有變化就立即接著處理下一步 (例如下載完成後直接回寫)
+                while True:
+                    before = load_jobs()[job_id].get('status')
+                    after = advance_job(job_id).get('status')
+                    if after == before or after not in ACTIVE_STATUSES:
+                        break
+            except Exception as e:
+                logger.error(f"❌ Batch {job_id} 處理失敗: {e}")
+                _update_job(job_id, last_error=str(e))
+        jobs = load_jobs()
+        if not wait or not any(jobs.get(job_id, {}).get('status') in ACTIVE_STATUSES for job_id in (job_ids or jobs)):
+            break
+        time.sleep(poll_interval)
+    return batch_status(job_ids)
+
+
+def run_batch(videos: list[dict], wait: bool = True, poll_interval: float = BATCH_POLL_INTERVAL) -> list[dict]:
+    """準備、送出並 (可選) 等待 batch 完成"""
+    if not videos:
+        logger.info("✨ 沒有待摘要的影片")
+        return []
+    job_ids = prepare_jobs(videos)
+    if not job_ids:
+        return []
+    return resume_jobs(wait=wait, poll_interval=poll_interval, job_ids=job_ids)
+
+
+def batch_status(job_ids: list[str] | None = None) -> list[dict]:
+    """不含影片清單的 job 狀態摘要"""
+    jobs = load_jobs()
+    summaries = []
+    for job_id in (job_ids or jobs):
+        job = jobs.get(job_id)
+        if job is None:
+            continue
+        summary = {k: v for k, v in job.items() if k not in ('videos', 'applied')}
+        summary['job_id'] = job_id
+        summary['total'] = len(job.get('videos', {}))
+        summary['applied'] = len(job.get('applied', []))
+        summaries.append(summary)
+    return summaries
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("batch_summarizer")
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize videos through the OpenAI-compatible Batch API")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = subparsers.add_parser("submit", help="收集待摘要影片並送出 batch")
+    submit_parser.add_argument("--channel", help="從頻道 backfill 清單取影片 (預設: videos.json 中缺摘要的影片)")
+    submit_parser.add_argument("--limit", type=int, default=None, help="最多處理的影片數")
+    submit_parser.add_argument("--no-wait", action="store_true", help="送出後不等待完成 (之後以 resume 繼續)")
+    submit_parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL)
+
+    resume_parser = subparsers.add_parser("resume", help="繼續未完成的 batch job")
+    resume_parser.add_argument("--no-wait", action="store_true")
+    resume_parser.add_argument("--poll-interval", type=float, default=BATCH_POLL_INTERVAL)
+
+    subparsers.add_parser("status", help="列出 batch job 狀態")
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        if args.channel:
+            pending = pending_from_backfill(args.channel, limit=args.limit)
+        else:
+            pending = pending_from_db(limit=args.limit)
+        print(f"📦 待摘要影片: {len(pending)} 部")
+        result = run_batch(pending, wait=not args.no_wait, poll_interval=args.poll_interval)
+    elif args.command == "resume":
+        result = resume_jobs(wait=not args.no_wait, poll_interval=args.poll_interval)
+    else:
+        result = batch_status()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
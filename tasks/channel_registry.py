@@ -0,0 +1,262 @@
+"""
+Channel Registry - 監控頻道清單與各頻道狀態 (SQLite)
+- 頻道與監控進度 (channel_id、last_video_link…) 存在 CHANNEL_DB，取代原本寫死的 CHANNELS 與 monitor_state.json
+- 只在單一主機上使用：同一個工作目錄的 dashboard、sweep worker 與 CLI 共用 CHANNEL_DB，
+  頻道由該目錄唯一的 sweep worker 檢查 (見 sweep_worker.lock / update.lock)。
+  影片資料 (videos.json、摘要、逐字稿) 也都在本機工作目錄，不支援把頻道分給多台主機處理
+第一次使用時會從 monitor_state.json 與預設頻道清單匯入。
+頻道清單每次檢查更新時重新讀取，新增/移除頻道 (API: /api/channels) 立即生效，不需重啟。
+"""
+
+import os
+import sys
+import re
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlsplit, unquote
+
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+CHANNEL_DB = os.getenv("CHANNEL_DB", "channels.sqlite")
+LEGACY_STATE_FILE = "monitor_state.json"
+
+DEFAULT_CHANNELS = [
+    "https://www.youtube.com/@LennysPodcast",
+    "https://www.youtube.com/@googleantigravity",
+    "https://www.youtube.com/@Google",
+    "https://www.youtube.com/@ycombinator",
+    "https://www.youtube.com/@a16z",
+    "https://www.youtube.com/@aiDotEngineer",
+    "https://www.youtube.com/@EveryInc",
+    "https://www.youtube.com/@AcquiredFM",
+    "https://www.youtube.com/@howiaipodcast",
+    "https://www.youtube.com/@hamelhusain7140",
+    "https://www.youtube.com/@StephenGPope",
+    "https://www.youtube.com/@anthropic-ai",
+    "https://www.youtube.com/@GregIsenberg"
+]
+
+# 可由 update_channel 更新的狀態欄位
+STATE_FIELDS = ("channel_id", "title", "last_video_link", "last_video_title", "last_checked", "resolve_error")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    url TEXT PRIMARY KEY,
+    channel_id TEXT,
+    last_video_link TEXT,
+    last_video_title TEXT,
+    last_checked TEXT,
+    title TEXT,
+    resolve_error TEXT,
+    added_at TEXT
+);
+"""
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(CHANNEL_DB, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if CHANNEL_DB not in _initialized:
+            with _init_lock:
+                if CHANNEL_DB not in _initialized:
+                    # WAL：API 讀取頻道清單時不會被 worker 寫入進度擋住
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    _add_missing_columns(conn)
+                    _migrate(conn)
+                    _normalize_existing_urls(conn)
+                    _initialized.add(CHANNEL_DB)
+        yield conn
+    finally:
+        conn.close()
+
+
+def _add_missing_columns(conn: sqlite3.Connection) -> None:
+    """舊版資料庫缺少的欄位 (title、resolve_error)"""
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(channels)")}
+    for column in ("title", "resolve_error"):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE channels ADD COLUMN {column} TEXT")
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """資料庫是空的時候，匯入 monitor_state.json 的進度與預設頻道清單"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0] == 0:
+            legacy = {}
+            if os.path.exists(LEGACY_STATE_FILE):
+                try:
+                    with open(LEGACY_STATE_FILE, 'r', encoding='utf-8') as f:
+                        legacy = json.load(f)
+                except json.JSONDecodeError:
+                    legacy = {}
+            now = datetime.now().isoformat()
+            # 舊版狀態檔的網址可能帶 /videos 或大寫 handle，先正規化再與預設清單合併
+            legacy = {normalize_channel_url(url) or url: entry for url, entry in legacy.items()}
+            defaults = [normalize_channel_url(url) for url in DEFAULT_CHANNELS]
+            for url in defaults + [u for u in legacy if u not in defaults]:
+                entry = legacy.get(url, {})
+                conn.execute(
+                    "INSERT INTO channels (url, channel_id, last_video_link, last_video_title, last_checked, added_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (url, entry.get('channel_id'), entry.get('last_video_link'),
+                     entry.get('last_video_title'), entry.get('last_checked'), now),
+                )
+            if legacy:
+                logger.info(f"📦 已從 {LEGACY_STATE_FILE} 匯入 {len(legacy)} 個頻道的監控進度")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _normalize_existing_urls(conn: sqlite3.Connection) -> None:
+    """舊版存入的網址 (帶 /videos、大小寫不同的 handle) 改為正規化後的網址；正規化後重複的保留較早加入的一筆"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute("SELECT url FROM channels ORDER BY added_at, url").fetchall()
+        groups = {}
+        for row in rows:
+            groups.setdefault(normalize_channel_url(row["url"]) or row["url"], []).append(row["url"])
+        for normalized, urls in groups.items():
+            keep, duplicates = urls[0], urls[1:]
+            for url in duplicates:
+                conn.execute("DELETE FROM channels WHERE url = ?", (url,))
+                logger.info(f"🧹 移除重複的頻道網址: {url} (同 {normalized})")
+            if keep != normalized:
+                conn.execute("UPDATE channels SET url = ? WHERE url = ?", (normalized, keep))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# === 頻道清單 ===
+
+_CHANNEL_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com")
+_CHANNEL_PATH_RE = re.compile(r'^/(@[\w.\-]+|channel/UC[\w\-]+|c/[\w.\-]+|user/[\w.\-]+)(?:/([\w\-]+))?/?$')
+# 頻道頁的分頁；網址帶有這些後綴時仍是同一個頻道
+_CHANNEL_TABS = {
+    "videos", "featured", "streams", "shorts", "playlists", "community", "posts",
+    "about", "live", "podcasts", "releases", "courses", "store", "channels",
+}
+
+
+def normalize_channel_url(url: str) -> str | None:
+    """
+    統一頻道網址格式 (https://www.youtube.com/@handle、/channel/UC...)；不是頻道網址時回傳 None。
+    接受沒有 scheme 的網址與單獨的 @handle，去除分頁後綴 (/videos、/featured…) 與查詢字串 (?si=…)；
+    handle 不分大小寫，一律轉為小寫，同一頻道只會有一種寫法。
+    """
+    url = url.strip()
+    if url.startswith("@"):
+        url = f"https://www.youtube.com/{url}"
+    elif "://" not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or (parts.hostname or "") not in _CHANNEL_HOSTS:
+        return None
+    match = _CHANNEL_PATH_RE.match(unquote(parts.path))
+    if not match or (match.group(2) and match.group(2).lower() not in _CHANNEL_TABS):
+        return None
+    path = match.group(1)
+    if path.startswith("@"):
+        path = path.casefold()
+    return f"https://www.youtube.com/{path}"
+
+
+def list_channels() -> list[dict]:
+    with _connect() as conn:
+        return [dict(row) for row in conn.execute("SELECT * FROM channels ORDER BY added_at, url")]
+
+
+def channel_status(channel: dict) -> str:
+    """ready：已解析 channel_id；error：解析失敗；pending：等待 worker 解析"""
+    if channel.get("channel_id"):
+        return "ready"
+    return "error" if channel.get("resolve_error") else "pending"
+
+
+def get_channel(url: str) -> dict | None:
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM channels WHERE url = ?", (url,)).fetchone()
+    return dict(row) if row else None
+
+
+def find_by_channel_id(channel_id: str, exclude_url: str | None = None) -> dict | None:
+    """已解析出相同 channel_id 的其他頻道 (同一頻道以不同網址加入時)"""
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT * FROM channels WHERE channel_id = ? AND url != ? ORDER BY added_at LIMIT 1",
+            (channel_id, exclude_url or ""),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def add_channel(url: str) -> bool:
+    """:return: 是否為新加入的頻道"""
+    with _connect() as conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO channels (url, added_at) VALUES (?, ?)", (url, datetime.now().isoformat())
+        )
+        return cursor.rowcount > 0
+
+
+def remove_channel(url: str) -> bool:
+    with _connect() as conn:
+        return conn.execute("DELETE FROM channels WHERE url = ?", (url,)).rowcount > 0
+
+
+def update_channel(url: str, **fields) -> None:
+    """更新頻道的監控狀態 (channel_id、last_video_link 等)"""
+    unknown = set(fields) - set(STATE_FIELDS)
+    if unknown:
+        raise ValueError(f"未知的頻道欄位: {', '.join(sorted(unknown))}")
+    if not fields:
+        return
+    columns = ", ".join(f"{field} = ?" for field in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE channels SET {columns} WHERE url = ?", (*fields.values(), url))
+
+
+def reset_progress() -> None:
+    """清除所有頻道的監控進度 (保留頻道清單與 channel_id)"""
+    with _connect() as conn:
+        conn.execute("UPDATE channels SET last_video_link = NULL, last_video_title = NULL, last_checked = NULL")
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("channel_registry")
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage monitored channels")
+    parser.add_argument("--add", metavar="URL", help="新增監控頻道")
+    parser.add_argument("--remove", metavar="URL", help="移除監控頻道")
+    args = parser.parse_args()
+
+    if args.add:
+        url = normalize_channel_url(args.add)
+        if not url:
+            parser.error(f"不是 YouTube 頻道網址: {args.add}")
+        print("✅ 已新增" if add_channel(url) else "⚠️ 頻道已存在", url)
+    if args.remove:
+        url = normalize_channel_url(args.remove) or args.remove
+        print("🗑️ 已移除" if remove_channel(url) else "⚠️ 找不到頻道", url)
+
+    for channel in list_channels():
+        print(f"{channel['url']}  (channel_id={channel['channel_id']}, last={channel['last_video_title']})")
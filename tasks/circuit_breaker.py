@@ -0,0 +1,189 @@
+"""
+Circuit Breaker - 當 YouTube 開始封鎖時，暫停對失敗端點的請求
+每個端點 (transcript API / yt-dlp / RSS) 各自一個斷路器：
+closed -> (連續失敗達門檻) -> open -> (冷卻結束) -> half_open -> (試探成功) -> closed
+另外提供「無逐字稿」結論的負面快取 (含 TTL)，避免每次都重新嘗試。
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+NEGATIVE_CACHE_FILE = "transcript_negative_cache.json"
+NEGATIVE_CACHE_TTL = int(os.getenv("TRANSCRIPT_NEGATIVE_TTL", str(7 * 24 * 3600)))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，請求被直接拒絕"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 900.0, max_cooldown: float = 6 * 3600.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.total_failures = 0
+        self.total_rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """是否允許送出請求；half_open 狀態下只放行一個試探請求"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.cooldown:
+                    self.total_rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            # HALF_OPEN
+            if self._probe_in_flight:
+                self.total_rejected += 1
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"✅ 斷路器恢復: {self.name}")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.cooldown = self.base_cooldown
+            self._probe_in_flight = False
+
+    def record_failure(self, error=None) -> None:
+        with self._lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)[:200] if error else None
+            if self.state == HALF_OPEN:
+                # 試探失敗：重新開啟，冷卻時間加倍
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self._trip()
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.time()
+        self._probe_in_flight = False
+        logger.warning(f"🚫 斷路器開啟: {self.name} (冷卻 {self.cooldown:.0f} 秒, 最後錯誤: {self.last_error})")
+
+    def call(self, func, *args, **kwargs):
+        """透過斷路器呼叫 func；例外會被記錄為失敗並重新拋出"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    def status(self) -> dict:
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, round(self.cooldown - (time.time() - self.opened_at), 1))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "total_rejected": self.total_rejected,
+                "cooldown_seconds": self.cooldown,
+                "retry_in_seconds": retry_in,
+                "last_error": self.last_error,
+            }
+
+
+# 端點斷路器 (全域共用)
+_breakers = {
+    "transcript_api": CircuitBreaker("transcript_api", failure_threshold=3, cooldown=900),
+    "ytdlp": CircuitBreaker("ytdlp", failure_threshold=3, cooldown=1800),
+    "rss": CircuitBreaker("rss", failure_threshold=5, cooldown=600),
+}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+def breaker_status() -> dict:
+    return {name: b.status() for name, b in _breakers.items()}
+
+
+# === Negative Cache: 「此影片沒有逐字稿」的結論 ===
+_negative_lock = threading.Lock()
+
+
+def _load_negative_cache() -> dict:
+    if os.path.exists(NEGATIVE_CACHE_FILE):
+        try:
+            with open(NEGATIVE_CACHE_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+    return {}
+
+
+def _save_negative_cache(cache: dict) -> None:
+    tmp_path = f"{NEGATIVE_CACHE_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, NEGATIVE_CACHE_FILE)
+
+
+def get_negative_verdict(video_id: str) -> dict | None:
+    """回傳未過期的負面結論 (例如 TranscriptsDisabled)，否則 None"""
+    with _negative_lock:
+        cache = _load_negative_cache()
+        entry = cache.get(video_id)
+        if not entry:
+            return None
+        if time.time() - entry.get("ts", 0) > entry.get("ttl", NEGATIVE_CACHE_TTL):
+            del cache[video_id]
+            _save_negative_cache(cache)
+            return None
+        return entry
+
+
+def record_negative_verdict(video_id: str, reason: str, ttl: int = NEGATIVE_CACHE_TTL) -> None:
+    with _negative_lock:
+        cache = _load_negative_cache()
+        cache[video_id] = {
+            "reason": reason,
+            "ts": time.time(),
+            "ttl": ttl,
+            "recorded_at": datetime.now().isoformat(),
+        }
+        _save_negative_cache(cache)
+    logger.info(f"🗒️ 記錄無逐字稿結論 ({video_id}): {reason}")
+
+
+def clear_negative_verdict(video_id: str) -> None:
+    with _negative_lock:
+        cache = _load_negative_cache()
+        if cache.pop(video_id, None) is not None:
+            _save_negative_cache(cache)
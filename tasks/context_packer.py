@@ -0,0 +1,218 @@
+"""
+Context Packer - 以 token 為單位把 prompt、逐字稿與對話歷史塞進模型的 context 預算
+取代原本的字元截斷 (transcript[:100000] 等)：中英文的字元/token 比例差很多，
+字元截斷不是浪費 context 就是超過上限。
+超出預算時依優先順序整句捨棄片段，而不是在句子中間截斷。
+"""
+
+import os
+import re
+from functools import lru_cache
+
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+# 各模型的 context window (以名稱前綴比對，越長的前綴越優先)
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o": 128_000,
+    "gpt-4.1": 1_000_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5": 16_385,
+    "gpt-5": 400_000,
+    "o1": 200_000,
+    "o3": 200_000,
+    "o4": 200_000,
+    "gemini": 1_000_000,
+    "claude": 200_000,
+    "deepseek": 64_000,
+    "qwen": 32_000,
+    "llama": 8_192,
+}
+DEFAULT_CONTEXT_TOKENS = 32_000
+# 保留給模型輸出的 token
+OUTPUT_RESERVE_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "4096"))
+# 每則訊息的格式開銷 (role 標記等)
+MESSAGE_OVERHEAD_TOKENS = 4
+GAP_MARKER = " [...] "
+
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+# 句子邊界：中英文句末標點之後，或換行
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[。！？!?])|(?<=\.)(?=\s)|\n+')
+MAX_SEGMENT_TOKENS = 64
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """tiktoken 為選用套件；沒有安裝或模型不支援時回傳 None (改用估算)"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        if model.startswith(("gpt-", "o1", "o3", "o4")):
+            return tiktoken.get_encoding("o200k_base")
+        return None
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """計算 token 數：OpenAI 模型且有 tiktoken 時精確計算，否則以 CJK 1 字 ≈ 1 token、其他 4 字元 ≈ 1 token 估算"""
+    if not text:
+        return 0
+    model = model or os.getenv("LLM_MODEL", "gpt-4o")
+    encoding = _get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def context_window(model: str | None = None) -> int:
+    override = os.getenv("LLM_CONTEXT_TOKENS")
+    if override:
+        return int(override)
+    model = (model or os.getenv("LLM_MODEL", "gpt-4o")).lower().split("/")[-1]
+    for prefix in sorted(MODEL_CONTEXT_TOKENS, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_CONTEXT_TOKENS[prefix]
+    return DEFAULT_CONTEXT_TOKENS
+
+
+def input_budget(model: str | None = None, max_input_tokens: int | None = None) -> int:
+    """可用於輸入的 token 預算 = context window - 輸出保留 (可再以 max_input_tokens 限制)"""
+    budget = context_window(model) - OUTPUT_RESERVE_TOKENS
+    if max_input_tokens:
+        budget = min(budget, max_input_tokens)
+    return max(budget, 0)
+
+
+def split_segments(text: str, model: str | None = None) -> list[str]:
+    """切成句子；沒有標點的自動字幕則依空白切成不超過 MAX_SEGMENT_TOKENS 的片段"""
+    segments = []
+    for sentence in _SENTENCE_SPLIT_RE.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if count_tokens(sentence, model) <= MAX_SEGMENT_TOKENS:
+            segments.append(sentence)
+            continue
+        words = sentence.split(' ') if ' ' in sentence else list(sentence)
+        joiner = ' ' if ' ' in sentence else ''
+        chunk = []
+        chunk_tokens = 0
+        for word in words:
+            word_tokens = count_tokens(word, model) + 1
+            if chunk and chunk_tokens + word_tokens > MAX_SEGMENT_TOKENS:
+                segments.append(joiner.join(chunk))
+                chunk, chunk_tokens = [], 0
+            chunk.append(word)
+            chunk_tokens += word_tokens
+        if chunk:
+            segments.append(joiner.join(chunk))
+    return segments
+
+
+def _coverage_order(n: int) -> list[int]:
+    """
+    片段的保留優先順序：先頭尾，再以二分方式均勻取中間，
+    預算不足時捨棄的片段會平均分散在整段內容，而不是整個砍掉後半段。
+    """
+    if n <= 2:
+        return list(range(n))
+    order = [0, n - 1]
+    intervals = [(0, n - 1)]
+    while intervals:
+        next_intervals = []
+        for lo, hi in intervals:
+            if hi - lo < 2:
+                continue
+            mid = (lo + hi) // 2
+            order.append(mid)
+            next_intervals.extend([(lo, mid), (mid, hi)])
+        intervals = next_intervals
+    return order
+
+
+def pack_segments(segments: list[str], priorities: list[int], budget: int, model: str | None = None, joiner: str = " ") -> str:
+    """
+    依優先順序 (數字越小越優先) 挑選片段直到用完預算，再依原順序組合；
+    被捨棄的區段以 [...] 標示。
+    """
+    kept = set()
+    used = 0
+    gap_tokens = count_tokens(GAP_MARKER, model)
+    for index in sorted(range(len(segments)), key=lambda i: priorities[i]):
+        cost = count_tokens(segments[index], model) + gap_tokens
+        if used + cost > budget:
+            continue
+        kept.add(index)
+        used += cost
+
+    parts = []
+    previous = -1
+    for index in sorted(kept):
+        if index != previous + 1 and parts:
+            parts.append(GAP_MARKER.strip())
+        parts.append(segments[index])
+        previous = index
+    if parts and previous != len(segments) - 1:
+        parts.append(GAP_MARKER.strip())
+    return joiner.join(parts)
+
+
+def fit_text(text: str, budget: int, model: str | None = None) -> str:
+    """把文字縮減到 budget token 以內 (整句捨棄，保持均勻覆蓋)"""
+    if count_tokens(text, model) <= budget:
+        return text
+    segments = split_segments(text, model)
+    order = _coverage_order(len(segments))
+    priorities = [0] * len(segments)
+    for rank, index in enumerate(order):
+        priorities[index] = rank
+    packed = pack_segments(segments, priorities, budget, model)
+    logger.info(f"✂️ 內容超過預算，已依優先順序保留 {count_tokens(packed, model)}/{budget} tokens")
+    return packed
+
+
+def fit_prompt(template: str, placeholder: str, text: str, model: str | None = None,
+               system_prompt: str = "", max_input_tokens: int | None = None) -> str:
+    """
+    把 text 填入 template 的 placeholder，並確保整個 prompt (含 system prompt) 不超過模型預算。
+    :return: 完成的 user prompt
+    """
+    overhead = count_tokens(template.replace(placeholder, ""), model) + count_tokens(system_prompt, model) + 2 * MESSAGE_OVERHEAD_TOKENS
+    budget = input_budget(model, max_input_tokens) - overhead
+    return template.replace(placeholder, fit_text(text, budget, model))
+
+
+def pack_chat(system_template: str, placeholder: str, transcript: str, messages: list[dict],
+              model: str | None = None, history_share: float = 0.25) -> tuple[str, list[dict]]:
+    """
+    聊天用的 context 打包。優先順序：system 指示 > 最新一則訊息 > 逐字稿 > 較早的對話歷史。
+    對話歷史最多使用 history_share 比例的剩餘預算 (逐字稿用不完的部分也可給歷史)，從最舊的開始捨棄。
+    :return: (system prompt, 保留的訊息列表)
+    """
+    budget = input_budget(model) - count_tokens(system_template.replace(placeholder, ""), model) - MESSAGE_OVERHEAD_TOKENS
+    if not messages:
+        return system_template.replace(placeholder, fit_text(transcript, budget, model)), []
+
+    latest = messages[-1]
+    budget -= count_tokens(str(latest.get("content", "")), model) + MESSAGE_OVERHEAD_TOKENS
+
+    history_costs = [count_tokens(str(m.get("content", "")), model) + MESSAGE_OVERHEAD_TOKENS for m in messages[:-1]]
+    transcript_tokens = count_tokens(transcript, model)
+    history_budget = max(int(budget * history_share), budget - transcript_tokens)
+
+    kept_history = []
+    used = 0
+    for message, cost in zip(reversed(messages[:-1]), reversed(history_costs)):
+        if used + cost > history_budget:
+            break
+        kept_history.insert(0, message)
+        used += cost
+
+    system_prompt = system_template.replace(placeholder, fit_text(transcript, budget - used, model))
+    return system_prompt, kept_history + [latest]
@@ -0,0 +1,195 @@
+"""
+Control Channel - API 與 sweep worker 之間的控制/狀態通道 (SQLite)
+- commands：API 與排程器寫入的指令 (update / backfill / resolve_channel / resummarize)，由 worker 依序領取執行
+- worker_status：worker 的心跳與目前工作，API 以此判斷 worker 是否存活
+SQLite 以 WAL 模式開啟，讀取不會被 worker 的寫入阻塞；每次呼叫各自開連線，跨程序、跨執行緒皆安全。
+"""
+
+import os
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+
+CONTROL_DB = os.getenv("CONTROL_DB", "control.sqlite")
+# 心跳超過此秒數未更新即視為 worker 已停止
+WORKER_STALE_AFTER = int(os.getenv("SWEEP_WORKER_STALE_AFTER", "30"))
+# 保留最近幾筆已完成的指令
+COMMAND_HISTORY = 200
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_commands_status ON commands (status, id);
+CREATE TABLE IF NOT EXISTS worker_status (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    pid INTEGER,
+    state TEXT,
+    command_id INTEGER,
+    started_at REAL,
+    heartbeat_at REAL
+);
+"""
+
+_initialized = set()
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(CONTROL_DB, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if CONTROL_DB not in _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _initialized.add(CONTROL_DB)
+        yield conn
+    finally:
+        conn.close()
+
+
+def _command_dict(row: sqlite3.Row | None) -> dict | None:
+    if row is None:
+        return None
+    command = dict(row)
+    command["payload"] = json.loads(command["payload"])
+    command["result"] = json.loads(command["result"]) if command["result"] else None
+    return command
+
+
+def enqueue(kind: str, payload: dict | None = None) -> tuple[dict, bool]:
+    """
+    新增指令。相同 kind 與 payload 的指令尚未完成時不重複新增。
+    :return: (指令, 是否為新建立)
+    """
+    payload_json = json.dumps(payload or {}, sort_keys=True, ensure_ascii=False)
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM commands WHERE kind = ? AND payload = ? AND status IN (?, ?) ORDER BY id LIMIT 1",
+                (kind, payload_json, PENDING, RUNNING),
+            ).fetchone()
+            if row is None:
+                cursor = conn.execute(
+                    "INSERT INTO commands (kind, payload, status, created_at) VALUES (?, ?, ?, ?)",
+                    (kind, payload_json, PENDING, time.time()),
+                )
+                row = conn.execute("SELECT * FROM commands WHERE id = ?", (cursor.lastrowid,)).fetchone()
+                created = True
+            else:
+                created = False
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return _command_dict(row), created
+
+
+def claim_next() -> dict | None:
+    """worker 領取最早的待執行指令並標記為 running"""
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM commands WHERE status = ? ORDER BY id LIMIT 1", (PENDING,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE commands SET status = ?, started_at = ? WHERE id = ?",
+                    (RUNNING, time.time(), row["id"]),
+                )
+                row = conn.execute("SELECT * FROM commands WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return _command_dict(row)
+
+
+def finish(command_id: int, result=None, error: str | None = None) -> None:
+    with _connect() as conn:
+        conn.execute(
+            "UPDATE commands SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+            (FAILED if error else DONE, time.time(),
+             json.dumps(result, ensure_ascii=False) if result is not None else None, error, command_id),
+        )
+        conn.execute(
+            "DELETE FROM commands WHERE status IN (?, ?) AND id NOT IN "
+            "(SELECT id FROM commands ORDER BY id DESC LIMIT ?)",
+            (DONE, FAILED, COMMAND_HISTORY),
+        )
+
+
+def requeue_running() -> int:
+    """worker 啟動時呼叫：上一個 worker 中斷時執行到一半的指令改回待執行 (各類指令皆可安全重跑)"""
+    with _connect() as conn:
+        cursor = conn.execute(
+            "UPDATE commands SET status = ?, started_at = NULL WHERE status = ?", (PENDING, RUNNING)
+        )
+        return cursor.rowcount
+
+
+def get_command(command_id: int) -> dict | None:
+    with _connect() as conn:
+        return _command_dict(conn.execute("SELECT * FROM commands WHERE id = ?", (command_id,)).fetchone())
+
+
+def active_commands(kind: str | None = None) -> list[dict]:
+    """尚未完成 (pending / running) 的指令"""
+    query = "SELECT * FROM commands WHERE status IN (?, ?)"
+    params = [PENDING, RUNNING]
+    if kind:
+        query += " AND kind = ?"
+        params.append(kind)
+    with _connect() as conn:
+        return [_command_dict(row) for row in conn.execute(query + " ORDER BY id", params)]
+
+
+def recent_commands(limit: int = 20) -> list[dict]:
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM commands ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [_command_dict(row) for row in rows]
+
+
+def set_worker_status(pid: int, state: str, command_id: int | None = None, started_at: float | None = None) -> None:
+    """worker 心跳；started_at 只在 worker 啟動時傳入"""
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO worker_status (id, pid, state, command_id, started_at, heartbeat_at) "
+            "VALUES (1, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET pid = excluded.pid, state = excluded.state, "
+            "command_id = excluded.command_id, heartbeat_at = excluded.heartbeat_at, "
+            "started_at = COALESCE(excluded.started_at, worker_status.started_at)",
+            (pid, state, command_id, started_at, now),
+        )
+
+
+def worker_status() -> dict:
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM worker_status WHERE id = 1").fetchone()
+    if row is None:
+        return {"alive": False, "pid": None, "state": None, "command_id": None, "started_at": None, "heartbeat_at": None}
+    status = dict(row)
+    status.pop("id")
+    status["alive"] = (
+        status["state"] != "stopped"
+        and status["heartbeat_at"] is not None
+        and time.time() - status["heartbeat_at"] < WORKER_STALE_AFTER
+    )
+    return status
@@ -0,0 +1,262 @@
+"""
+Dedup - 以 MinHash 偵測重複上傳 (剪輯、轉載、同一場演講在不同頻道)
+- 對正規化逐字稿的 3-gram shingle 計算 MinHash 簽章 (NumPy 向量化)
+- 以 LSH 分段索引找候選：簽章切成多段，任一段完全相同即為候選，
+  再以簽章估計的 Jaccard 相似度確認，查詢成本與資料庫大小無關
+- 判定為重複的影片不再產生摘要，改以 duplicate_of 指向既有影片的摘要
+簽章與 LSH 分段存在 FINGERPRINT_DB (SQLite，WAL)：每部影片只查詢有索引的分段並新增自己的幾列，
+不必讀寫整份索引；舊版的 fingerprints.json 在資料庫為空時自動匯入。
+DEDUP_MIN_SIMILARITY 控制門檻 (0 表示關閉)，個別影片可透過 ignore (API: DELETE /api/videos/{id}/duplicate) 排除。
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tasks.summarizer import get_summary_path, get_transcript_path
+from tasks.transcript_normalizer import split_tokens, load_normalized_segments, segments_to_text
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+FINGERPRINT_DB = os.getenv("FINGERPRINT_DB", "fingerprints.sqlite")
+LEGACY_FINGERPRINT_FILE = "fingerprints.json"
+# 估計的 Jaccard 相似度 >= 此值視為重複；0 表示關閉
+DEDUP_MIN_SIMILARITY = float(os.getenv("DEDUP_MIN_SIMILARITY", "0.7"))
+# 太短的逐字稿簽章不可靠，不參與比對
+DEDUP_MIN_TOKENS = int(os.getenv("DEDUP_MIN_TOKENS", "200"))
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+# 16 段 x 4 列：相似度約 0.5 以上的配對有很高機率成為候選
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+# multiply-add-shift 雜湊族：h(x) = (a * x + b) mod 2^64 >> 32，a 為奇數
+# 固定種子，簽章在不同執行之間可比較
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(0, np.iinfo(np.uint64).max, size=NUM_PERMUTATIONS, dtype=np.uint64, endpoint=True) | np.uint64(1)
+_PERM_B = _rng.integers(0, np.iinfo(np.uint64).max, size=NUM_PERMUTATIONS, dtype=np.uint64, endpoint=True)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    video_id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    video_id TEXT NOT NULL,
+    PRIMARY KEY (band, digest, video_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ignored (
+    video_id TEXT PRIMARY KEY
+);
+"""
+
+_initialized = set()
+
+
+def minhash(text: str) -> np.ndarray | None:
+    """
+    逐字稿的 MinHash 簽章 (NUM_PERMUTATIONS 個 uint32)；token 數不足 DEDUP_MIN_TOKENS 時回傳 None。
+    """
+    tokens = [t.lower() for t in split_tokens(text)]
+    if len(tokens) < DEDUP_MIN_TOKENS:
+        return None
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    # uint64 乘法溢位即為 mod 2^64，正是這個雜湊族需要的
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """以簽章相同的比例估計 Jaccard 相似度"""
+    return float(np.mean(a == b))
+
+
+def _band_keys(signature: np.ndarray) -> list[tuple[int, bytes]]:
+    keys = []
+    for band in range(LSH_BANDS):
+        chunk = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()
+        keys.append((band, hashlib.blake2b(chunk, digest_size=8).digest()))
+    return keys
+
+
+def _encode(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+
+def _decode(value: bytes) -> np.ndarray:
+    return np.frombuffer(value, dtype="<u4").astype(np.uint32)
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(FINGERPRINT_DB, timeout=30, isolation_level=None)
+    try:
+        if FINGERPRINT_DB not in _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _import_legacy(conn)
+            _initialized.add(FINGERPRINT_DB)
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    # IMMEDIATE：查詢候選與寫入自己的簽章之間，其他程序不會插入
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _import_legacy(conn: sqlite3.Connection) -> None:
+    """資料庫是空的時候，匯入舊版 fingerprints.json 的簽章與 ignore 清單"""
+    if not os.path.exists(LEGACY_FINGERPRINT_FILE):
+        return
+    with _transaction(conn):
+        if conn.execute("SELECT 1 FROM signatures LIMIT 1").fetchone():
+            return
+        try:
+            with open(LEGACY_FINGERPRINT_FILE, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        for video_id, value in legacy.get("signatures", {}).items():
+            _add(conn, video_id, np.frombuffer(bytes.fromhex(value), dtype="<u4").astype(np.uint32))
+        conn.executemany("INSERT OR IGNORE INTO ignored (video_id) VALUES (?)",
+                         [(video_id,) for video_id in legacy.get("ignored", [])])
+    logger.info(f"📦 已從 {LEGACY_FINGERPRINT_FILE} 匯入 {len(legacy.get('signatures', {}))} 個簽章")
+
+
+def find_duplicate(conn: sqlite3.Connection, video_id: str, signature: np.ndarray) -> tuple[str, float] | None:
+    """:return: (最相似的既有影片 id, 估計相似度)，沒有符合門檻的候選時回傳 None"""
+    keys = _band_keys(signature)
+    clause = " OR ".join(["(band = ? AND digest = ?)"] * len(keys))
+    params = [value for key in keys for value in key]
+    rows = conn.execute(
+        f"SELECT s.video_id, s.signature FROM signatures s WHERE s.video_id != ? AND s.video_id IN "
+        f"(SELECT video_id FROM buckets WHERE {clause})",
+        [video_id, *params],
+    ).fetchall()
+
+    best = None
+    for candidate, value in rows:
+        score = similarity(signature, _decode(value))
+        if score >= DEDUP_MIN_SIMILARITY and (best is None or score > best[1]):
+            best = (candidate, score)
+    return best
+
+
+def _add(conn: sqlite3.Connection, video_id: str, signature: np.ndarray) -> bool:
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO signatures (video_id, signature) VALUES (?, ?)", (video_id, _encode(signature))
+    )
+    if cursor.rowcount == 0:
+        return False
+    conn.executemany(
+        "INSERT OR IGNORE INTO buckets (band, digest, video_id) VALUES (?, ?, ?)",
+        [(band, digest, video_id) for band, digest in _band_keys(signature)],
+    )
+    return True
+
+
+def check_duplicate(video_info: dict, transcript_text: str) -> str | None:
+    """
+    摘要前的重複檢查。找到已有摘要的相似影片時回傳其 id (呼叫端應略過摘要)；
+    否則把這部影片的簽章加入索引並回傳 None。
+    """
+    if DEDUP_MIN_SIMILARITY <= 0 or not transcript_text:
+        return None
+    signature = minhash(transcript_text)
+    if signature is None:
+        return None
+
+    video_id = video_info['id']
+    with _connect() as conn, _transaction(conn):
+        if conn.execute("SELECT 1 FROM ignored WHERE video_id = ?", (video_id,)).fetchone():
+            return None
+        match = find_duplicate(conn, video_id, signature)
+        if match and os.path.exists(get_summary_path(match[0])):
+            original, score = match
+            logger.info(f"♻️ 偵測到重複影片: {video_id} ≈ {original} (相似度 {score:.2f})，沿用既有摘要")
+            return original
+        _add(conn, video_id, signature)
+    return None
+
+
+def ignore_duplicate(video_id: str) -> None:
+    """人工覆寫：這部影片之後不再被判定為重複"""
+    with _connect() as conn:
+        conn.execute("INSERT OR IGNORE INTO ignored (video_id) VALUES (?)", (video_id,))
+
+
+def reset() -> None:
+    """清空簽章、LSH 索引與人工覆寫 (系統重置時使用)；舊版 fingerprints.json 一併刪除，不會再被匯入"""
+    with _connect() as conn, _transaction(conn):
+        for table in ("signatures", "buckets", "ignored"):
+            conn.execute(f"DELETE FROM {table}")
+    if os.path.exists(LEGACY_FINGERPRINT_FILE):
+        os.remove(LEGACY_FINGERPRINT_FILE)
+
+
+def index_existing(video_infos: list[dict]) -> int:
+    """把已有摘要與逐字稿的影片簽章加入索引 (初次啟用時使用)"""
+    added = 0
+    with _connect() as conn:
+        known = {row[0] for row in conn.execute("SELECT video_id FROM signatures")}
+        for video_info in video_infos:
+            video_id = video_info['id']
+            if video_id in known or video_info.get('duplicate_of'):
+                continue
+            if not os.path.exists(get_summary_path(video_id)):
+                continue
+            segments = load_normalized_segments(get_transcript_path(video_id))
+            signature = minhash(segments_to_text(segments)) if segments else None
+            if signature is None:
+                continue
+            with _transaction(conn):
+                added += _add(conn, video_id, signature)
+    return added
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("dedup")
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fingerprint existing transcripts for near-duplicate detection")
+    parser.add_argument("--report", action="store_true", help="列出索引中彼此重複的影片")
+    args = parser.parse_args()
+
+    videos = []
+    if os.path.exists("videos.json"):
+        with open("videos.json", 'r', encoding='utf-8') as f:
+            videos = json.load(f)
+    print(f"✅ 新增 {index_existing(videos)} 部影片的簽章")
+
+    if args.report:
+        titles = {v['id']: v.get('title', '') for v in videos}
+        with _connect() as conn:
+            for video_id, value in conn.execute("SELECT video_id, signature FROM signatures").fetchall():
+                match = find_duplicate(conn, video_id, _decode(value))
+                if match and video_id < match[0]:
+                    print(f"{match[1]:.2f}  {titles.get(video_id, video_id)}  <->  {titles.get(match[0], match[0])}")
@@ -0,0 +1,297 @@
+"""
+Embeddings - 本地 (CPU、離線) 影片向量與相關影片搜尋
+- 摘要與逐字稿片段各自編碼後合併成每部影片一個向量
+- 預設使用特徵雜湊 (feature hashing) 的詞袋向量 (hashing-512)，不需要任何模型檔，但只比對用詞、不是語意模型
+- 設定 EMBEDDING_MODEL 且已安裝選用的 sentence-transformers (uv sync --extra embeddings)、
+  模型已下載到本機時改用該模型 (local_files_only，不連網)
+- 向量存放在 embeddings/vectors.f32 (np.memmap float32)，影片 id 對照存在 embeddings/index.json
+- 相關影片以 NumPy 矩陣乘法計算 cosine 相似度，再以 argpartition 取前 k 名
+- 寫入 (add_videos / rebuild) 以 embeddings/index.lock 的 flock 跨程序互斥；讀取不需鎖
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tasks.summarizer import get_summary_path, get_transcript_path
+from tasks.transcript_normalizer import load_normalized_segments
+from tasks.keyword_extractor import tokenize
+from tasks.process_lock import locked
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+EMBEDDING_DIR = "embeddings"
+VECTORS_FILE = os.path.join(EMBEDDING_DIR, "vectors.f32")
+INDEX_FILE = os.path.join(EMBEDDING_DIR, "index.json")
+LOCK_FILE = os.path.join(EMBEDDING_DIR, "index.lock")
+# 選用的 sentence-transformers 模型 (需事先下載到本機快取)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+HASH_DIM = 512
+# 逐字稿切塊：每塊字元數與每部影片最多取幾塊 (均勻抽樣)
+CHUNK_CHARS = 1500
+MAX_CHUNKS = 24
+# 合併時摘要所佔的權重 (其餘為逐字稿片段平均)
+SUMMARY_WEIGHT = 0.5
+INITIAL_CAPACITY = 1024
+
+# 同程序內的執行緒；跨程序 (API / worker / CLI) 由 _write_lock() 的 flock 負責
+_lock = threading.Lock()
+_cache = {"mtime": None, "index": None, "ids": [], "matrix": None}
+
+
+@lru_cache(maxsize=1)
+def _get_model():
+    """sentence-transformers 為選用套件；沒有安裝或模型不在本機時回傳 None"""
+    if not EMBEDDING_MODEL:
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning("⚠️ 未安裝 sentence-transformers，改用雜湊向量")
+        return None
+    try:
+        return SentenceTransformer(EMBEDDING_MODEL, device="cpu", local_files_only=True)
+    except Exception as e:
+        logger.warning(f"⚠️ 無法載入本地模型 {EMBEDDING_MODEL} ({e})，改用雜湊向量")
+        return None
+
+
+def _write_lock():
+    os.makedirs(EMBEDDING_DIR, exist_ok=True)
+    return locked(LOCK_FILE)
+
+
+def model_name() -> str:
+    return EMBEDDING_MODEL if _get_model() is not None else f"hashing-{HASH_DIM}"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _hash_embed(texts: list[str]) -> np.ndarray:
+    """特徵雜湊：每個詞以穩定雜湊決定維度與正負號，詞頻取 log"""
+    vectors = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        counts = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            digest = int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if digest & 1 else -1.0
+            vectors[row, (digest >> 1) % HASH_DIM] += sign * (1.0 + np.log(count))
+    return _normalize(vectors)
+
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """:return: (len(texts), dim) 的 L2 正規化 float32 矩陣"""
+    model = _get_model()
+    if model is not None:
+        vectors = model.encode(texts, batch_size=16, convert_to_numpy=True, normalize_embeddings=True)
+        return vectors.astype(np.float32)
+    return _hash_embed(texts)
+
+
+def _transcript_chunks(video_id: str) -> list[str]:
+    segments = load_normalized_segments(get_transcript_path(video_id)) or []
+    chunks, current = [], ""
+    for segment in segments:
+        current = f"{current} {segment['text']}" if current else segment['text']
+        if len(current) >= CHUNK_CHARS:
+            chunks.append(current)
+            current = ""
+    if current:
+        chunks.append(current)
+    if len(chunks) > MAX_CHUNKS:
+        picks = np.linspace(0, len(chunks) - 1, MAX_CHUNKS).round().astype(int)
+        chunks = [chunks[i] for i in picks]
+    return chunks
+
+
+def video_vector(video_info: dict) -> np.ndarray | None:
+    """把標題+摘要與逐字稿片段編碼後合併成單一向量；兩者皆無時回傳 None"""
+    video_id = video_info['id']
+    summary = None
+    summary_path = get_summary_path(video_id)
+    if os.path.exists(summary_path):
+        with open(summary_path, "r", encoding="utf-8") as f:
+            summary = f"{video_info.get('title', '')}\n{f.read()}"
+    chunks = _transcript_chunks(video_id)
+    if not summary and not chunks:
+        return None
+
+    vectors = embed_texts(([summary] if summary else []) + chunks)
+    if summary and chunks:
+        combined = SUMMARY_WEIGHT * vectors[0] + (1 - SUMMARY_WEIGHT) * vectors[1:].mean(axis=0)
+    else:
+        combined = vectors.mean(axis=0)
+    return _normalize(combined).astype(np.float32)
+
+
+def load_index() -> dict:
+    if os.path.exists(INDEX_FILE):
+        try:
+            with open(INDEX_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            pass
+    return {"model": None, "dim": None, "capacity": 0, "ids": []}
+
+
+def _save_index(index: dict) -> None:
+    tmp_path = f"{INDEX_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, INDEX_FILE)
+
+
+def _open_vectors(index: dict, mode: str = "r") -> np.memmap | None:
+    if not index["ids"] or not os.path.exists(VECTORS_FILE):
+        return None
+    return np.memmap(VECTORS_FILE, dtype=np.float32, mode=mode, shape=(index["capacity"], index["dim"]))
+
+
+def _ensure_capacity(index: dict, needed: int) -> None:
+    """向量檔不夠大時以倍數擴充 (直接延長檔案，既有資料不需搬移)"""
+    if needed <= index["capacity"]:
+        return
+    capacity = max(INITIAL_CAPACITY, index["capacity"])
+    while capacity < needed:
+        capacity *= 2
+    os.makedirs(EMBEDDING_DIR, exist_ok=True)
+    with open(VECTORS_FILE, "ab") as f:
+        f.truncate(capacity * index["dim"] * 4)
+    index["capacity"] = capacity
+
+
+def add_videos(video_infos: list[dict]) -> int:
+    """
+    計算並寫入影片向量 (已存在的影片會覆寫)。先寫入向量再更新 index.json，
+    中途中斷也不會出現指向未寫入資料的 id。
+    :return: 寫入的向量數
+    """
+    vectors = {}
+    for video_info in video_infos:
+        try:
+            vector = video_vector(video_info)
+        except Exception as e:
+            logger.warning(f"⚠️ 計算向量失敗 ({video_info['id']}): {e}")
+            continue
+        if vector is not None:
+            vectors[video_info['id']] = vector
+    if not vectors:
+        return 0
+
+    with _lock, _write_lock():
+        index = load_index()
+        dim = len(next(iter(vectors.values())))
+        name = model_name()
+        if index["ids"] and (index["dim"] != dim or index["model"] != name):
+            logger.warning(f"⚠️ 向量模型已變更 ({index['model']} -> {name})，請執行 python -m tasks.embeddings --rebuild")
+            return 0
+        index["dim"], index["model"] = dim, name
+
+        positions = {video_id: i for i, video_id in enumerate(index["ids"])}
+        new_ids = [video_id for video_id in vectors if video_id not in positions]
+        _ensure_capacity(index, len(index["ids"]) + len(new_ids))
+        for video_id in new_ids:
+            positions[video_id] = len(positions)
+
+        matrix = np.memmap(VECTORS_FILE, dtype=np.float32, mode="r+", shape=(index["capacity"], dim))
+        for video_id, vector in vectors.items():
+            matrix[positions[video_id]] = vector
+        matrix.flush()
+        del matrix
+
+        index["ids"] = index["ids"] + new_ids
+        _save_index(index)
+    logger.info(f"🧭 已更新 {len(vectors)} 部影片的向量")
+    return len(vectors)
+
+
+def _load_matrix():
+    """讀取 (快取) 向量矩陣；index.json 有變動才重新開啟 memmap"""
+    mtime = os.path.getmtime(INDEX_FILE) if os.path.exists(INDEX_FILE) else None
+    if mtime != _cache["mtime"]:
+        index = load_index()
+        matrix = _open_vectors(index)
+        _cache.update(
+            mtime=mtime,
+            index={video_id: i for i, video_id in enumerate(index["ids"])},
+            ids=index["ids"],
+            matrix=None if matrix is None else matrix[:len(index["ids"])],
+        )
+    return _cache
+
+
+def has_vector(video_id: str) -> bool:
+    return video_id in (_load_matrix()["index"] or {})
+
+
+def related_videos(video_id: str, k: int = 10) -> list[tuple[str, float]]:
+    """
+    :return: [(video_id, cosine 相似度), ...]，依相似度由高到低，不含自己
+    """
+    cache = _load_matrix()
+    matrix, positions = cache["matrix"], cache["index"] or {}
+    if matrix is None or video_id not in positions:
+        return []
+    row = positions[video_id]
+    scores = np.asarray(matrix @ matrix[row])
+    scores[row] = -np.inf
+    k = min(k, len(scores) - 1)
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(cache["ids"][i], float(scores[i])) for i in top]
+
+
+def reset() -> None:
+    """刪除所有向量 (系統重置時使用)"""
+    with _lock, _write_lock():
+        for path in (VECTORS_FILE, INDEX_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def rebuild(video_infos: list[dict]) -> int:
+    """以目前的模型重新計算所有影片向量"""
+    reset()
+    return add_videos(video_infos)
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("embeddings")
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the local embedding index for related videos")
+    parser.add_argument("--rebuild", action="store_true", help="刪除既有向量並全部重新計算")
+    parser.add_argument("--related", metavar="VIDEO_ID", help="列出某部影片的相關影片")
+    args = parser.parse_args()
+
+    videos = []
+    if os.path.exists("videos.json"):
+        with open("videos.json", "r", encoding="utf-8") as f:
+            videos = json.load(f)
+
+    if args.related:
+        titles = {v['id']: v.get('title', '') for v in videos}
+        for related_id, score in related_videos(args.related):
+            print(f"{score:.3f}  {related_id}  {titles.get(related_id, '')}")
+    elif args.rebuild:
+        print(f"✅ 已重建 {rebuild(videos)} 部影片的向量 ({model_name()})")
+    else:
+        todo = [v for v in videos if not has_vector(v['id'])]
+        print(f"✅ 新增 {add_videos(todo)} 部影片的向量 ({model_name()})")
@@ -0,0 +1,178 @@
+"""
+Ingest Pipeline - 逐字稿預取與摘要生成的管線化處理
+預取階段以多執行緒 (受 youtube_limiter 節流) 抓取逐字稿，
+透過有界緩衝區交給摘要階段，讓 YouTube 網路等待與 LLM 延遲互相重疊。
+摘要階段也可並行 (SUMMARY_WORKERS)，實際同時請求數由 LLM gateway 的 AIMD 控制器決定。
+"""
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from tasks.rate_limit import youtube_limiter
+from tasks.summarizer import get_transcript_text, get_transcript_path, summarize_video, save_summary
+from tasks.embeddings import add_videos as add_embeddings
+from tasks.dedup import check_duplicate
+from tasks import pipeline_trace
+from tasks.pipeline_trace import stage
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "3"))
+PREFETCH_BUFFER = int(os.getenv("PREFETCH_BUFFER", "4"))
+# 同時進行的摘要數上限；實際放行數由 LLM gateway 的 AIMD 控制器依供應商狀況調整
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
+
+_DONE = object()
+
+
+def prefetch_transcript(video_info: dict) -> str | None:
+    """抓取單部影片逐字稿；本地已有快取時不佔用 YouTube 節流額度"""
+    video_id = video_info['id']
+    if not os.path.exists(get_transcript_path(video_id)):
+        waited = youtube_limiter.wait()
+        if waited > 1:
+            logger.info(f"😴 節流等待 {waited:.1f} 秒後抓取逐字稿: {video_id}", extra={"video_id": video_id})
+    with stage("transcript"):
+        return get_transcript_text(video_id, save_to_file=True)
+
+
+def summarize_prefetched(video_info: dict, transcript_future) -> str | None:
+    """等待預取結果後產生並儲存摘要"""
+    try:
+        transcript_text = transcript_future.result()
+    except Exception as e:
+        logger.error(f"❌ 預取逐字稿失敗 ({video_info['id']}): {e}", extra={"video_id": video_info['id']})
+        transcript_text = None
+
+    if not transcript_text:
+        logger.warning(f"⚠️ 無逐字稿，略過摘要: {video_info['id']}", extra={"video_id": video_info['id']})
+        pipeline_trace.annotate(outcome="no_transcript")
+        return None
+    pipeline_trace.annotate(transcript_chars=len(transcript_text))
+    # 重複上傳 (轉載、剪輯) 直接指向既有摘要，不再呼叫 LLM
+    original = check_duplicate(video_info, transcript_text)
+    if original:
+        video_info['duplicate_of'] = original
+        pipeline_trace.annotate(outcome="duplicate")
+        return None
+    with stage("llm"):
+        summary_content = summarize_video(video_info['id'], video_info.get('title', ''), transcript_text=transcript_text)
+    if summary_content:
+        with stage("write"):
+            save_summary(video_info['id'], summary_content)
+        _add_embeddings(video_info)
+        pipeline_trace.annotate(outcome="summarized")
+    else:
+        pipeline_trace.annotate(outcome="llm_failed")
+    return summary_content
+
+
+def _add_embeddings(video_info: dict) -> None:
+    """相關影片用的向量；摘要已經存好，失敗只記錄警告 (之後可用 python -m tasks.embeddings 補上)"""
+    try:
+        add_embeddings([video_info])
+    except Exception as e:
+        logger.warning(f"⚠️ 更新向量失敗 ({video_info['id']}): {e}", extra={"video_id": video_info['id']})
+
+
+def resummarize(video_info: dict) -> str | None:
+    """重新產生單部影片的摘要與向量 (取消重複判定後由 sweep worker 執行)"""
+    summary_content = summarize_video(video_info['id'], video_info.get('title', ''))
+    if summary_content:
+        save_summary(video_info['id'], summary_content)
+        _add_embeddings(video_info)
+    return summary_content
+
+
+def _in_trace(trace, func, *args):
+    """在工作執行緒中以 trace 為目前的 trace 執行 func"""
+    with pipeline_trace.activate(trace):
+        return func(*args)
+
+
+def run_pipeline(videos, on_done, prefetch_workers: int = PREFETCH_WORKERS, buffer_size: int = PREFETCH_BUFFER,
+                 summary_workers: int = SUMMARY_WORKERS, source: str = "sweep") -> int:
+    """
+    處理影片：預取逐字稿 (並行) -> 產生並儲存摘要 (並行，受 AIMD 控制) -> on_done 回呼。
+    on_done(video_info, summary_content) 在呼叫端執行緒上依輸入順序呼叫，
+    因此呼叫端可以安全地依序更新狀態檔。
+
+    :param videos: video_info dict 列表 (需包含 'id' 與 'title')
+    :param on_done: 每部影片處理完成後的回呼；summary_content 失敗時為 None
+    :param source: 寫入 pipeline trace 的來源 (sweep / backfill / bulk)
+    :return: 已處理的影片數
+    """
+    videos = list(videos)
+    if not videos:
+        return 0
+
+    buffer = queue.Queue(maxsize=max(1, buffer_size))
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, prefetch_workers), thread_name_prefix="prefetch")
+
+    def feeder():
+        # 有界緩衝區滿時 put 會阻塞，限制同時在途的逐字稿數量
+        try:
+            for video_info in videos:
+                if stop.is_set():
+                    break
+                trace = pipeline_trace.begin(video_info, source=source)
+                future = executor.submit(_in_trace, trace, prefetch_transcript, video_info)
+                while not stop.is_set():
+                    try:
+                        buffer.put((video_info, trace, future), timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+        finally:
+            buffer.put(_DONE)
+
+    feeder_thread = threading.Thread(target=feeder, name="prefetch-feeder", daemon=True)
+    feeder_thread.start()
+
+    summary_executor = ThreadPoolExecutor(max_workers=max(1, summary_workers), thread_name_prefix="summarize")
+    in_progress = deque()  # 依輸入順序排列的摘要 future
+    processed = 0
+
+    def finish_oldest():
+        nonlocal processed
+        video_info, trace, summary_future = in_progress.popleft()
+        error = None
+        try:
+            summary_content = summary_future.result()
+        except Exception as e:
+            logger.error(f"❌ 生成摘要失敗 ({video_info['id']}): {e}", extra={"video_id": video_info['id']})
+            summary_content, error = None, str(e)
+        with pipeline_trace.activate(trace), stage("db"):
+            on_done(video_info, summary_content)
+        pipeline_trace.finish(trace, "error" if error else trace.fields.get("outcome", "llm_failed"), error)
+        processed += 1
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            video_info, trace, transcript_future = item
+            summary_future = summary_executor.submit(_in_trace, trace, summarize_prefetched, video_info, transcript_future)
+            in_progress.append((video_info, trace, summary_future))
+            if len(in_progress) >= max(1, summary_workers):
+                finish_oldest()
+        while in_progress:
+            finish_oldest()
+    finally:
+        summary_executor.shutdown(wait=True, cancel_futures=True)
+        stop.set()
+        # 清空緩衝區讓 feeder 可以結束
+        while feeder_thread.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return processed
@@ -0,0 +1,342 @@
+"""
+Keyword Extractor - 以 TF-IDF 從摘要離線擷取影片標籤 (不呼叫 LLM)
+- 中文以 jieba 斷詞 (選用套件)，未安裝時改用 CJK 2~4 字 n-gram；英文取單字與雙詞組
+- 以 SciPy 稀疏矩陣一次計算整批文件的 TF-IDF，逐列取前 k 名
+- 文件頻率 (document frequency) 存在 keyword_index.json，新摘要進來時增量更新
+標籤寫入 videos.json 的 tags 欄位 (由 monitor_task.add_videos_to_db 呼叫)。
+"""
+
+import os
+import re
+import sys
+import json
+import threading
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from scipy import sparse
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tasks.summarizer import get_summary_path
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+KEYWORD_INDEX_FILE = "keyword_index.json"
+TAGS_PER_VIDEO = int(os.getenv("TAGS_PER_VIDEO", "5"))
+# 出現在超過此比例文件中的詞視為通用詞 (文件數達 MIN_DOCS_FOR_MAX_DF 才套用)
+MAX_DF_RATIO = 0.5
+MIN_DOCS_FOR_MAX_DF = 10
+# 標題中的詞比內文更能代表影片
+TITLE_WEIGHT = 3
+# 只出現一次 (且不在標題) 的詞不當作標籤
+MIN_TERM_COUNT = 2
+
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_CJK_RUN_RE = re.compile(f'[{_CJK}]+')
+_EN_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9+#']*(?:[-.][A-Za-z0-9+#]+)*")
+_MARKDOWN_NOISE_RE = re.compile(r'\[([^\]]*)\]\([^)]*\)|[*_`#>|]')
+
+# 摘要模板本身的段落標題與常見的描述用語，不應成為標籤
+ZH_STOPWORDS = {
+    "內容摘要", "主要問題", "有條理的內容整理", "精煉亮點", "內容", "摘要", "整理", "亮點", "問題", "類別", "細節",
+    "影片", "本集", "節目", "講者", "主持人", "來賓", "討論", "分享", "介紹", "說明", "提到", "認為", "指出",
+    "我們", "你們", "他們", "自己", "這個", "那個", "一個", "一些", "這些", "那些", "這樣", "那樣", "什麼", "如何",
+    "可以", "可能", "需要", "應該", "就是", "因為", "所以", "如果", "但是", "而且", "以及", "然後", "或是", "還是",
+    "非常", "更多", "很多", "重要", "主要", "透過", "進行", "其中", "例如", "包括", "方面", "部分", "目前", "現在",
+    "已經", "開始", "成為", "能夠", "沒有", "不是", "對於", "關於", "之間", "時候", "東西", "事情", "方式", "方法",
+}
+EN_STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "then", "so", "of", "to", "in", "on", "at", "by", "for", "with",
+    "from", "as", "is", "are", "was", "were", "be", "been", "being", "it", "its", "this", "that", "these", "those",
+    "i", "you", "he", "she", "we", "they", "me", "him", "her", "us", "them", "my", "your", "our", "their",
+    "do", "does", "did", "have", "has", "had", "not", "no", "yes", "can", "could", "will", "would", "should",
+    "may", "might", "must", "about", "into", "over", "than", "more", "most", "very", "just", "also", "how",
+    "what", "why", "when", "where", "who", "which", "there", "here", "all", "any", "some", "one", "two",
+    "get", "got", "like", "make", "made", "use", "using", "used", "new", "way", "ways", "thing", "things",
+    "video", "episode", "podcast", "talk", "guest", "host", "ep",
+}
+
+_store = None
+_store_mtime = None
+_store_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _get_jieba():
+    """jieba 為選用套件；沒有安裝時回傳 None (改用 n-gram)"""
+    try:
+        import jieba
+    except ImportError:
+        return None
+    jieba.setLogLevel(60)
+    return jieba
+
+
+def _cjk_terms(run: str) -> list[str]:
+    jieba = _get_jieba()
+    if jieba is not None:
+        words = [w for w in jieba.lcut(run) if len(w) >= 2]
+    else:
+        words = [run[i:i + n] for n in (2, 3, 4) for i in range(len(run) - n + 1)]
+        # n-gram 只要跨到停用詞 (例如「理如何」) 就捨棄
+        words = [w for w in words if not any(w[i:i + 2] in ZH_STOPWORDS for i in range(len(w) - 1))]
+    return [w for w in words if w not in ZH_STOPWORDS]
+
+
+def _english_terms(text: str) -> list[str]:
+    terms = []
+    previous = None
+    last_end = 0
+    for match in _EN_WORD_RE.finditer(text):
+        # 中間隔著標點或換行就不組成雙詞組
+        if text[last_end:match.start()].strip(" "):
+            previous = None
+        last_end = match.end()
+        word = match.group(0).lower().strip("'.-")
+        if len(word) < 2 or word in EN_STOPWORDS or word.isdigit():
+            previous = None
+            continue
+        terms.append(word)
+        if previous is not None:
+            terms.append(f"{previous} {word}")
+        previous = word
+    return terms
+
+
+def tokenize(text: str) -> list[str]:
+    """把文字切成候選詞 (CJK 詞 + 英文單字/雙詞組)"""
+    terms = []
+    for run in _CJK_RUN_RE.findall(text):
+        terms.extend(_cjk_terms(run))
+    # CJK 片段之間的英文視為不相鄰，避免跨句組成雙詞組
+    terms.extend(_english_terms(_CJK_RUN_RE.sub(' | ', text)))
+    return terms
+
+
+def _summary_body(summary: str) -> str:
+    """去掉 Markdown 標題行、引用區塊與標記符號"""
+    lines = []
+    for line in summary.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#") or stripped.startswith(">"):
+            continue
+        lines.append(stripped)
+    return _MARKDOWN_NOISE_RE.sub(lambda m: m.group(1) or ' ', "\n".join(lines))
+
+
+def document_terms(title: str, summary: str) -> Counter:
+    """
+    計算單一影片的詞頻：標題中的詞加權，
+    只出現一次且不在標題中的詞會被濾掉 (雜訊多半來自這類詞)。
+    """
+    counts = Counter(tokenize(_summary_body(summary)))
+    title_terms = set(tokenize(title or ""))
+    for term in title_terms:
+        counts[term] += TITLE_WEIGHT
+    return Counter({t: c for t, c in counts.items() if c >= MIN_TERM_COUNT or t in title_terms})
+
+
+def load_index() -> dict:
+    """讀取文件頻率索引 (檔案有變動才重新讀取)"""
+    global _store, _store_mtime
+    mtime = os.path.getmtime(KEYWORD_INDEX_FILE) if os.path.exists(KEYWORD_INDEX_FILE) else None
+    if _store is None or mtime != _store_mtime:
+        store = {"docs": {}, "df": {}}
+        if mtime is not None:
+            try:
+                with open(KEYWORD_INDEX_FILE, 'r', encoding='utf-8') as f:
+                    store = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                pass
+        _store, _store_mtime = store, mtime
+    return _store
+
+
+def save_index(store: dict) -> None:
+    global _store, _store_mtime
+    tmp_path = f"{KEYWORD_INDEX_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(store, f, ensure_ascii=False)
+    os.replace(tmp_path, KEYWORD_INDEX_FILE)
+    _store, _store_mtime = store, os.path.getmtime(KEYWORD_INDEX_FILE)
+
+
+def _length_boost(term: str) -> float:
+    """較長的詞 (雙詞組、4 字詞) 詞頻天生較低，稍微加權讓它優先於被包含的短詞"""
+    if _CJK_RUN_RE.fullmatch(term):
+        return 1.0 + 0.25 * max(0, len(term) - 2)
+    return 1.0 + 0.5 * term.count(" ")
+
+
+def _display(term: str) -> str:
+    """英文縮寫轉大寫、一般英文詞首字大寫，中文保持原樣"""
+    if _CJK_RUN_RE.search(term):
+        return term
+    return " ".join(w.upper() if len(w) <= 3 else w.capitalize() for w in term.split(" "))
+
+
+def _cjk_overlap(a: str, b: str) -> bool:
+    """兩個中文詞共用兩個以上連續字 (n-gram 切出的「品經理如」與「產品經理」)"""
+    if not (_CJK_RUN_RE.fullmatch(a) and _CJK_RUN_RE.fullmatch(b)):
+        return False
+    return bool({a[i:i + 2] for i in range(len(a) - 1)} & {b[i:i + 2] for i in range(len(b) - 1)})
+
+
+def _top_terms(matrix: sparse.csr_matrix, vocab: list[str], k: int) -> list[list[str]]:
+    """逐列取 TF-IDF 最高的 k 個詞，並略過被更高分標籤包含的詞"""
+    results = []
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        data, indices = matrix.data[start:end], matrix.indices[start:end]
+        if len(data) == 0:
+            results.append([])
+            continue
+        # 多取一些候選，去重後再截到 k 個
+        candidates = min(len(data), k * 3)
+        top = np.argpartition(-data, candidates - 1)[:candidates]
+        top = top[np.argsort(-data[top], kind="stable")]
+        tags = []
+        for index in top:
+            if data[index] <= 0:
+                break
+            term = vocab[indices[index]]
+            if any(term in kept or kept in term or _cjk_overlap(term, kept) for kept in tags):
+                continue
+            tags.append(term)
+            if len(tags) >= k:
+                break
+        results.append([_display(t) for t in tags])
+    return results
+
+
+def score_documents(doc_terms: list[Counter], df: dict, doc_count: int, k: int = TAGS_PER_VIDEO) -> list[list[str]]:
+    """
+    以稀疏矩陣計算 TF-IDF 並回傳每份文件的標籤。
+    tf 使用 1 + log(tf)，idf 使用平滑版本 log((1 + N) / (1 + df)) + 1。
+    """
+    vocab_index = {}
+    rows, cols, values = [], [], []
+    for row, counts in enumerate(doc_terms):
+        for term, count in counts.items():
+            col = vocab_index.setdefault(term, len(vocab_index))
+            rows.append(row)
+            cols.append(col)
+            values.append(count)
+    if not vocab_index:
+        return [[] for _ in doc_terms]
+
+    vocab = list(vocab_index)
+    tf = sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float32), (np.asarray(rows), np.asarray(cols))),
+        shape=(len(doc_terms), len(vocab)),
+    )
+    tf.data = 1.0 + np.log(tf.data)
+
+    doc_freq = np.fromiter((df.get(term, 1) for term in vocab), dtype=np.float32, count=len(vocab))
+    idf = np.log((1.0 + doc_count) / (1.0 + doc_freq)) + 1.0
+    idf *= np.fromiter((_length_boost(term) for term in vocab), dtype=np.float32, count=len(vocab))
+    if doc_count >= MIN_DOCS_FOR_MAX_DF:
+        idf[doc_freq / doc_count > MAX_DF_RATIO] = 0.0
+
+    weighted = tf.multiply(idf.reshape(1, -1)).tocsr()
+    return _top_terms(weighted, vocab, k)
+
+
+def _read_summary(video_id: str) -> str | None:
+    path = get_summary_path(video_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def extract_tags(video_infos: list[dict]) -> dict:
+    """
+    增量模式：把這些影片的摘要加入文件頻率索引 (已索引的影片會先扣除舊的詞)，
+    再以目前的索引計算標籤。
+    :return: {video_id: [tag, ...]} (沒有摘要的影片不會出現)
+    """
+    with _store_lock:
+        store = load_index()
+        docs, df = store["docs"], store["df"]
+        ids, doc_terms = [], []
+        for video_info in video_infos:
+            summary = _read_summary(video_info['id'])
+            if summary is None:
+                continue
+            counts = document_terms(video_info.get('title', ''), summary)
+            for term in docs.get(video_info['id'], []):
+                df[term] = df.get(term, 1) - 1
+                if df[term] <= 0:
+                    del df[term]
+            for term in counts:
+                df[term] = df.get(term, 0) + 1
+            docs[video_info['id']] = sorted(counts)
+            ids.append(video_info['id'])
+            doc_terms.append(counts)
+        if not ids:
+            return {}
+        save_index(store)
+        tags = score_documents(doc_terms, df, len(docs))
+    return dict(zip(ids, tags))
+
+
+def reset() -> None:
+    """清空文件頻率索引 (系統重置時使用，之後的標籤只以新加入的影片計算)"""
+    global _store, _store_mtime
+    with _store_lock:
+        if os.path.exists(KEYWORD_INDEX_FILE):
+            os.remove(KEYWORD_INDEX_FILE)
+        _store, _store_mtime = None, None
+
+
+def rebuild_tags(video_infos: list[dict]) -> dict:
+    """
+    批次模式：以所有影片的摘要重建文件頻率索引，並一次重新計算全部標籤。
+    :return: {video_id: [tag, ...]}
+    """
+    ids, doc_terms = [], []
+    for video_info in video_infos:
+        summary = _read_summary(video_info['id'])
+        if summary is None:
+            continue
+        ids.append(video_info['id'])
+        doc_terms.append(document_terms(video_info.get('title', ''), summary))
+
+    df = Counter()
+    for counts in doc_terms:
+        df.update(counts.keys())
+    tags = score_documents(doc_terms, df, len(ids))
+    with _store_lock:
+        save_index({"docs": {video_id: sorted(counts) for video_id, counts in zip(ids, doc_terms)}, "df": dict(df)})
+    logger.info(f"🏷️ 已重建 {len(ids)} 部影片的標籤 (詞彙量 {len(df)})")
+    return dict(zip(ids, tags))
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("keyword_extractor")
+
+    import argparse
+
+    from tasks.monitor_task import update_video_fields
+
+    parser = argparse.ArgumentParser(description="Recompute TF-IDF tags for every summarized video")
+    parser.add_argument("--dry-run", action="store_true", help="只顯示結果，不寫入 videos.json")
+    args = parser.parse_args()
+
+    videos = []
+    if os.path.exists("videos.json"):
+        with open("videos.json", 'r', encoding='utf-8') as f:
+            videos = json.load(f)
+    result = rebuild_tags(videos)
+    if args.dry_run:
+        titles = {v['id']: v.get('title', '') for v in videos}
+        for video_id, tags in result.items():
+            print(f"{titles.get(video_id, video_id)[:40]}: {', '.join(tags)}")
+    else:
+        updated = update_video_fields({video_id: {'tags': tags} for video_id, tags in result.items()})
+        print(f"✅ 已更新 {updated} 部影片的標籤")
@@ -0,0 +1,349 @@
+"""
+LLM Gateway - 所有 chat completion 呼叫的統一入口
+- 以截止時間 (deadline) 為基準的逾時，卡住的供應商不會無限期卡住監控執行緒
+- 可選的避險請求 (hedging)：主請求超過該供應商延遲百分位數仍未回應時，向備援送出第二個請求，取先完成者；
+  輸掉的請求若還沒送出就取消，已送出的 HTTP 請求無法中止，跑完後以 outcome=cancelled 記錄用量
+- 出錯或過慢時切換到備援 LLM_FALLBACK_BASE_URL / LLM_FALLBACK_MODEL
+- 每個供應商各自記錄延遲與錯誤統計，並以 AIMD 控制同時進行的請求數 (見 adaptive_concurrency)
+"""
+
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from openai import OpenAI
+from dotenv import load_dotenv
+
+from tasks.adaptive_concurrency import AIMDLimiter, SUCCESS, ERROR, BATCH, classify_error
+from tasks import pipeline_trace, llm_usage
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+load_dotenv()
+
+# 非串流呼叫的總截止時間 (秒)
+REQUEST_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+# 單一供應商嘗試的上限，超過即切換備援 (保留時間給 failover)
+ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "60"))
+# 串流呼叫的總截止時間，以及等待首個/下一個 chunk 的上限
+STREAM_TIMEOUT = float(os.getenv("LLM_STREAM_TIMEOUT", "600"))
+STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", "45"))
+# 避險請求：預設關閉 (會多花一份 token)
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = 10
+# 串流時要求最後一個 chunk 附上 token 用量 (stream_options.include_usage)；不支援的供應商請設為 0
+STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "1") == "1"
+
+
+class LLMUnavailable(Exception):
+    """所有供應商都失敗或逾時"""
+
+
+class Provider:
+    def __init__(self, name: str, api_key: str, base_url: str, model: str):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.latencies = deque(maxlen=200)
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.last_error = None
+        # 每個供應商各自的 AIMD 併發控制
+        self.limiter = AIMDLimiter(name)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> OpenAI:
+        if self._client is None:
+            # 重試交給 gateway 的 failover，避免 SDK 內建重試吃掉截止時間
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return self._client
+
+    def record(self, latency: float | None = None, error: Exception | None = None) -> None:
+        with self._lock:
+            self.requests += 1
+            if error is not None:
+                self.errors += 1
+                if isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower():
+                    self.timeouts += 1
+                self.last_error = f"{type(error).__name__}: {str(error)[:200]}"
+            elif latency is not None:
+                self.latencies.append(latency)
+
+    def percentile(self, p: float) -> float | None:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def status(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "latency_p50_s": round(p50, 3) if p50 is not None else None,
+            "latency_p95_s": round(p95, 3) if p95 is not None else None,
+            "last_error": self.last_error,
+            "concurrency": self.limiter.status(),
+        }
+
+
+_providers = None
+_providers_lock = threading.Lock()
+# 避險/failover 請求用的背景執行緒 (已送出的輸家請求會在背景跑完)
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+
+
+def get_providers() -> list[Provider]:
+    """主要供應商 (LLM_*) 與可選的備援 (LLM_FALLBACK_*，未設定的欄位沿用主要設定)"""
+    global _providers
+    with _providers_lock:
+        if _providers is None:
+            providers = []
+            api_key = os.getenv("LLM_API_KEY")
+            base_url = os.getenv("LLM_BASE_URL")
+            model = os.getenv("LLM_MODEL", "gpt-4o")
+            if api_key and base_url:
+                providers.append(Provider("primary", api_key, base_url, model))
+                fallback_url = os.getenv("LLM_FALLBACK_BASE_URL")
+                fallback_model = os.getenv("LLM_FALLBACK_MODEL")
+                if fallback_url or fallback_model:
+                    providers.append(Provider(
+                        "fallback",
+                        os.getenv("LLM_FALLBACK_API_KEY", api_key),
+                        fallback_url or base_url,
+                        fallback_model or model,
+                    ))
+            _providers = providers
+        return _providers
+
+
+def is_configured() -> bool:
+    return bool(get_providers())
+
+
+def provider_status() -> dict:
+    return {p.name: p.status() for p in get_providers()}
+
+
+def _record_usage(provider: "Provider", usage, feature: str | None, video_id: str | None,
+                  latency: float | None, ttft: float | None = None, stream: bool = False, outcome: str = "ok") -> None:
+    """
+    記錄一次嘗試的 token 用量與延遲到 llm_usage (失敗的嘗試也記)，
+    成功時同時寫進目前的 pipeline trace。usage 可能為 None (供應商未回傳)。
+    """
+    tokens = llm_usage.usage_fields(usage)
+    if outcome == "ok":
+        pipeline_trace.annotate(
+            provider=provider.name,
+            model=provider.model,
+            prompt_tokens=tokens.get("prompt_tokens"),
+            completion_tokens=tokens.get("completion_tokens"),
+        )
+    llm_usage.record(
+        feature, provider.name, provider.model, **tokens,
+        latency=latency, ttft=ttft, stream=stream, outcome=outcome, video_id=video_id,
+    )
+
+
+def _complete(provider: Provider, messages: list[dict], temperature: float, deadline: float,
+              feature: str | None = None, video_id: str | None = None,
+              cancelled: threading.Event | None = None) -> str | None:
+    """
+    向單一供應商送出一次請求。
+    :param cancelled: 另一個請求已經勝出時設定；尚未送出就不送 (回傳 None)，已送出則以 cancelled 記錄用量
+    """
+    attempt_deadline = min(deadline, time.time() + ATTEMPT_TIMEOUT)
+    if not provider.limiter.acquire(timeout=max(0.0, attempt_deadline - time.time())):
+        error = TimeoutError(f"No LLM concurrency slot available ({provider.name})")
+        provider.record(error=error)
+        raise error
+    outcome, retry_after, latency, start = SUCCESS, None, None, None
+    try:
+        if cancelled is not None and cancelled.is_set():
+            # 沒有送出請求，不調整併發上限
+            outcome = ERROR
+            return None
+        remaining = attempt_deadline - time.time()
+        if remaining <= 0:
+            raise TimeoutError("LLM deadline exceeded")
+        start = time.time()
+        response = provider.client.chat.completions.create(
+            model=provider.model,
+            messages=messages,
+            temperature=temperature,
+            timeout=remaining,
+        )
+        content = response.choices[0].message.content or ""
+        latency = time.time() - start
+        # 輸掉的避險請求：token 仍然計費，但不寫進 pipeline trace
+        lost = cancelled is not None and cancelled.is_set()
+        _record_usage(provider, getattr(response, "usage", None), feature, video_id, latency,
+                      outcome="cancelled" if lost else "ok")
+    except Exception as e:
+        outcome, retry_after = classify_error(e)
+        provider.record(error=e)
+        if start is not None:
+            _record_usage(provider, None, feature, video_id, time.time() - start, outcome="error")
+        raise
+    finally:
+        provider.limiter.release(outcome, latency, retry_after)
+    provider.record(latency=latency)
+    return content
+
+
+def chat_completion(messages: list[dict], temperature: float = 0.7, timeout: float = REQUEST_TIMEOUT, hedge: bool | None = None,
+                    feature: str | None = None, video_id: str | None = None) -> str:
+    """
+    非串流 chat completion。
+    依序嘗試供應商；開啟 hedging 時，主請求超過其 p95 延遲仍未完成就先向下一個供應商送出第二個請求。
+    feature / video_id 用於 llm_usage 的用量彙整 (video_id 未指定時取自目前的 pipeline trace)。
+    :raises LLMUnavailable: 所有供應商都失敗或超過截止時間
+    """
+    providers = get_providers()
+    if not providers:
+        raise LLMUnavailable("LLM_API_KEY / LLM_BASE_URL not configured")
+    hedge = HEDGE_ENABLED if hedge is None else hedge
+    started_at = time.time()
+    deadline = started_at + timeout
+
+    pending = {}
+    errors = []
+    next_index = 0
+    cancelled = threading.Event()
+
+    def launch():
+        nonlocal next_index
+        # 只有一個供應商時，避險請求送往同一個供應商
+        provider = providers[next_index % len(providers)]
+        next_index += 1
+        # 複製 contextvars，讓工作執行緒也寫得到呼叫端的 pipeline trace
+        context = contextvars.copy_context()
+        pending[_executor.submit(
+            context.run, _complete, provider, messages, temperature, deadline, feature, video_id, cancelled
+        )] = provider
+
+    launch()
+    try:
+        while pending:
+            wait_for = deadline - time.time()
+            if hedge and next_index < 2:
+                primary = providers[0]
+                threshold = primary.percentile(HEDGE_PERCENTILE) if len(primary.latencies) >= HEDGE_MIN_SAMPLES else None
+                if threshold is not None:
+                    wait_for = min(wait_for, max(0.0, threshold - (time.time() - started_at)))
+            done, _ = wait(list(pending), timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+
+            if not done:
+                if time.time() >= deadline:
+                    break
+                if hedge and next_index < 2:
+                    logger.info("⏱️ LLM 回應過慢，送出避險請求")
+                    launch()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    errors.append(f"{provider.name}: {e}")
+                    logger.warning(f"⚠️ LLM 供應商 {provider.name} 失敗: {e}")
+            # failover: 還有沒試過的供應商就接著試
+            if not pending and next_index < len(providers) and time.time() < deadline:
+                launch()
+    finally:
+        # 已有結果或放棄等待：其餘請求還在排隊就取消，已送出的跑完後記為 cancelled
+        cancelled.set()
+        for future, provider in pending.items():
+            if future.cancel():
+                logger.info(f"🚫 取消尚未送出的 LLM 請求 ({provider.name})")
+
+    raise LLMUnavailable("; ".join(errors) or f"LLM request timed out after {timeout:.0f}s")
+
+
+def chat_completion_stream(messages: list[dict], temperature: float = 0.7, timeout: float = STREAM_TIMEOUT,
+                           feature: str | None = None, video_id: str | None = None, priority: str = BATCH):
+    """
+    串流 chat completion，逐一 yield 文字片段。
+    feature / video_id 同 chat_completion (以參數傳入：串流回應可能在不同執行緒間逐段讀取，contextvars 不一定跟得上)。
+    priority=INTERACTIVE 的請求 (使用者正在等待) 可使用保留名額並優先取得名額 (見 adaptive_concurrency)。
+    在收到第一個片段前出錯或超過 STREAM_IDLE_TIMEOUT，會自動切換到下一個供應商；
+    已經輸出內容後才失敗則直接拋出 (由呼叫端決定如何處理部分結果)。
+    :raises LLMUnavailable: 所有供應商在開始輸出前都失敗
+    """
+    providers = get_providers()
+    if not providers:
+        raise LLMUnavailable("LLM_API_KEY / LLM_BASE_URL not configured")
+    deadline = time.time() + timeout
+    errors = []
+
+    for provider in providers:
+        if not provider.limiter.acquire(timeout=max(0.0, min(deadline - time.time(), STREAM_IDLE_TIMEOUT)), priority=priority):
+            errors.append(f"{provider.name}: no concurrency slot available")
+            continue
+        start = time.time()
+        ttft = None
+        usage = None
+        outcome, retry_after = SUCCESS, None
+        try:
+            extra = {"stream_options": {"include_usage": True}} if STREAM_USAGE else {}
+            stream = provider.client.chat.completions.create(
+                model=provider.model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                # 連線與每次讀取 chunk 的上限 (首個 token 過慢即視為失敗)
+                timeout=min(STREAM_IDLE_TIMEOUT, max(1.0, deadline - time.time())),
+                **extra,
+            )
+            for chunk in stream:
+                if time.time() > deadline:
+                    stream.close()
+                    raise TimeoutError(f"LLM stream exceeded {timeout:.0f}s deadline")
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if ttft is None:
+                        ttft = time.time() - start
+                    yield delta
+        except GeneratorExit:
+            # 呼叫端中途停止讀取 (例如使用者關閉對話)，已產生的 token 仍然計費
+            _record_usage(provider, usage, feature, video_id, time.time() - start, ttft, stream=True, outcome="cancelled")
+            raise
+        except Exception as e:
+            outcome, retry_after = classify_error(e)
+            provider.record(error=e)
+            _record_usage(provider, usage, feature, video_id, time.time() - start, ttft, stream=True, outcome="error")
+            if ttft is not None:
+                raise
+            errors.append(f"{provider.name}: {e}")
+            logger.warning(f"⚠️ LLM 供應商 {provider.name} 串流失敗，嘗試下一個: {e}")
+            if time.time() >= deadline:
+                break
+            continue
+        finally:
+            # 串流期間一直佔用名額；以首個 token 時間判斷延遲是否健康
+            provider.limiter.release(outcome, ttft, retry_after)
+        # 串流以首個 token 時間 (TTFT) 作為延遲指標
+        provider.record(latency=ttft if ttft is not None else time.time() - start)
+        _record_usage(provider, usage, feature, video_id, time.time() - start, ttft, stream=True)
+        return
+
+    raise LLMUnavailable("; ".join(errors))
@@ -0,0 +1,287 @@
+"""
+LLM Usage - 每次 LLM 呼叫的 token 與成本紀錄
+- llm_gateway 每次嘗試 (含失敗、避險與 failover 的請求) 寫一列到 llm_usage.sqlite：
+  功能 (summary / mindmap / chat)、來源 (sweep / backfill / bulk / batch)、影片、頻道、供應商、模型、
+  prompt / completion / cached tokens、延遲、成本
+- 成本依 LLM_PRICING (每百萬 tokens 的美元價格，JSON) 計算；未列出的模型只記 token
+- 每日預算 (LLM_DAILY_BUDGET_USD / LLM_DAILY_TOKEN_BUDGET，當地時間午夜重算)：
+  所有呼叫都計入，但只暫停非互動的工作 (backfill、Batch API 送出)；對話與手動操作不受影響
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from tasks import pipeline_trace
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+USAGE_DB = os.getenv("LLM_USAGE_DB", "llm_usage.sqlite")
+LLM_DAILY_BUDGET_USD = float(os.getenv("LLM_DAILY_BUDGET_USD") or 0) or None
+LLM_DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET") or 0) or None
+USAGE_RETENTION_DAYS = int(os.getenv("LLM_USAGE_RETENTION_DAYS", "180"))
+# Batch API 的價格為一般請求的一半
+BATCH_PRICE_FACTOR = 0.5
+
+# 美元 / 百萬 tokens；模型名稱以最長前綴比對 (gpt-4o-2024-08-06 -> gpt-4o)
+DEFAULT_PRICING = {
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4.1-mini": {"input": 0.40, "cached_input": 0.10, "output": 1.60},
+    "gemini-2.0-flash": {"input": 0.10, "cached_input": 0.025, "output": 0.40},
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    feature TEXT,
+    source TEXT,
+    video_id TEXT,
+    channel TEXT,
+    provider TEXT,
+    model TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cached_tokens INTEGER,
+    latency_s REAL,
+    ttft_s REAL,
+    stream INTEGER,
+    outcome TEXT,
+    cost_usd REAL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_ts ON llm_calls (ts);
+"""
+
+_initialized = set()
+_pricing = None
+_pricing_lock = threading.Lock()
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(USAGE_DB, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if USAGE_DB not in _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _initialized.add(USAGE_DB)
+        yield conn
+    finally:
+        conn.close()
+
+
+def pricing() -> dict:
+    """內建價格表，LLM_PRICING 的同名模型覆寫之"""
+    global _pricing
+    with _pricing_lock:
+        if _pricing is None:
+            table = dict(DEFAULT_PRICING)
+            raw = os.getenv("LLM_PRICING")
+            if raw:
+                try:
+                    table.update(json.loads(raw))
+                except json.JSONDecodeError as e:
+                    logger.warning(f"⚠️ LLM_PRICING 不是合法的 JSON，使用內建價格: {e}")
+            _pricing = table
+        return _pricing
+
+
+def _price_for(model: str | None) -> dict | None:
+    if not model:
+        return None
+    table = pricing()
+    if model in table:
+        return table[model]
+    matches = [name for name in table if model.startswith(name)]
+    return table[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(model: str | None, prompt_tokens: int | None, completion_tokens: int | None,
+                  cached_tokens: int | None = None, factor: float = 1.0) -> float | None:
+    price = _price_for(model)
+    if price is None or (prompt_tokens is None and completion_tokens is None):
+        return None
+    cached = cached_tokens or 0
+    uncached = max(0, (prompt_tokens or 0) - cached)
+    cost = (
+        uncached * price["input"]
+        + cached * price.get("cached_input", price["input"])
+        + (completion_tokens or 0) * price["output"]
+    ) / 1_000_000
+    return round(cost * factor, 6)
+
+
+def usage_fields(usage) -> dict:
+    """OpenAI 相容 usage 物件 (或 dict) -> prompt / completion / cached tokens"""
+    if usage is None:
+        return {}
+
+    def get(obj, key):
+        return obj.get(key) if isinstance(obj, dict) else getattr(obj, key, None)
+
+    details = get(usage, "prompt_tokens_details")
+    return {
+        "prompt_tokens": get(usage, "prompt_tokens"),
+        "completion_tokens": get(usage, "completion_tokens"),
+        "cached_tokens": get(details, "cached_tokens") if details is not None else None,
+    }
+
+
+def record(feature: str | None, provider: str | None, model: str | None,
+           prompt_tokens: int | None = None, completion_tokens: int | None = None, cached_tokens: int | None = None,
+           latency: float | None = None, ttft: float | None = None, stream: bool = False, outcome: str = "ok",
+           video_id: str | None = None, channel: str | None = None, source: str | None = None,
+           price_factor: float = 1.0) -> None:
+    """
+    寫入一次 LLM 呼叫。video_id / channel / source 未指定時取自目前的 pipeline trace。
+    寫入失敗只記警告，不影響呼叫端。
+    """
+    trace = pipeline_trace.current()
+    if trace is not None:
+        video_id = video_id or trace.video_id
+        channel = channel or trace.fields.get("channel")
+        source = source or trace.fields.get("source")
+    row = {
+        "ts": time.time(),
+        "feature": feature or "other",
+        "source": source,
+        "video_id": video_id,
+        "channel": channel,
+        "provider": provider,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "latency_s": round(latency, 3) if latency is not None else None,
+        "ttft_s": round(ttft, 3) if ttft is not None else None,
+        "stream": int(stream),
+        "outcome": outcome,
+        "cost_usd": estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens, price_factor),
+    }
+    try:
+        with _connect() as conn:
+            conn.execute(
+                f"INSERT INTO llm_calls ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})",
+                tuple(row.values()),
+            )
+            conn.execute("DELETE FROM llm_calls WHERE ts < ?", (row["ts"] - USAGE_RETENTION_DAYS * 86400,))
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ 寫入 LLM 用量失敗: {e}", extra={"video_id": video_id})
+
+
+def _today_start() -> float:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def budget_status() -> dict:
+    with _connect() as conn:
+        spent = conn.execute(
+            "SELECT COALESCE(SUM(cost_usd), 0) AS cost, "
+            "COALESCE(SUM(COALESCE(prompt_tokens, 0) + COALESCE(completion_tokens, 0)), 0) AS tokens "
+            "FROM llm_calls WHERE ts >= ?",
+            (_today_start(),),
+        ).fetchone()
+    exceeded = bool(
+        (LLM_DAILY_BUDGET_USD is not None and spent["cost"] >= LLM_DAILY_BUDGET_USD)
+        or (LLM_DAILY_TOKEN_BUDGET is not None and spent["tokens"] >= LLM_DAILY_TOKEN_BUDGET)
+    )
+    return {
+        "date": datetime.now().date().isoformat(),
+        "spent_usd": round(spent["cost"], 6),
+        "tokens": spent["tokens"],
+        "budget_usd": LLM_DAILY_BUDGET_USD,
+        "token_budget": LLM_DAILY_TOKEN_BUDGET,
+        "exceeded": exceeded,
+    }
+
+
+def budget_exceeded() -> bool:
+    """非互動工作 (backfill、batch 送出) 在每個檢查點呼叫；未設定預算時一律 False"""
+    if LLM_DAILY_BUDGET_USD is None and LLM_DAILY_TOKEN_BUDGET is None:
+        return False
+    try:
+        return budget_status()["exceeded"]
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ 無法讀取 LLM 用量，略過預算檢查: {e}")
+        return False
+
+
+def _video_channels() -> dict:
+    """沒有 pipeline trace 的呼叫 (對話、手動重新摘要) 由 videos.json 補上頻道"""
+    try:
+        with open("videos.json", 'r', encoding='utf-8') as f:
+            return {v['id']: v.get('channel_title') for v in json.load(f)}
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+GROUP_BY = ("feature", "source", "model", "provider", "channel", "video", "day")
+
+
+def rollup(hours: float = 24, group_by: str = "feature") -> dict:
+    """
+    彙整時間區間內的用量：每組的呼叫數、失敗數、tokens、成本與平均延遲，依成本排序。
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM llm_calls WHERE ts >= ?", (time.time() - hours * 3600,)).fetchall()
+
+    channels = _video_channels() if group_by == "channel" else {}
+    groups = {}
+    for row in rows:
+        if group_by == "day":
+            key = time.strftime("%Y-%m-%d", time.localtime(row["ts"]))
+        elif group_by == "video":
+            key = row["video_id"]
+        elif group_by == "channel":
+            key = row["channel"] or channels.get(row["video_id"])
+        else:
+            key = row[group_by]
+        group = groups.setdefault(key or "unknown", {
+            "calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+            "cost_usd": 0.0, "_latency": [],
+        })
+        group["calls"] += 1
+        group["errors"] += row["outcome"] == "error"
+        group["prompt_tokens"] += row["prompt_tokens"] or 0
+        group["completion_tokens"] += row["completion_tokens"] or 0
+        group["cached_tokens"] += row["cached_tokens"] or 0
+        group["cost_usd"] += row["cost_usd"] or 0.0
+        if row["latency_s"] is not None:
+            group["_latency"].append(row["latency_s"])
+
+    for group in groups.values():
+        latencies = group.pop("_latency")
+        group["cost_usd"] = round(group["cost_usd"], 6)
+        group["avg_latency_s"] = round(sum(latencies) / len(latencies), 3) if latencies else None
+    ordered = dict(sorted(groups.items(), key=lambda kv: (-kv[1]["cost_usd"], -kv[1]["prompt_tokens"])))
+    return {
+        "hours": hours,
+        "group_by": group_by,
+        "total_calls": len(rows),
+        "total_cost_usd": round(sum(g["cost_usd"] for g in groups.values()), 6),
+        "groups": ordered,
+    }
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("llm_usage")
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="LLM token and cost rollups")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--by", choices=GROUP_BY, default="feature")
+    args = parser.parse_args()
+
+    print(json.dumps({**rollup(args.hours, args.by), "budget": budget_status()}, ensure_ascii=False, indent=2))
@@ -0,0 +1,220 @@
+"""
+Log - 結構化、非阻塞的 logging
+- 呼叫端只把 record 放進記憶體 queue (QueueHandler)；格式化成 JSON 與寫檔都在背景的 QueueListener 執行緒，
+  磁碟慢不會卡住 sweep 或 API 的執行緒。queue 滿時丟棄並計數 (log_records_dropped_total)
+- 每個程序寫自己的 LOG_DIR/<process>.jsonl，超過 LOG_MAX_BYTES 輪替，保留 LOG_BACKUP_COUNT 份
+- 每行一個 JSON：時間、level、logger、程序、訊息，以及 video_id / channel 等欄位
+  (extra={...} 傳入，或由 bind() / 目前的 pipeline trace 自動帶入)
+- 重複訊息取樣：同一個呼叫位置在 LOG_SAMPLE_WINDOW 秒內超過 LOG_SAMPLE_BURST 筆就丟棄，
+  下一筆通過的紀錄帶 suppressed 欄位註明丟了幾筆；ERROR 以上不取樣
+- 同時輸出到 stderr：互動終端機 (TTY) 為易讀格式，否則 (Docker、process manager、導向檔案) 為每行一筆 JSON，
+  容器的 log 收集也看得到；LOG_CONSOLE=text/json 強制格式，LOG_CONSOLE=0 關閉
+- 只有進入點 (dashboard_server、sweep worker、scheduler、CLI 的 __main__) 呼叫 setup()；
+  get_logger() 不會設定 logging，被當成函式庫匯入時不會建立 log 檔或改動 root logger
+
+    from tasks.log import get_logger
+    logger = get_logger(__name__)
+    logger.info(f"✅ 摘要完成", extra={"video_id": video_id})
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+import logging.handlers
+from contextlib import contextmanager
+from datetime import datetime
+
+from tasks import metrics
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "auto")
+LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", "60"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "20"))
+QUEUE_SIZE = 10000
+
+# LogRecord 內建屬性；其餘屬性 (extra / bind) 都輸出成 JSON 欄位
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_context = contextvars.ContextVar("log_context", default={})
+_setup_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_process = None
+
+
+@contextmanager
+def bind(**fields):
+    """區塊內 (含 contextvars 傳遞到的執行緒) 的 log 都帶上這些欄位"""
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """在呼叫端執行緒把 bind() 的欄位與程序名稱寫進 record"""
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        record.process_name = _process
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """同一呼叫位置 (檔案 + 行號) 每個時間窗最多放行 burst 筆；ERROR 以上一律放行"""
+    def __init__(self, window: float = LOG_SAMPLE_WINDOW, burst: int = LOG_SAMPLE_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._sites = {}  # (pathname, lineno) -> [window_start, passed, suppressed]
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR or self.burst <= 0:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                suppressed = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+        metrics.inc("log_records_sampled_out_total")
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # 在呼叫端只合併訊息參數與 traceback 文字，JSON 格式化留給 listener 執行緒
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("log_records_dropped_total")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": getattr(record, "process_name", None),
+            "pid": record.process,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key != "process_name":
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _console_format() -> str | None:
+    """stderr 的輸出格式："text"、"json" 或 None (不輸出)；1 為舊設定，等同 text"""
+    mode = LOG_CONSOLE.lower()
+    if mode in ("0", "off"):
+        return None
+    if mode in ("1", "text"):
+        return "text"
+    if mode == "json":
+        return "json"
+    return "text" if sys.stderr.isatty() else "json"
+
+
+def _default_process() -> str:
+    name = os.path.splitext(os.path.basename(sys.argv[0] or ""))[0]
+    return name if name and name not in ("-", "-c", "__main__") else "python"
+
+
+def setup(process: str | None = None) -> None:
+    """
+    設定 root logger (每個程序的進入點呼叫一次)。以不同名稱再次呼叫時改寫到新的檔案。
+    """
+    global _listener, _queue_handler, _process
+    process = process or _process or _default_process()
+    with _setup_lock:
+        if _listener is not None and process == _process:
+            return
+        root = logging.getLogger()
+        if _listener is not None:
+            root.removeHandler(_queue_handler)
+            _listener.stop()
+
+        _process = process
+        handlers = []
+        try:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                os.path.join(LOG_DIR, f"{process}.jsonl"),
+                maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8", delay=True,
+            )
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        except OSError as e:
+            sys.stderr.write(f"⚠️ 無法開啟 log 檔 ({LOG_DIR}): {e}\n")
+        # 無法寫檔時至少輸出到 stderr
+        console_format = _console_format() or (None if handlers else "json")
+        if console_format:
+            console = logging.StreamHandler(sys.stderr)
+            if console_format == "json":
+                console.setFormatter(JsonFormatter())
+            else:
+                console.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", "%H:%M:%S"))
+            handlers.append(console)
+
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(QUEUE_SIZE))
+        _queue_handler.addFilter(SamplingFilter())
+        _queue_handler.addFilter(ContextFilter())
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        root.addHandler(_queue_handler)
+        root.setLevel(LOG_LEVEL)
+
+
+def shutdown() -> None:
+    """停止 listener 並寫完 queue 中剩下的紀錄"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            logging.getLogger().removeHandler(_queue_handler)
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """模組層級的 logger；輸出目的地由進入點的 setup() 決定"""
+    return logging.getLogger(name)
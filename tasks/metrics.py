@@ -0,0 +1,213 @@
+"""
+Metrics - 程序內的輕量指標 (histogram / counter / gauge)
+- histogram 使用固定的對數分布 bucket，記錄一次只是 bisect + 加總，熱路徑上的開銷在微秒等級
+- 百分位數 (p50/p95/p99) 由 bucket 線性內插估計，與 Prometheus histogram_quantile 的算法相同
+- API 程序與 sweep worker 各自累計；worker 定期把 snapshot 寫到 WORKER_SNAPSHOT_FILE，
+  /metrics 輸出時合併兩者 (以 process 標籤區分)
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+
+# 秒；涵蓋 API 請求 (毫秒級) 到 LLM 摘要 (數分鐘)
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.35, 0.5, 0.75,
+    1.0, 1.5, 2.5, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0,
+)
+WORKER_SNAPSHOT_FILE = "metrics_worker.json"
+# worker snapshot 超過此秒數未更新即不再輸出 (worker 已停止)
+SNAPSHOT_STALE_AFTER = 120
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最後一格為 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"buckets": list(self.buckets), "counts": list(self.counts), "count": self.count, "sum": self.sum}
+
+
+def quantile(snapshot: dict, q: float) -> float | None:
+    """由 bucket 計數估計百分位數；落在 +Inf 格時回傳最大的有限邊界"""
+    total = snapshot["count"]
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(snapshot["counts"]):
+        if cumulative + count >= rank and count:
+            if i >= len(snapshot["buckets"]):
+                return snapshot["buckets"][-1]
+            lower = snapshot["buckets"][i - 1] if i > 0 else 0.0
+            upper = snapshot["buckets"][i]
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+    return snapshot["buckets"][-1]
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_help = {}
+
+
+def describe(name: str, text: str) -> None:
+    """Prometheus HELP 說明文字"""
+    _help[name] = text
+
+
+def observe(name: str, value: float, **labels) -> None:
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    histogram.observe(value)
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def gauge_add(name: str, delta: float, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + delta
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def snapshot() -> dict:
+    with _lock:
+        histograms = list(_histograms.items())
+        counters = list(_counters.items())
+        gauges = list(_gauges.items())
+    return {
+        "timestamp": time.time(),
+        "histograms": [{"name": n, "labels": dict(l), **h.snapshot()} for (n, l), h in histograms],
+        "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in counters],
+        "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in gauges],
+    }
+
+
+def reset() -> None:
+    """清空程序內所有指標 (benchmark 在各階段之間使用)"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def summarize(snap: dict, name: str) -> list[dict]:
+    """某個 histogram 各標籤組合的次數與 p50/p95/p99 (毫秒)，供 JSON API 顯示"""
+    rows = []
+    for h in snap["histograms"]:
+        if h["name"] != name or not h["count"]:
+            continue
+        row = dict(h["labels"])
+        row["count"] = h["count"]
+        row["avg_ms"] = round(h["sum"] / h["count"] * 1000, 1)
+        for q in (0.5, 0.95, 0.99):
+            row[f"p{int(q * 100)}_ms"] = round(quantile(h, q) * 1000, 1)
+        rows.append(row)
+    return sorted(rows, key=lambda r: -r["count"])
+
+
+def save_snapshot(path: str = WORKER_SNAPSHOT_FILE) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str = WORKER_SNAPSHOT_FILE) -> dict | None:
+    """讀取 worker snapshot；不存在或已過期時回傳 None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snap = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if time.time() - snap.get("timestamp", 0) > SNAPSHOT_STALE_AFTER:
+        return None
+    return snap
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{k}="{_escape(str(v))}"' for k, v in sorted(labels.items()))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_prometheus(snapshots: dict[str, dict]) -> str:
+    """
+    Prometheus text exposition format (0.0.4)。
+    :param snapshots: {process 名稱: snapshot}，輸出時加上 process 標籤
+    """
+    families = {}
+    for process, snap in snapshots.items():
+        for h in snap["histograms"]:
+            families.setdefault((h["name"], "histogram"), []).append((process, h))
+        for c in snap["counters"]:
+            families.setdefault((c["name"], "counter"), []).append((process, c))
+        for g in snap["gauges"]:
+            families.setdefault((g["name"], "gauge"), []).append((process, g))
+
+    lines = []
+    for (name, kind), samples in sorted(families.items()):
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+        for process, sample in samples:
+            labels = {**sample["labels"], "process": process}
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(sample['value'])}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(sample["buckets"]) + ["+Inf"], sample["counts"]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _format_value(bound)
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(sample['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {sample['count']}")
+    return "\n".join(lines) + "\n"
+
+
+describe("http_request_duration_seconds", "HTTP request latency by route template, method and status")
+describe("http_requests_in_flight", "HTTP requests currently being processed")
+describe("pipeline_stage_seconds", "Ingest pipeline stage duration (resolve, rss, classify, transcript, llm, write, db)")
+describe("sweep_duration_seconds", "Duration of a full check_updates sweep")
+describe("sweep_videos_total", "Videos processed by check_updates sweeps")
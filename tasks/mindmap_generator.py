@@ -1,13 +1,28 @@
 """
-Mindmap Generator - 從 YouTube 影片逐字稿生成心智圖
-使用 OpenAI API 提取階層式主題結構，輸出 Mermaid mindmap 語法
+Mindmap Generator - 從 YouTube 影片摘要 (或逐字稿) 生成心智圖
+輸出 Mermaid mindmap 語法。MINDMAP_MODE 決定來源：
+- summary (預設)：直接把 summary_{id}.md 的章節結構轉成 Mermaid，不呼叫 LLM
+- summary_llm：以摘要 (而非逐字稿) 為輸入的小型 LLM 呼叫
+- transcript：舊行為，以逐字稿呼叫 LLM
+沒有摘要 (或摘要沒有可轉換的章節) 的影片一律退回逐字稿模式。
 """
 
 import os
+import re
+import sys
 import json
-from openai import OpenAI
 from dotenv import load_dotenv
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tasks.context_packer import fit_prompt
+from tasks.llm_gateway import chat_completion, is_configured
+from tasks.transcript_normalizer import load_normalized_segments, segments_to_text
+from tasks.summarizer import get_summary_path, TRANSCRIPT_DIR
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
 load_dotenv()
 
 # 快取目錄
@@ -54,11 +69,37 @@ mindmap
 
 ---
 
-## 逐字稿內容
+## 內容 (逐字稿或摘要)
 {transcript}
 
 請只輸出 Mermaid 語法，從 `mindmap` 開始："""
 
+MINDMAP_SYSTEM_PROMPT = "You are a content structure expert. Output ONLY Mermaid mindmap syntax, no explanation."
+# 心智圖只需要結構，不需要完整逐字稿
+MINDMAP_MAX_INPUT_TOKENS = int(os.getenv("MINDMAP_MAX_INPUT_TOKENS", "20000"))
+MINDMAP_MODE = os.getenv("MINDMAP_MODE", "summary")
+MINDMAP_MODES = ("summary", "summary_llm", "transcript")
+
+# 摘要轉換時的節點限制，避免心智圖過於擁擠
+MAX_NODE_CHARS = 24
+MAX_CHILDREN = 8
+MAX_PARAGRAPH_SENTENCES = 4
+SECTION_ICONS = {
+    "內容摘要": "📝",
+    "主要問題": "❓",
+    "有條理的內容整理": "🗂️",
+    "精煉亮點": "✨",
+}
+DEFAULT_SECTION_ICON = "📌"
+
+_HEADING_RE = re.compile(r'^(#{2,6})\s+(.*)$')
+_CATEGORY_RE = re.compile(r'^\*\*\[?(.+?)\]?\*\*[:：]?$')
+_BULLET_RE = re.compile(r'^(\s*)(?:[*+-]|\d+[.)])\s+(.*)$')
+_LEAD_TERM_RE = re.compile(r'^\*\*(.+?)\*\*\s*[:：]')
+_LINK_RE = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+_UNSAFE_RE = re.compile(r'[()\[\]{}<>"`*#|]')
+_SENTENCE_RE = re.compile(r'(?<=[。！？!?])|(?<=\.)\s')
+
 
 def get_cached_mindmap(video_id: str) -> str | None:
     """檢查是否有快取的心智圖"""
@@ -74,107 +115,245 @@ def save_mindmap(video_id: str, mermaid_code: str) -> None:
     cache_path = os.path.join(MINDMAP_DIR, f"{video_id}.txt")
     with open(cache_path, "w", encoding="utf-8") as f:
         f.write(mermaid_code)
-    print(f"✅ 心智圖已快取至: {cache_path}")
+    logger.info(f"✅ 心智圖已快取至: {cache_path}")
 
 
 def get_transcript_text(video_id: str) -> str | None:
-    """讀取逐字稿文字"""
-    transcript_dir = os.path.join(os.path.dirname(__file__), "..", "transcripts")
-    file_path = os.path.join(transcript_dir, f"{video_id}.json")
+    """讀取逐字稿文字 (正規化版本)"""
+    file_path = os.path.join(TRANSCRIPT_DIR, f"{video_id}.json")
     
     if not os.path.exists(file_path):
         return None
     
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, list):
-                return " ".join([item.get('text', '') for item in data])
-            elif isinstance(data, dict) and 'text' in data:
-                return data['text']
+        segments = load_normalized_segments(file_path)
+        if segments is not None:
+            return segments_to_text(segments)
     except Exception as e:
-        print(f"⚠️ 讀取逐字稿失敗 ({video_id}): {e}")
+        logger.warning(f"⚠️ 讀取逐字稿失敗 ({video_id}): {e}")
+    return None
+
+
+def get_summary_text(video_id: str) -> str | None:
+    """讀取已生成的摘要 (summary_{id}.md)"""
+    path = get_summary_path(video_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _video_title(video_id: str) -> str | None:
+    if not os.path.exists("videos.json"):
+        return None
+    try:
+        with open("videos.json", "r", encoding="utf-8") as f:
+            for video in json.load(f):
+                if video.get("id") == video_id:
+                    return video.get("title")
+    except (json.JSONDecodeError, OSError):
+        pass
     return None
 
 
-def generate_mindmap(video_id: str, force_regenerate: bool = False) -> str | None:
+def _node_text(text: str, max_chars: int = MAX_NODE_CHARS) -> str:
+    """移除 Markdown 標記與 Mermaid 不接受的符號，並截斷過長的文字"""
+    text = _LINK_RE.sub(r'\1', text)
+    lead = _LEAD_TERM_RE.match(text)
+    if lead:
+        # "**術語**：說明" 只保留術語
+        text = lead.group(1)
+    text = _UNSAFE_RE.sub(' ', text)
+    text = re.sub(r'\s+', ' ', text).strip(" :：-")
+    if len(text) > max_chars:
+        text = text[:max_chars - 1].rstrip() + "…"
+    return text
+
+
+def summary_to_mermaid(summary: str, title: str | None = None) -> str | None:
+    """
+    把摘要 Markdown 轉成 Mermaid mindmap (不呼叫 LLM)。
+    ## 章節 -> 主分支；**[類別]** / ### 標題 -> 子分支；清單項目 -> 葉節點；
+    段落則取前幾句作為葉節點。
+    :return: 摘要沒有任何帶內容的 ## 章節 (空白、只有標題) 時回傳 None
+    """
+    root = {"text": title or "影片主題", "children": []}
+    section = None
+    category = None
+    bullet_stack = []  # [(縮排, 節點)]
+
+    def add(parent, text):
+        text = _node_text(text)
+        if not text or len(parent["children"]) >= MAX_CHILDREN:
+            return None
+        node = {"text": text, "children": []}
+        parent["children"].append(node)
+        return node
+
+    for raw_line in summary.splitlines():
+        line = raw_line.rstrip()
+        stripped = line.strip()
+        if not stripped or stripped.startswith(">") or stripped == "---":
+            continue
+
+        heading = _HEADING_RE.match(stripped)
+        if heading and len(heading.group(1)) == 2:
+            name = heading.group(2).strip()
+            icon = SECTION_ICONS.get(name, DEFAULT_SECTION_ICON)
+            section = add(root, name)
+            if section is not None:
+                section["text"] = f"{icon} {section['text']}"
+            category, bullet_stack = None, []
+            continue
+        if section is None:
+            continue
+
+        category_match = _CATEGORY_RE.match(stripped)
+        if heading or category_match:
+            category = add(section, (heading or category_match).group(2 if heading else 1))
+            bullet_stack = []
+            continue
+
+        bullet = _BULLET_RE.match(line)
+        parent = category or section
+        if parent is None:
+            continue
+        if bullet:
+            indent = len(bullet.group(1).replace("\t", "    "))
+            while bullet_stack and bullet_stack[-1][0] >= indent:
+                bullet_stack.pop()
+            # 清單最多兩層，更深的項目併入第二層
+            if bullet_stack:
+                parent = bullet_stack[0][1]
+            node = add(parent, bullet.group(2))
+            if node is not None and len(bullet_stack) < 2:
+                bullet_stack.append((indent, node))
+            continue
+
+        # 一般段落：取前幾句
+        sentences = [s.strip() for s in _SENTENCE_RE.split(stripped) if s.strip()]
+        for sentence in sentences[:MAX_PARAGRAPH_SENTENCES]:
+            add(parent, sentence)
+
+    if not any(section["children"] for section in root["children"]):
+        return None
+
+    lines = ["mindmap", f"  root(({_node_text(root['text'], 40)}))"]
+
+    def render(node, depth):
+        for child in node["children"]:
+            lines.append("  " * depth + child["text"])
+            render(child, depth + 1)
+
+    render(root, 2)
+    return "\n".join(lines)
+
+
+def _clean_mermaid(mermaid_code: str) -> str | None:
+    # 清理可能的 markdown 包裝
+    if mermaid_code.startswith("```mermaid"):
+        mermaid_code = mermaid_code[len("```mermaid"):].strip()
+    if mermaid_code.startswith("```"):
+        mermaid_code = mermaid_code[3:].strip()
+    if mermaid_code.endswith("```"):
+        mermaid_code = mermaid_code[:-3].strip()
+
+    # 確保以 mindmap 開頭
+    if not mermaid_code.startswith("mindmap"):
+        logger.warning("⚠️ 生成的內容格式不正確")
+        return None
+    return mermaid_code
+
+
+def generate_mindmap(video_id: str, force_regenerate: bool = False, mode: str | None = None) -> str | None:
     """
     生成心智圖 Mermaid 語法
     
     :param video_id: YouTube Video ID
     :param force_regenerate: 是否強制重新生成（忽略快取）
+    :param mode: summary / summary_llm / transcript (預設為 MINDMAP_MODE)
     :return: Mermaid mindmap 語法字串 or None
     """
     # 1. 檢查快取
     if not force_regenerate:
         cached = get_cached_mindmap(video_id)
         if cached:
-            print(f"📦 使用快取的心智圖: {video_id}")
+            logger.info(f"📦 使用快取的心智圖: {video_id}")
             return cached
+
+    mode = mode or MINDMAP_MODE
+    if mode not in MINDMAP_MODES:
+        logger.warning(f"⚠️ 未知的 MINDMAP_MODE: {mode}，改用 summary")
+        mode = "summary"
+
+    # 2. 優先使用已生成的摘要
+    summary_text = get_summary_text(video_id) if mode != "transcript" else None
+    if summary_text and mode == "summary":
+        mermaid_code = summary_to_mermaid(summary_text, _video_title(video_id))
+        if mermaid_code:
+            save_mindmap(video_id, mermaid_code)
+            return mermaid_code
+        logger.warning(f"⚠️ 摘要沒有可轉換的章節，改用逐字稿: {video_id}")
+        summary_text = None
+
+    if summary_text:
+        source_text, label = summary_text, "摘要"
+    else:
+        # 3. 沒有摘要才讀取逐字稿
+        source_text, label = get_transcript_text(video_id), "逐字稿"
+        if not source_text:
+            logger.error(f"❌ 找不到摘要或逐字稿: {video_id}")
+            return None
     
-    # 2. 讀取逐字稿
-    transcript_text = get_transcript_text(video_id)
-    if not transcript_text:
-        print(f"❌ 找不到逐字稿: {video_id}")
-        return None
-    
-    # 截斷過長的逐字稿
-    if len(transcript_text) > 50000:
-        print("⚠️ 逐字稿過長，進行截斷...")
-        transcript_text = transcript_text[:50000]
-    
-    # 3. 使用 OpenAI 生成心智圖
-    api_key = os.getenv("LLM_API_KEY")
-    base_url = os.getenv("LLM_BASE_URL")
+    # 4. 使用 LLM 生成心智圖
     model_name = os.getenv("LLM_MODEL", "gpt-4o")
     
-    if not api_key or not base_url:
-        print("⚠️ 未設定 LLM_API_KEY 或 LLM_BASE_URL")
-        return None
+    if not is_configured():
+        logger.warning("⚠️ 未設定 LLM_API_KEY 或 LLM_BASE_URL")
+        mermaid_code = summary_to_mermaid(summary_text, _video_title(video_id)) if summary_text else None
+        if mermaid_code:
+            save_mindmap(video_id, mermaid_code)
+        return mermaid_code
     
-    print(f"🧠 正在生成心智圖: {video_id}...")
+    logger.info(f"🧠 正在從{label}生成心智圖: {video_id}...")
+
+    # 以 token 預算打包內容 (取代字元截斷)
+    user_prompt = fit_prompt(
+        MINDMAP_PROMPT, "{transcript}", source_text,
+        model=model_name, system_prompt=MINDMAP_SYSTEM_PROMPT, max_input_tokens=MINDMAP_MAX_INPUT_TOKENS
+    )
     
     try:
-        client = OpenAI(api_key=api_key, base_url=base_url)
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
+        mermaid_code = chat_completion(
+            [
                 {
                     "role": "system", 
-                    "content": "You are a content structure expert. Output ONLY Mermaid mindmap syntax, no explanation."
+                    "content": MINDMAP_SYSTEM_PROMPT
                 },
                 {
                     "role": "user", 
-                    "content": MINDMAP_PROMPT.replace("{transcript}", transcript_text)
+                    "content": user_prompt
                 }
             ],
-            temperature=0.5
-        )
-        
-        mermaid_code = response.choices[0].message.content.strip()
-        
-        # 清理可能的 markdown 包裝
-        if mermaid_code.startswith("```mermaid"):
-            mermaid_code = mermaid_code[len("```mermaid"):].strip()
-        if mermaid_code.startswith("```"):
-            mermaid_code = mermaid_code[3:].strip()
-        if mermaid_code.endswith("```"):
-            mermaid_code = mermaid_code[:-3].strip()
-        
-        # 確保以 mindmap 開頭
-        if not mermaid_code.startswith("mindmap"):
-            print("⚠️ 生成的內容格式不正確")
-            return None
-        
-        # 4. 儲存快取
-        save_mindmap(video_id, mermaid_code)
-        
-        return mermaid_code
-        
+            temperature=0.5,
+            feature="mindmap",
+            video_id=video_id,
+        ).strip()
+        mermaid_code = _clean_mermaid(mermaid_code)
     except Exception as e:
-        print(f"❌ 生成心智圖時發生錯誤: {e}")
+        logger.error(f"❌ 生成心智圖時發生錯誤: {e}")
+        mermaid_code = None
+
+    if mermaid_code is None and summary_text:
+        # 摘要 LLM 模式失敗時退回不需要 LLM 的轉換
+        mermaid_code = summary_to_mermaid(summary_text, _video_title(video_id))
+    if mermaid_code is None:
         return None
 
+    # 5. 儲存快取
+    save_mindmap(video_id, mermaid_code)
+    return mermaid_code
+
 
 def mindmap_exists(video_id: str) -> bool:
     """檢查心智圖是否已生成"""
@@ -184,7 +363,8 @@ def mindmap_exists(video_id: str) -> bool:
 
 # CLI 測試
 if __name__ == "__main__":
-    import sys
+    from tasks import log
+    log.setup("mindmap_generator")
     if len(sys.argv) > 1:
         video_id = sys.argv[1]
         result = generate_mindmap(video_id)
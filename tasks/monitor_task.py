@@ -2,74 +2,62 @@ import json
 import os
 import requests
 import re
+import threading
+import time
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import sys
-import os
 
 # 將專案根目錄加入 sys.path，以便能找到 tasks 模組
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from tasks.summarizer import summarize_video, save_summary
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, VideoUnavailable
-
-STATE_FILE = "monitor_state.json"
-OUTPUT_FILE = "new_videos.txt"
+from tasks.ingest_pipeline import run_pipeline
+from tasks.summarizer import get_summary_path
+from tasks.keyword_extractor import extract_tags
+from youtube_transcript_api import VideoUnavailable
+from tasks.circuit_breaker import get_breaker
+from tasks import channel_registry
+from tasks import metrics
+from tasks import pipeline_trace
+from tasks import profiler
+from tasks.youtube_endpoints import youtube_url, rewrite, transcript_api
+from tasks.process_lock import locked
+from tasks.log import get_logger
 
-CHANNELS = [
-    "https://www.youtube.com/@LennysPodcast",
-    "https://www.youtube.com/@googleantigravity",
-    "https://www.youtube.com/@Google/videos",
-    "https://www.youtube.com/@ycombinator",
-    "https://www.youtube.com/@a16z",
-    "https://www.youtube.com/@aiDotEngineer",
-    "https://www.youtube.com/@EveryInc",
-    "https://www.youtube.com/@AcquiredFM",
-    "https://www.youtube.com/@howiaipodcast",
-    "https://www.youtube.com/@hamelhusain7140",
-    "https://www.youtube.com/@StephenGPope",
-    "https://www.youtube.com/@anthropic-ai",
-    "https://www.youtube.com/@GregIsenberg"
-]
-
-def load_state():
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-    return {}
+logger = get_logger(__name__)
 
-def save_state(state):
-    with open(STATE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+# videos.json 的讀寫鎖 (監控、backfill、批次摘要可能同時寫入)
+# threading.Lock 保護同程序內的執行緒，VIDEO_DB_LOCK_FILE 的 flock 保護 API 與 worker 之間
+_db_lock = threading.Lock()
+VIDEO_DB_LOCK_FILE = "videos.json.lock"
+OUTPUT_FILE = "new_videos.txt"
 
 def get_channel_id_from_url(url):
     """
     從 YouTube 頻道 URL 提取 Channel ID。
     """
-    try:
-        response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'})
-        response.raise_for_status()
+    with pipeline_trace.stage("resolve"):
+        try:
+            response = requests.get(rewrite(url), headers={'User-Agent': 'Mozilla/5.0'})
+            response.raise_for_status()
         
-        patterns = [
-            r'"externalId":"([^"]+)"',
-            r'"browseId":"(UC[^"]+)"',
-            r'itemprop="channelId" content="([^"]+)"',
-            # r'"channelId":"([^"]+)"', # ⚠️ Removed: Too loose, matches related channels
-        ]
+            patterns = [
+                r'"externalId":"([^"]+)"',
+                r'"browseId":"(UC[^"]+)"',
+                r'itemprop="channelId" content="([^"]+)"',
+                # r'"channelId":"([^"]+)"', # ⚠️ Removed: Too loose, matches related channels
+            ]
         
-        for pattern in patterns:
-            match = re.search(pattern, response.text)
-            if match:
-                return match.group(1)
+            for pattern in patterns:
+                match = re.search(pattern, response.text)
+                if match:
+                    return match.group(1)
             
-        print(f"⚠️ 無法從 {url} 提取 Channel ID")
-        return None
-    except Exception as e:
-        print(f"❌ 獲取 {url} 時發生錯誤: {e}")
-        return None
+            logger.warning(f"⚠️ 無法從 {url} 提取 Channel ID")
+            return None
+        except Exception as e:
+            logger.error(f"❌ 獲取 {url} 時發生錯誤: {e}")
+            return None
 
 def is_shorts(video_id):
     """
@@ -77,7 +65,7 @@ def is_shorts(video_id):
     If it's a Short, it returns 200.
     If it's a regular video, it redirects (303) to /watch.
     """
-    url = f"https://www.youtube.com/shorts/{video_id}"
+    url = youtube_url(f"/shorts/{video_id}")
     try:
         # allow_redirects=False to catch the 303 redirect
         resp = requests.head(url, headers={'User-Agent': 'Mozilla/5.0'}, allow_redirects=False, timeout=5)
@@ -98,7 +86,7 @@ def is_premiere(video_id):
     """
     try:
         # Just try to fetch transcripts.
-        yt_api = YouTubeTranscriptApi()
+        yt_api = transcript_api()
         yt_api.fetch(video_id, languages=['en']) # Language doesn't matter for checking availability
         return False
     except VideoUnavailable as e:
@@ -117,7 +105,7 @@ def is_upcoming_live(video_id):
     Check if a video is an upcoming live stream.
     Checks for "status":"UPCOMING" or "scheduledStartTime" in the video page HTML.
     """
-    url = f"https://www.youtube.com/watch?v={video_id}"
+    url = youtube_url(f"/watch?v={video_id}")
     try:
         resp = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
         resp.raise_for_status()
@@ -133,19 +121,40 @@ def is_upcoming_live(video_id):
             
         return False
     except Exception as e:
-        print(f"⚠️ Check upcoming live failed for {video_id}: {e}")
+        logger.warning(f"⚠️ Check upcoming live failed for {video_id}: {e}", extra={"video_id": video_id})
         return False
 
-def get_new_videos(channel_id, last_video_link=None):
+def _skip_reason(video_id):
+    """Shorts、首播預告、即將直播不處理；回傳略過原因，正常影片回傳 None"""
+    if is_shorts(video_id):
+        return f"⚠️ 跳過 Shorts: {video_id}"
+    if is_premiere(video_id):
+        return f"⏳ 影片尚在首播預告中，跳過: {video_id}"
+    if is_upcoming_live(video_id):
+        return f"⏳ 影片為即將直播，跳過: {video_id}"
+    return None
+
+def get_new_videos(channel_id, last_video_link=None, traced=False):
     """
     使用 RSS Feed 獲取「新」影片列表。
     如果提供了 last_video_link，回傳該連結之後的所有影片。
     如果沒提供 (Init)，只回傳最新的一部。
+    :param traced: 為回傳的影片建立 pipeline trace (會進入摘要管線時使用)
     """
-    rss_url = f"https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+    rss_url = youtube_url(f"/feeds/videos.xml?channel_id={channel_id}")
+    rss_breaker = get_breaker("rss")
+    if not rss_breaker.allow_request():
+        logger.warning(f"🚫 RSS 斷路器開啟中，略過 {channel_id}", extra={"channel_id": channel_id})
+        return []
     try:
-        response = requests.get(rss_url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
-        response.raise_for_status()
+        try:
+            with pipeline_trace.stage("rss"):
+                response = requests.get(rss_url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+                response.raise_for_status()
+        except Exception as e:
+            rss_breaker.record_failure(e)
+            raise
+        rss_breaker.record_success()
         
         root = ET.fromstring(response.content)
         ns = {'atom': 'http://www.w3.org/2005/Atom', 'yt': 'http://www.youtube.com/xml/schemas/2015'}
@@ -166,19 +175,11 @@ def get_new_videos(channel_id, last_video_link=None):
             if last_video_link and link == last_video_link:
                 break
                 
-            # 2. Check Shorts
-            if is_shorts(video_id):
-                print(f"⚠️ 跳過 Shorts: {video_id}")
-                continue
-
-            # 3. Check Premiere
-            if is_premiere(video_id):
-                print(f"⏳ 影片尚在首播預告中，跳過: {video_id}")
-                continue
-
-            # 4. Check Upcoming Live
-            if is_upcoming_live(video_id):
-                print(f"⏳ 影片為即將直播，跳過: {video_id}")
+            # 2-4. Check Shorts / Premiere / Upcoming Live
+            with pipeline_trace.stage("classify") as classify:
+                skip_reason = _skip_reason(video_id)
+            if skip_reason:
+                logger.info(skip_reason, extra={"video_id": video_id})
                 continue
 
             title = entry.find('atom:title', ns).text
@@ -201,6 +202,8 @@ def get_new_videos(channel_id, last_video_link=None):
             }
             
             found_videos.append(video_info)
+            if traced:
+                pipeline_trace.begin(video_info).add_step("classify", classify.seconds)
             
             # 3. If Init mode (no last_video_link), we only want the LATEST single healthy video
             if last_video_link is None:
@@ -209,114 +212,223 @@ def get_new_videos(channel_id, last_video_link=None):
         return found_videos
         
     except Exception as e:
-        print(f"❌ 獲取 RSS {channel_id} 時發生錯誤: {e}")
+        logger.error(f"❌ 獲取 RSS {channel_id} 時發生錯誤: {e}", extra={"channel_id": channel_id})
         return []
 
 def update_video_db(video_info):
     """
     Helper function to update videos.json with a single video immediately.
     """
-    history_file = "videos.json"
-    history = []
+    add_videos_to_db([video_info])
+
+def _load_video_db(history_file):
     if os.path.exists(history_file):
         try:
             with open(history_file, 'r', encoding='utf-8') as f:
-                history = json.load(f)
+                return json.load(f)
         except:
             pass
-    
-    # Check if exists
-    for v in history:
-        if v.get('id') == video_info['id']:
-            return
-
-    history.insert(0, video_info) # Add to top
-    
-    # Sort by published date desc to ensure order is correct even if backfilling
-    history.sort(key=lambda x: x.get('published', ''), reverse=True)
+    return []
 
-    print(f"📚 立即新增影片到資料庫: {video_info['title']}")
-    
-    with open(history_file, 'w', encoding='utf-8') as f:
+def _save_video_db(history_file, history):
+    tmp_file = f"{history_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
         json.dump(history, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, history_file)
+
+def _tag_untagged(entries):
+    """為有摘要但還沒有標籤的影片擷取 TF-IDF 標籤 (直接修改 entries)"""
+    untagged = [v for v in entries if not v.get('tags') and os.path.exists(get_summary_path(v['id']))]
+    if not untagged:
+        return 0
+    try:
+        tags = extract_tags(untagged)
+    except Exception as e:
+        logger.warning(f"⚠️ 擷取標籤失敗: {e}")
+        return 0
+    for v in untagged:
+        if tags.get(v['id']):
+            v['tags'] = tags[v['id']]
+    return len(tags)
+
+def add_videos_to_db(video_infos):
+    """
+    將多部影片一次寫入 videos.json (單次讀取 + 單次寫入)。
+    已存在的影片會被略過；有摘要但沒有標籤的影片 (含已存在者) 會順便擷取標籤。
+    :return: 實際新增的影片數
+    """
+    history_file = "videos.json"
+    with _db_lock, locked(VIDEO_DB_LOCK_FILE):
+        history = _load_video_db(history_file)
+
+        # Check if exists
+        by_id = {v.get('id'): v for v in history}
+        added = []
+        for video_info in video_infos:
+            if video_info['id'] in by_id:
+                continue
+            by_id[video_info['id']] = video_info
+            added.append(video_info)
+
+        tagged = _tag_untagged([by_id[v['id']] for v in video_infos])
+        if not added and not tagged:
+            return 0
 
+        history = added[::-1] + history # Add to top
+        
+        # Sort by published date desc to ensure order is correct even if backfilling
+        history.sort(key=lambda x: x.get('published') or '', reverse=True)
+
+        if len(added) == 1:
+            logger.info(f"📚 立即新增影片到資料庫: {added[0]['title']}")
+        elif added:
+            logger.info(f"📚 批次新增 {len(added)} 部影片到資料庫")
+        
+        _save_video_db(history_file, history)
+    return len(added)
+
+def update_video_fields(updates):
+    """
+    更新 videos.json 中既有影片的欄位 (單次讀取 + 單次寫入)。
+    :param updates: {video_id: {欄位: 值}}
+    :return: 實際更新的影片數
+    """
+    history_file = "videos.json"
+    with _db_lock, locked(VIDEO_DB_LOCK_FILE):
+        history = _load_video_db(history_file)
+        updated = 0
+        for v in history:
+            fields = updates.get(v.get('id'))
+            if fields:
+                v.update(fields)
+                updated += 1
+        if updated:
+            _save_video_db(history_file, history)
+    return updated
+
+def toggle_video_read(video_id):
+    """
+    切換影片的已讀狀態 (未設定視為未讀)。
+    :return: 更新後的影片；找不到時回傳 None
+    """
+    history_file = "videos.json"
+    with _db_lock, locked(VIDEO_DB_LOCK_FILE):
+        history = _load_video_db(history_file)
+        for v in history:
+            if v.get('id') == video_id:
+                v['is_read'] = not v.get('is_read', False)
+                _save_video_db(history_file, history)
+                return v
+    return None
+
+def warm_channel(url):
+    """
+    新頻道的背景準備：解析 channel_id 並讀取一次 RSS 確認可用。
+    不處理影片 (交給下次檢查更新)，因此新增頻道不會觸發整輪更新。
+    同一頻道已以其他網址 (例如 /channel/UC... 與 @handle) 監控時，移除這筆並回傳 duplicate_of。
+    """
+    channel = channel_registry.get_channel(url)
+    if channel is None:
+        return None  # 已被移除
+
+    channel_id = channel['channel_id'] or get_channel_id_from_url(url)
+    if not channel_id:
+        channel_registry.update_channel(url, resolve_error="無法解析 Channel ID")
+        return {"url": url, "channel_id": None}
+
+    existing = channel_registry.find_by_channel_id(channel_id, exclude_url=url)
+    if existing:
+        channel_registry.remove_channel(url)
+        logger.warning(f"⚠️ 頻道已在監控中 ({existing['url']})，移除重複的 {url}")
+        return {"url": url, "channel_id": channel_id, "duplicate_of": existing['url']}
+
+    latest = get_new_videos(channel_id)
+    title = latest[0]['channel_title'] if latest else channel['title']
+    channel_registry.update_channel(url, channel_id=channel_id, title=title, resolve_error=None)
+    logger.info(f"✅ 頻道已就緒: {title or url} ({channel_id})")
+    return {
+        "url": url,
+        "channel_id": channel_id,
+        "title": title,
+        "latest_video": latest[0]['title'] if latest else None,
+    }
+
+@profiler.profiled("check_updates")
 def check_updates():
     """
     定期檢查任務主函數
+    1. 探索：逐一檢查 channel_registry 中的頻道 RSS，收集所有新影片
+    2. 處理：交給 ingest pipeline 並行預取逐字稿、依序生成摘要並寫入資料庫
     """
-    print(f"[{datetime.now()}] 開始檢查 YouTube 頻道更新...")
-    state = load_state()
-    state_updated = False
+    logger.info("開始檢查 YouTube 頻道更新...")
+    sweep_started = time.perf_counter()
     new_video_entries = []
-    
-    for url in CHANNELS:
-        print(f"👀 正在檢查: {url}")
-        # 如果 state 中沒有緩存 channel_id，則重新獲取
-        if url in state and 'channel_id' in state[url]:
-            channel_id = state[url]['channel_id']
-        else:
+    pending = []  # [(channel_url, video_info)]，各頻道由舊到新
+
+    for channel in channel_registry.list_channels():
+        url = channel['url']
+        logger.info(f"👀 正在檢查: {url}", extra={"channel": url})
+        # 如果沒有緩存 channel_id，則重新獲取
+        channel_id = channel['channel_id']
+        if not channel_id:
             channel_id = get_channel_id_from_url(url)
-            if channel_id:
-                if url not in state:
-                    state[url] = {}
-                state[url]['channel_id'] = channel_id
-                state_updated = True
-        
+            if channel_id and channel_registry.find_by_channel_id(channel_id, exclude_url=url):
+                logger.warning(f"⚠️ {url} 與已監控的頻道相同 ({channel_id})，略過", extra={"channel": url})
+                channel_id = None
+            elif channel_id:
+                channel_registry.update_channel(url, channel_id=channel_id)
+
         if channel_id:
-            last_video_link = state.get(url, {}).get('last_video_link')
-            
             # Get list of new videos
-            new_videos_list = get_new_videos(channel_id, last_video_link)
-            
+            new_videos_list = get_new_videos(channel_id, channel['last_video_link'], traced=True)
+
             if new_videos_list:
-                print(f"🔎 發現 {len(new_videos_list)} 部新影片 (Channel: {url})")
-                
+                logger.info(f"🔎 發現 {len(new_videos_list)} 部新影片 (Channel: {url})", extra={"channel": url})
+
                 # Process from Oldest to Newest to maintain chronological order in state/logs
                 for video_info in reversed(new_videos_list):
-                    current_video_link = video_info['link']
-                    
-                    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    entry = f"[{timestamp}] New Video: {video_info['title']} - {video_info['link']}\n"
-                    new_video_entries.append(entry)
-                    print(entry.strip())
-                    
-                    # 觸發摘要生成
-                    if video_info.get('id'):
-                        summary_content = summarize_video(video_info['id'], video_info['title'])
-                        if summary_content:
-                            save_summary(video_info['id'], summary_content)
-                    
-                    # === Real-time Update: Save to DB Immediately ===
-                    update_video_db(video_info)
-
-                    if url not in state:
-                        state[url] = {}
-                    state[url]['last_video_link'] = current_video_link
-                    state[url]['last_video_title'] = video_info['title']
-                    state[url]['last_checked'] = datetime.now().isoformat()
-                    # Save state immediately too, to prevent duplicate processing if crash
-                    save_state(state) 
-                    state_updated = False # Handled above
-                    
-                    # Rate Limiting: Sleep to avoid IP Ban
-                    import time
-                    import random
-                    sleep_time = random.uniform(30, 60)
-                    print(f"😴 休息 {sleep_time:.1f} 秒以避免觸發 Rate Limit...")
-                    time.sleep(sleep_time)
+                    pending.append((url, video_info))
+
+    channel_of = {video_info['id']: url for url, video_info in pending}
+
+    def on_video_done(video_info, summary_content):
+        url = channel_of[video_info['id']]
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        entry = f"[{timestamp}] New Video: {video_info['title']} - {video_info['link']}\n"
+        new_video_entries.append(entry)
+        logger.info(entry.strip())
+
+        # === Real-time Update: Save to DB Immediately ===
+        update_video_db(video_info)
+
+        # Save channel progress immediately too, to prevent duplicate processing if crash
+        channel_registry.update_channel(
+            url,
+            title=video_info.get('channel_title'),
+            last_video_link=video_info['link'],
+            last_video_title=video_info['title'],
+            last_checked=datetime.now().isoformat(),
+        )
+
+    # 管線會依輸入順序回呼，因此每個頻道的 last_video_link 仍按時間推進
+    run_pipeline([video_info for _, video_info in pending], on_video_done)
 
     # Write log file for record (optional batch write or append)
     if new_video_entries:
-        print(f"📝 寫入 {len(new_video_entries)} 筆新影片紀錄到 {OUTPUT_FILE}")
+        logger.info(f"📝 寫入 {len(new_video_entries)} 筆新影片紀錄到 {OUTPUT_FILE}")
         with open(OUTPUT_FILE, 'a', encoding='utf-8') as f: # Changed to append mode 'a'
             for entry in new_video_entries:
                 f.write(entry)
     else:
-        print("沒有發現新影片。")
+        logger.info("沒有發現新影片。")
     
-    print(f"[{datetime.now()}] 檢查完成。\n")
+    metrics.observe("sweep_duration_seconds", time.perf_counter() - sweep_started)
+    metrics.inc("sweep_videos_total", len(new_video_entries))
+    logger.info("檢查完成。")
     return len(new_video_entries)
 
 if __name__ == "__main__":
+    from tasks import log
+    log.setup("monitor_task")
     # 用於測試
     check_updates()
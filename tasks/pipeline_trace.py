@@ -0,0 +1,269 @@
+"""
+Pipeline Trace - 每部影片在擷取管線中的結構化紀錄
+- 發現 (RSS) 時建立 trace，之後各階段把資訊寫進「目前的 trace」：
+  分類耗時、逐字稿來源 (cache / api / yt-dlp) 與字數、LLM 供應商/模型與 token 數、各步驟耗時、結果
+- 目前的 trace 以 contextvar 傳遞，深層函數 (逐字稿抓取、LLM gateway) 不需要改簽章就能 annotate；
+  ingest pipeline 在每個工作執行緒中以 activate() 設定
+- 完成後寫入 traces.sqlite (一部影片一列)，/api/pipeline_stats 依頻道或時間區間彙整
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from tasks import metrics, log
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+TRACE_DB = os.getenv("TRACE_DB", "traces.sqlite")
+TRACE_RETENTION_DAYS = int(os.getenv("TRACE_RETENTION_DAYS", "90"))
+# 已發現但尚未進入管線的 trace 上限 (避免中斷的 sweep 留下的 trace 無限累積)
+MAX_ACTIVE = 1000
+
+# 寫入 traces 表的欄位 (其餘資訊放在 steps JSON)
+COLUMNS = (
+    "video_id", "channel", "title", "source", "discovered_at", "finished_at", "outcome", "error",
+    "transcript_source", "transcript_chars", "provider", "model", "prompt_tokens", "completion_tokens",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS traces (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT NOT NULL,
+    channel TEXT,
+    title TEXT,
+    source TEXT,
+    discovered_at REAL,
+    finished_at REAL NOT NULL,
+    outcome TEXT,
+    error TEXT,
+    transcript_source TEXT,
+    transcript_chars INTEGER,
+    provider TEXT,
+    model TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    steps TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_traces_finished ON traces (finished_at);
+CREATE INDEX IF NOT EXISTS idx_traces_video ON traces (video_id);
+"""
+
+_current = contextvars.ContextVar("pipeline_trace", default=None)
+_active = OrderedDict()  # video_id -> trace
+_active_lock = threading.Lock()
+_initialized = set()
+
+
+class Trace:
+    def __init__(self, video_id: str, **fields):
+        self.video_id = video_id
+        self.fields = {"discovered_at": time.time(), **fields}
+        self.steps = {}  # 步驟名稱 -> 秒數 (同名步驟累加，例如 hedging 的多次 LLM 呼叫)
+        self._lock = threading.Lock()
+
+    def annotate(self, **fields) -> None:
+        with self._lock:
+            for key, value in fields.items():
+                # token 數可能來自多次呼叫 (map-reduce、重試)，累加
+                if key in ("prompt_tokens", "completion_tokens") and value is not None:
+                    value = (self.fields.get(key) or 0) + value
+                self.fields[key] = value
+
+    def add_step(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.steps[name] = self.steps.get(name, 0.0) + seconds
+
+    def to_row(self) -> dict:
+        with self._lock:
+            row = {column: self.fields.get(column) for column in COLUMNS}
+            row["video_id"] = self.video_id
+            row["steps"] = json.dumps({k: round(v, 3) for k, v in self.steps.items()})
+        return row
+
+
+def begin(video_info: dict, **fields) -> Trace:
+    """取得 (或建立) 影片的 trace；RSS 發現時建立，backfill / 批次新增則在進入管線時建立"""
+    video_id = video_info['id']
+    with _active_lock:
+        trace = _active.get(video_id)
+        if trace is None:
+            trace = Trace(video_id, title=video_info.get('title'), channel=video_info.get('channel_title'))
+            _active[video_id] = trace
+            while len(_active) > MAX_ACTIVE:
+                _active.popitem(last=False)
+    trace.annotate(**{k: v for k, v in fields.items() if v is not None})
+    return trace
+
+
+def current() -> Trace | None:
+    return _current.get()
+
+
+def annotate(**fields) -> None:
+    """寫入目前的 trace；不在管線中 (例如 API 直接呼叫) 時不做任何事"""
+    trace = _current.get()
+    if trace is not None:
+        trace.annotate(**fields)
+
+
+@contextmanager
+def activate(trace: Trace | None):
+    token = _current.set(trace)
+    # 工作執行緒中的 log 自動帶上 video_id / channel
+    fields = {"video_id": trace.video_id, "channel": trace.fields.get("channel")} if trace else {}
+    try:
+        with log.bind(**fields):
+            yield trace
+    finally:
+        _current.reset(token)
+
+
+class stage:
+    """
+    管線階段計時 (resolve / rss / classify / transcript / llm / write / db) 的唯一入口：
+    同時記錄到 metrics 的 pipeline_stage_seconds 與目前的 trace (沒有 trace 時只記錄 metrics)。
+    離開後 .seconds 為耗時，可在 trace 尚未建立時自行寫入。
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start
+        metrics.observe("pipeline_stage_seconds", self.seconds, stage=self.name,
+                        outcome="error" if exc_type else "ok")
+        trace = _current.get()
+        if trace is not None:
+            trace.add_step(self.name, self.seconds)
+        return False
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(TRACE_DB, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        if TRACE_DB not in _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            _initialized.add(TRACE_DB)
+        yield conn
+    finally:
+        conn.close()
+
+
+def finish(trace: Trace, outcome: str, error: str | None = None) -> None:
+    """寫入完成的 trace 並從進行中清單移除；寫入失敗只印警告，不影響擷取"""
+    trace.annotate(outcome=outcome, error=error, finished_at=time.time())
+    with _active_lock:
+        if _active.get(trace.video_id) is trace:
+            del _active[trace.video_id]
+    row = trace.to_row()
+    try:
+        with _connect() as conn:
+            conn.execute(
+                f"INSERT INTO traces ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})",
+                tuple(row.values()),
+            )
+            conn.execute("DELETE FROM traces WHERE finished_at < ?", (time.time() - TRACE_RETENTION_DAYS * 86400,))
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ 寫入 pipeline trace 失敗 ({trace.video_id}): {e}")
+
+
+def _decode(row: sqlite3.Row) -> dict:
+    trace = dict(row)
+    trace["steps"] = json.loads(trace["steps"] or "{}")
+    return trace
+
+
+def get_traces(video_id: str) -> list[dict]:
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM traces WHERE video_id = ? ORDER BY finished_at", (video_id,)).fetchall()
+    return [_decode(row) for row in rows]
+
+
+def _percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def _group_key(trace: dict, group_by: str) -> str:
+    if group_by == "channel":
+        return trace["channel"] or "unknown"
+    if group_by == "source":
+        return trace["source"] or "unknown"
+    if group_by == "outcome":
+        return trace["outcome"] or "unknown"
+    fmt = "%Y-%m-%d %H:00" if group_by == "hour" else "%Y-%m-%d"
+    return time.strftime(fmt, time.localtime(trace["finished_at"]))
+
+
+GROUP_BY = ("channel", "source", "outcome", "hour", "day")
+
+
+def stats(hours: float = 24, group_by: str = "channel") -> dict:
+    """
+    彙整時間區間內的 trace：每組的影片數、結果分布、token 總數、各步驟耗時 (總和 / 平均 / p95，秒)。
+    """
+    if group_by not in GROUP_BY:
+        raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+    since = time.time() - hours * 3600
+    with _connect() as conn:
+        rows = conn.execute("SELECT * FROM traces WHERE finished_at >= ? ORDER BY finished_at", (since,)).fetchall()
+
+    groups = {}
+    for trace in map(_decode, rows):
+        group = groups.setdefault(_group_key(trace, group_by), {
+            "videos": 0, "outcomes": {}, "transcript_sources": {},
+            "prompt_tokens": 0, "completion_tokens": 0, "_steps": {},
+        })
+        group["videos"] += 1
+        group["outcomes"][trace["outcome"]] = group["outcomes"].get(trace["outcome"], 0) + 1
+        if trace["transcript_source"]:
+            source = trace["transcript_source"]
+            group["transcript_sources"][source] = group["transcript_sources"].get(source, 0) + 1
+        group["prompt_tokens"] += trace["prompt_tokens"] or 0
+        group["completion_tokens"] += trace["completion_tokens"] or 0
+        for step, seconds in trace["steps"].items():
+            group["_steps"].setdefault(step, []).append(seconds)
+
+    for group in groups.values():
+        group["steps"] = {
+            step: {
+                "count": len(values),
+                "total_s": round(sum(values), 2),
+                "avg_s": round(sum(values) / len(values), 3),
+                "p95_s": round(_percentile(values, 0.95), 3),
+            }
+            for step, values in group.pop("_steps").items()
+        }
+    return {"hours": hours, "group_by": group_by, "total_videos": len(rows), "groups": groups}
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("pipeline_trace")
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarize pipeline traces")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--by", choices=GROUP_BY, default="channel")
+    parser.add_argument("--video", help="列出單一影片的 trace")
+    args = parser.parse_args()
+
+    result = get_traces(args.video) if args.video else stats(args.hours, args.by)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,117 @@
+"""
+Process Lock - 以 flock 檔案鎖保證同一台主機上只有一個程序擁有某項工作
+- 鎖跟著開啟的檔案走，程序結束 (包含 crash、kill -9) 時由作業系統自動釋放，不會留下過期的鎖
+- 鎖檔內容為持有者的 PID (釋放時清空)；is_locked() 只讀取 PID 並確認程序存活，
+  不會為了探測而取得鎖 (否則探測的瞬間會讓真正要取得鎖的程序失敗)
+- locked() 為阻塞式的版本，用於跨程序的「讀-改-寫」共用檔案 (videos.json、embeddings)
+- 非 POSIX 平台 (沒有 fcntl) 視為永遠取得成功，行為等同單一程序
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class ProcessLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, timeout: float | None = 0) -> bool:
+        """
+        取得鎖；已被其他程序 (或同程序的另一個 ProcessLock) 持有時依 timeout 等待。
+        :param timeout: 0 = 不等待 (預設)；None = 等到取得為止；其他 = 最多等待的秒數
+        :return: 是否取得
+        """
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                if timeout is None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    deadline = time.monotonic() + timeout
+                    while True:
+                        try:
+                            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            break
+                        except BlockingIOError:
+                            if time.monotonic() >= deadline:
+                                raise
+                            time.sleep(0.02)
+            except OSError:
+                os.close(fd)
+                return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        # 仍持有鎖時清空 PID，is_locked() 才不會把已釋放的鎖當成被持有
+        os.ftruncate(self._fd, 0)
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def is_locked(self) -> bool:
+        """
+        是否有存活的持有者 (含自己)。只讀取鎖檔，不取得鎖、不寫入。
+        持有者 crash 留下的 PID 因程序已不存在而視為未持有。
+        """
+        if self._fd is not None:
+            return True
+        pid = self.owner_pid()
+        if pid is None:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True  # 程序存在，只是屬於其他使用者
+        except OSError:
+            return False
+        return True
+
+    def owner_pid(self) -> int | None:
+        try:
+            with open(self.path, 'r') as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@contextmanager
+def locked(path: str, timeout: float | None = 30):
+    """
+    阻塞式的跨程序鎖。每次呼叫使用新的 ProcessLock，可在多執行緒中同時使用
+    (flock 以開啟的檔案為單位，同一程序的不同執行緒也會互斥)；不可重入。
+    :raises TimeoutError: timeout 秒內未取得
+    """
+    lock = ProcessLock(path)
+    if not lock.acquire(timeout=timeout):
+        raise TimeoutError(f"Timed out waiting for lock {path} (held by PID {lock.owner_pid()})")
+    try:
+        yield
+    finally:
+        lock.release()
@@ -0,0 +1,305 @@
+"""
+Profiler - 線上按需 profiling (不需重啟服務)
+- 預設關閉；以 POST /api/admin/profiling 或對程序送 SIGUSR1 開關
+- 開關狀態寫在 PROFILE_STATE_FILE，API 與 sweep worker 共用 (對任一程序送訊號即全部生效)，
+  開啟後 PROFILE_DEFAULT_DURATION 秒自動關閉，避免忘記關掉
+- 只 profile 指定的目標 (TARGETS)：/api/videos、/api/chat 與 check_updates；
+  /api/chat 的 handler 會立即回傳 StreamingResponse，profile 的是產生回應本體的 generator (LLM 串流的完整期間)
+- 有安裝 pyinstrument 時輸出取樣式 speedscope JSON (https://www.speedscope.app 直接開)；
+  否則用 cProfile 輸出 .prof (flameprof / snakeviz / speedscope 皆可讀)
+- 輸出目錄 PROFILE_DIR 最多保留 PROFILE_MAX_FILES 個檔案，超過時刪除最舊的
+"""
+
+import os
+import json
+import time
+import signal
+import inspect
+import functools
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_DEFAULT_DURATION = int(os.getenv("PROFILE_DEFAULT_DURATION", "600"))
+PROFILE_STATE_FILE = "profiling.json"
+# 讀取共用狀態檔的間隔 (秒)；profiled 函數每次呼叫只做一次時間比較
+STATE_REFRESH = 1.0
+
+TARGETS = ("/api/videos", "/api/chat", "check_updates")
+
+# cProfile (3.12+ 以 sys.monitoring 實作) 同一程序同時只能有一個 profiler，
+# 同時進來的其他請求直接略過，不排隊等待
+_capture_lock = threading.Lock()
+_state_lock = threading.Lock()
+_state = {"enabled": False, "targets": [], "until": None}
+_state_checked = 0.0
+_state_mtime = None
+
+
+def _backend() -> str:
+    try:
+        import pyinstrument  # noqa: F401
+        return "pyinstrument"
+    except ImportError:
+        return "cprofile"
+
+
+def _load_state() -> dict:
+    global _state, _state_checked, _state_mtime
+    now = time.monotonic()
+    if now - _state_checked < STATE_REFRESH:
+        return _state
+    with _state_lock:
+        _state_checked = now
+        try:
+            mtime = os.stat(PROFILE_STATE_FILE).st_mtime
+        except OSError:
+            _state, _state_mtime = {"enabled": False, "targets": [], "until": None}, None
+            return _state
+        if mtime != _state_mtime:
+            try:
+                with open(PROFILE_STATE_FILE, 'r', encoding='utf-8') as f:
+                    _state = json.load(f)
+                _state_mtime = mtime
+            except (OSError, json.JSONDecodeError):
+                pass
+    return _state
+
+
+def _save_state(state: dict) -> None:
+    global _state_checked
+    tmp_path = f"{PROFILE_STATE_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, PROFILE_STATE_FILE)
+    _state_checked = 0.0  # 下次呼叫立即重新讀取
+
+
+def is_active(target: str) -> bool:
+    state = _load_state()
+    if not state.get("enabled") or target not in state.get("targets", ()):
+        return False
+    return state.get("until") is None or time.time() < state["until"]
+
+
+def enable(targets: list[str] | None = None, duration: float | None = PROFILE_DEFAULT_DURATION) -> dict:
+    """
+    開啟 profiling。
+    :param targets: 要 profile 的目標 (預設全部)
+    :param duration: 幾秒後自動關閉；None 表示直到手動關閉
+    """
+    targets = list(targets or TARGETS)
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        raise ValueError(f"unknown profiling targets: {', '.join(unknown)} (available: {', '.join(TARGETS)})")
+    _save_state({
+        "enabled": True,
+        "targets": targets,
+        "until": time.time() + duration if duration else None,
+        "enabled_at": time.time(),
+    })
+    logger.info(f"🔬 Profiling 已開啟: {', '.join(targets)}" + (f" ({int(duration)} 秒)" if duration else ""))
+    return status()
+
+
+def disable() -> dict:
+    _save_state({"enabled": False, "targets": [], "until": None})
+    logger.info("🔬 Profiling 已關閉")
+    return status()
+
+
+def status() -> dict:
+    state = _load_state()
+    active = bool(state.get("enabled")) and (state.get("until") is None or time.time() < state["until"])
+    return {
+        "enabled": active,
+        "targets": state.get("targets", []) if active else [],
+        "until": datetime.fromtimestamp(state["until"]).isoformat() if active and state.get("until") else None,
+        "backend": _backend(),
+        "available_targets": list(TARGETS),
+        "profile_dir": PROFILE_DIR,
+    }
+
+
+def _handle_sigusr1(signum, frame):
+    try:
+        if status()["enabled"]:
+            disable()
+        else:
+            enable()
+    except OSError as e:
+        logger.warning(f"⚠️ 無法切換 profiling: {e}")
+
+
+def install_signal_handler() -> None:
+    """SIGUSR1 切換 profiling (只能在主執行緒呼叫；Windows 沒有 SIGUSR1)"""
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _handle_sigusr1)
+
+
+def _prune() -> None:
+    files = list_profiles()
+    for profile in files[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, profile["name"]))
+        except OSError:
+            pass
+
+
+def _output_path(target: str, extension: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = target.strip("/").replace("/", "_") or "root"
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(PROFILE_DIR, f"{slug}-{stamp}-{os.getpid()}{extension}")
+
+
+def _write_pyinstrument(profiler, target: str) -> str:
+    from pyinstrument.renderers import SpeedscopeRenderer
+    path = _output_path(target, ".speedscope.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(profiler.output(renderer=SpeedscopeRenderer()))
+    return path
+
+
+@contextmanager
+def capture(target: str):
+    """
+    在目標開啟 profiling 時記錄區塊並寫檔；未開啟或已有其他 profile 進行中時不做任何事。
+    寫檔失敗只印警告，不影響被 profile 的工作。
+    """
+    if not is_active(target) or not _capture_lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        if _backend() == "pyinstrument":
+            from pyinstrument import Profiler
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                try:
+                    path = _write_pyinstrument(profiler, target)
+                    logger.info(f"🔬 已寫入 profile: {path}")
+                except Exception as e:
+                    logger.warning(f"⚠️ 寫入 profile 失敗 ({target}): {e}")
+        else:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # 其他工具 (例如外部 debugger) 已佔用 profiler
+                logger.warning(f"⚠️ 無法啟動 cProfile ({target}): {e}")
+                yield
+                return
+            try:
+                yield
+            finally:
+                profiler.disable()
+                try:
+                    path = _output_path(target, ".prof")
+                    profiler.dump_stats(path)
+                    logger.info(f"🔬 已寫入 profile: {path}")
+                except OSError as e:
+                    logger.warning(f"⚠️ 寫入 profile 失敗 ({target}): {e}")
+        _prune()
+    finally:
+        _capture_lock.release()
+
+
+def profiled(target: str):
+    """
+    裝飾器版本的 capture()，同步與 async 函數皆可。
+    generator / async generator 函數 (串流回應的本體) 會 profile 整個迭代過程，而不只是建立 generator。
+    """
+    def decorator(func):
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                with capture(target):
+                    async for item in func(*args, **kwargs):
+                        yield item
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                with capture(target):
+                    yield from func(*args, **kwargs)
+            return gen_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with capture(target):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with capture(target):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def list_profiles() -> list[dict]:
+    """輸出目錄中的 profile，新的在前"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, name)
+        if not (name.endswith(".prof") or name.endswith(".speedscope.json")) or not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        profiles.append({
+            "name": name,
+            "size": stat.st_size,
+            "created_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "_mtime": stat.st_mtime,
+        })
+    profiles.sort(key=lambda p: p["_mtime"], reverse=True)
+    for profile in profiles:
+        del profile["_mtime"]
+    return profiles
+
+
+def profile_path(name: str) -> str | None:
+    """檔名對應的完整路徑；不在輸出目錄內 (路徑穿越) 或不存在時回傳 None"""
+    if os.path.basename(name) != name:
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("profiler")
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Toggle on-demand profiling for the API and sweep worker")
+    parser.add_argument("action", choices=("on", "off", "status", "list"))
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, help="預設全部目標")
+    parser.add_argument("--duration", type=float, default=PROFILE_DEFAULT_DURATION, help="幾秒後自動關閉 (0 = 不自動關閉)")
+    args = parser.parse_args()
+
+    if args.action == "on":
+        result = enable(args.targets, args.duration or None)
+    elif args.action == "off":
+        result = disable()
+    elif args.action == "list":
+        result = list_profiles()
+    else:
+        result = status()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
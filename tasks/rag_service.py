@@ -1,13 +1,13 @@
 import os
 import json
 import time
-import logging
 from dotenv import load_dotenv
 import google.generativeai as genai
+from tasks.transcript_normalizer import load_normalized_segments, format_timestamp
+from tasks.log import get_logger
+from tasks import llm_usage
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 # Load Env
 load_dotenv()
@@ -63,21 +63,11 @@ def get_or_create_store(video_id, transcript_path):
     txt_path = transcript_path.replace(".json", ".txt")
     
     try:
-        with open(transcript_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            
-        # Format: [00:00.000] Text content...
-        text_content = ""
-        # Handle different transcript formats (list of dicts typically)
-        if isinstance(data, list):
-            for item in data:
-                start = item.get('start', 0)
-                text = item.get('text', '')
-                # Simple formatting
-                text_content += f"[{start}] {text}\n"
-        else:
-            # Fallback if it's not a list (maybe already text or other format?)
-            text_content = str(data)
+        # Format: [mm:ss] 句子層級段落 (正規化後，比逐條字幕省 token)
+        segments = load_normalized_segments(transcript_path)
+        if segments is None:
+            raise FileNotFoundError(transcript_path)
+        text_content = "".join(f"[{format_timestamp(seg['start'])}] {seg['text']}\n" for seg in segments)
             
         with open(txt_path, "w", encoding="utf-8") as f:
             f.write(text_content)
@@ -136,7 +126,7 @@ def is_file_indexed(video_id):
         return True
     return False
 
-def chat_with_store_stream(file_obj_or_name, messages, model_name="gemini-2.0-flash"):
+def chat_with_store_stream(file_obj_or_name, messages, model_name="gemini-2.0-flash", video_id=None):
     """
     Streams chat response using Gemini Long Context (passing file directly).
     """
@@ -167,6 +157,7 @@ def chat_with_store_stream(file_obj_or_name, messages, model_name="gemini-2.0-fl
     # We can also construct a ChatSession if we want history, 
     # but for now, [Prompt, File] is robust for Q&A.
     
+    start = time.time()
     response = model.generate_content(
         [last_user_message, file_obj],
         stream=True
@@ -175,3 +166,13 @@ def chat_with_store_stream(file_obj_or_name, messages, model_name="gemini-2.0-fl
     for chunk in response:
         if chunk.text:
             yield chunk.text
+
+    # Token accounting: usage_metadata is complete once the stream is exhausted
+    usage = getattr(response, "usage_metadata", None)
+    llm_usage.record(
+        "chat", "gemini", model_name,
+        prompt_tokens=getattr(usage, "prompt_token_count", None),
+        completion_tokens=getattr(usage, "candidates_token_count", None),
+        cached_tokens=getattr(usage, "cached_content_token_count", None),
+        latency=time.time() - start, stream=True, video_id=video_id,
+    )
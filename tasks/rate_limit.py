@@ -0,0 +1,40 @@
+"""
+Rate Limit - 跨執行緒共用的請求節流器
+取代原本「每部影片處理完睡 30~60 秒」的做法：每個請求預約下一個可用時段，
+等待期間其他階段 (例如 LLM 摘要) 可以繼續工作。
+"""
+
+import os
+import time
+import random
+import threading
+
+
+class RateLimiter:
+    def __init__(self, min_interval: float, jitter: float = 0.0):
+        """
+        :param min_interval: 兩次請求之間的最短間隔 (秒)
+        :param jitter: 額外加上的隨機間隔上限 (秒)，避免固定節奏被偵測
+        """
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> float:
+        """阻塞直到輪到自己，回傳實際等待秒數"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval + random.uniform(0, self.jitter)
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+# YouTube 共用節流 (逐字稿 / yt-dlp 等重請求)
+youtube_limiter = RateLimiter(
+    float(os.getenv("YOUTUBE_MIN_INTERVAL", "30")),
+    jitter=float(os.getenv("YOUTUBE_INTERVAL_JITTER", "30")),
+)
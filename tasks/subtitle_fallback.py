@@ -0,0 +1,165 @@
+"""
+Subtitle Fallback - 使用 yt-dlp 取得字幕 (不落地暫存檔)
+單一 YoutubeDL 取得 info 後，直接把選定字幕的 URL 讀進記憶體並串流解析 VTT。
+每次擷取都在獨立子行程中執行，並以 semaphore 限制同時數量、以硬性逾時終止卡住的 yt-dlp。
+"""
+
+import os
+import re
+import sys
+import io
+import json
+import html
+import threading
+import subprocess
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+LANG_PRIORITY = ['zh-TW', 'zh-Hant', 'zh', 'zh-Hans', 'en']
+MAX_WORKERS = int(os.getenv("YTDLP_MAX_WORKERS", "2"))
+TIMEOUT_SECONDS = float(os.getenv("YTDLP_TIMEOUT", "90"))
+
+_slots = threading.BoundedSemaphore(MAX_WORKERS)
+
+_TIMING_RE = re.compile(r'^(\d{1,2}:)?\d{2}:\d{2}\.\d{3}\s+-->\s+(\d{1,2}:)?\d{2}:\d{2}\.\d{3}')
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _parse_timestamp(value: str) -> float:
+    parts = value.split(':')
+    seconds = float(parts[-1])
+    if len(parts) >= 2:
+        seconds += int(parts[-2]) * 60
+    if len(parts) == 3:
+        seconds += int(parts[0]) * 3600
+    return seconds
+
+
+def parse_vtt_stream(lines) -> list[dict]:
+    """
+    串流解析 WebVTT。
+    YouTube 自動字幕是「滾動式」：每個 cue 會重複上一個 cue 的行再加上新字，
+    因此只和上一個 cue 的行比對去重；隔了幾個 cue 才重複的短句 ("Yeah.") 會保留。
+    :param lines: 可迭代的文字行 (例如檔案或 HTTP 回應)
+    :return: [{'text', 'start', 'duration'}, ...]
+    """
+    segments = []
+    previous_cue, current_cue = set(), set()  # 上一個 / 目前 cue 的文字行，用於滾動字幕去重
+    start = end = None
+    in_cue = False
+
+    for raw in lines:
+        if not raw.strip('\r\n'):
+            in_cue = False
+            continue
+        line = raw.strip()
+        if not line:
+            # 自動字幕的 cue 內常有只含空白的行，不代表 cue 結束
+            continue
+        match = _TIMING_RE.match(line)
+        if match:
+            begin, _, finish = line.partition('-->')
+            start = _parse_timestamp(begin.strip())
+            end = _parse_timestamp(finish.strip().split()[0])
+            previous_cue, current_cue = current_cue, set()
+            in_cue = True
+            continue
+        if not in_cue:
+            # WEBVTT 標頭、Kind/Language 中繼資料、NOTE 區塊或 cue 編號
+            continue
+
+        text = html.unescape(_TAG_RE.sub('', line)).strip()
+        if not text:
+            continue
+        current_cue.add(text)
+        if text in previous_cue:
+            continue
+        segments.append({
+            'text': text,
+            'start': start,
+            'duration': round(max(0.0, end - start), 3),
+        })
+
+    return segments
+
+
+def _select_track(info: dict):
+    """依語言優先順序挑選字幕 (人工字幕優先於自動字幕)，略過 live_chat"""
+    for source in ('subtitles', 'automatic_captions'):
+        tracks = {
+            lang: formats for lang, formats in (info.get(source) or {}).items()
+            if lang != 'live_chat' and formats
+        }
+        if not tracks:
+            continue
+        selected_lang = next((lang for lang in LANG_PRIORITY if lang in tracks), None)
+        if not selected_lang:
+            selected_lang = next(iter(tracks))
+        vtt = [f for f in tracks[selected_lang] if f.get('ext') == 'vtt' and f.get('url')]
+        if vtt:
+            return selected_lang, vtt[0]['url']
+    return None, None
+
+
+def extract_subtitle_segments(video_id: str) -> list[dict] | None:
+    """
+    在目前行程中執行 yt-dlp 擷取 (由子行程呼叫)。
+    :return: 字幕段落；影片沒有任何可用字幕時回傳 None
+    """
+    import yt_dlp
+    from tasks.youtube_endpoints import youtube_url
+
+    url = youtube_url(f"/watch?v={video_id}")
+    ydl_opts = {
+        'skip_download': True,
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        selected_lang, sub_url = _select_track(info)
+        if not selected_lang:
+            return None
+        # 重用同一個 extractor 的連線設定 (cookies / proxy) 讀取字幕
+        with ydl.urlopen(sub_url) as response:
+            stream = io.TextIOWrapper(response, encoding='utf-8', errors='replace')
+            segments = parse_vtt_stream(stream)
+    return segments or None
+
+
+def fetch_subtitle_segments(video_id: str, timeout: float = TIMEOUT_SECONDS) -> list[dict] | None:
+    """
+    在受限的子行程池中擷取字幕。
+    :return: 字幕段落，或 None (沒有字幕)
+    :raises TimeoutError: yt-dlp 超過硬性逾時，子行程已被終止
+    :raises RuntimeError: yt-dlp 擷取失敗
+    """
+    with _slots:
+        try:
+            proc = subprocess.run(
+                [sys.executable, "-m", "tasks.subtitle_fallback", video_id],
+                cwd=PROJECT_ROOT,
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                timeout=timeout,
+            )
+        except subprocess.TimeoutExpired:
+            raise TimeoutError(f"yt-dlp timed out after {timeout:.0f}s ({video_id})")
+
+    if proc.returncode != 0:
+        detail = (proc.stderr or "").strip().splitlines()
+        raise RuntimeError(detail[-1] if detail else f"yt-dlp exited with {proc.returncode}")
+
+    output = proc.stdout.strip().splitlines()
+    return json.loads(output[-1]) if output else None
+
+
+# 子行程進入點: 輸出 JSON 到 stdout 最後一行
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m tasks.subtitle_fallback <video_id>", file=sys.stderr)
+        sys.exit(2)
+    result = extract_subtitle_segments(sys.argv[1])
+    sys.stdout.write("\n" + json.dumps(result, ensure_ascii=False) + "\n")
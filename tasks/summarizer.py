@@ -1,8 +1,17 @@
 import os
 import json
-from openai import OpenAI
-from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import TranscriptsDisabled, NoTranscriptFound, VideoUnavailable
 from dotenv import load_dotenv
+from tasks.circuit_breaker import get_breaker, CircuitOpenError, get_negative_verdict, record_negative_verdict
+from tasks.subtitle_fallback import fetch_subtitle_segments
+from tasks.context_packer import fit_prompt
+from tasks.llm_gateway import chat_completion_stream, is_configured
+from tasks.transcript_normalizer import normalize_segments, segments_to_text, save_normalized, load_normalized_segments
+from tasks import pipeline_trace
+from tasks.youtube_endpoints import transcript_api
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
 
 # 載入環境變數
 load_dotenv()
@@ -34,176 +43,205 @@ PROMPT_TEMPLATE = """
 {transcript}
 """
 
+SUMMARY_SYSTEM_PROMPT = "You are a professional analyzer that provides ONLY the Markdown output. No conversational filler."
+# 摘要輸入的 token 上限 (未設定時只受模型 context window 限制)
+SUMMARY_MAX_INPUT_TOKENS = int(os.getenv("SUMMARY_MAX_INPUT_TOKENS", "0")) or None
+SUMMARY_TEMPERATURE = 0.7
+# 逐字稿快取目錄 (預設為專案根目錄下的 transcripts/)
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR") or os.path.join(os.path.dirname(__file__), "..", "transcripts")
+
+
+def get_transcript_path(video_id):
+    """逐字稿快取路徑 (TRANSCRIPT_DIR/{video_id}.json)"""
+    os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
+    return os.path.join(TRANSCRIPT_DIR, f"{video_id}.json")
+
 
 def get_transcript_text(video_id, save_to_file=False):
     """
-    獲取逐字稿文字。
+    獲取逐字稿文字 (經過正規化：合併字幕、移除非語音標記與重複)。
     :param video_id: YouTube Video ID
-    :param save_to_file: 是否儲存為 JSON 檔案 (transcripts/{video_id}.json)
+    :param save_to_file: 是否儲存為 JSON 檔案 (原始: transcripts/{video_id}.json，正規化: transcripts/{video_id}.norm.json)
     :return: 逐字稿純文字 string or None
     """
     # 1. Check if local file exists
-    transcript_dir = os.path.join(os.path.dirname(__file__), "..", "transcripts")
-    os.makedirs(transcript_dir, exist_ok=True)
-    file_path = os.path.join(transcript_dir, f"{video_id}.json")
+    file_path = get_transcript_path(video_id)
 
     if os.path.exists(file_path):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    return " ".join([item.get('text', '') for item in data])
-                elif isinstance(data, dict) and 'text' in data:
-                    return data['text']
+            segments = load_normalized_segments(file_path)
+            if segments is not None:
+                pipeline_trace.annotate(transcript_source="cache")
+                return segments_to_text(segments)
         except Exception as e:
-            print(f"⚠️ 讀取本地逐字稿失敗 ({video_id}): {e}")
+            logger.warning(f"⚠️ 讀取本地逐字稿失敗 ({video_id}): {e}")
 
-    try:
-        yt_api = YouTubeTranscriptApi()
-        transcript_obj = yt_api.fetch(video_id, languages=['zh-TW', 'zh', 'en'])
-        
-        if transcript_obj:
-            if save_to_file:
-                try:
-                    serializable = []
-                    for item in transcript_obj:
-                        serializable.append({
-                            'text': item.text if hasattr(item, 'text') else item.get('text'),
-                            'start': item.start if hasattr(item, 'start') else item.get('start'),
-                            'duration': item.duration if hasattr(item, 'duration') else item.get('duration')
-                        })
-                    
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        json.dump(serializable, f, ensure_ascii=False, indent=2)
-                        print(f"✅ 逐字稿已緩存至: {file_path}")
-                except Exception as e:
-                    print(f"⚠️ 緩存逐字稿失敗: {e}")
-
-            full_text = " ".join([snippet.text for snippet in transcript_obj])
-            return full_text
+    verdict = get_negative_verdict(video_id)
+    if verdict:
+        logger.info(f"⏭️ 跳過逐字稿獲取 ({video_id})，先前結論: {verdict['reason']}")
         return None
-    except Exception as e:
-        print(f"❌ 傳統 API 獲取逐字稿失敗 ({video_id}): {e}")
-        print("🔄 嘗試使用 yt-dlp 備援機制...")
-        
+
+    api_breaker = get_breaker("transcript_api")
+    api_error = None
+    if not api_breaker.allow_request():
+        api_error = CircuitOpenError("transcript_api circuit is open")
+        logger.warning(f"🚫 傳統 API 斷路器開啟中，略過 ({video_id})")
+    else:
         try:
-            import yt_dlp
+            yt_api = transcript_api()
+            transcript_obj = yt_api.fetch(video_id, languages=['zh-TW', 'zh', 'en'])
+            api_breaker.record_success()
             
-            url = f"https://www.youtube.com/watch?v={video_id}"
-            ydl_opts = {
-                'skip_download': True,
-                'writeautomaticsub': True,
-                'writesubtitles': True,
-                'subtitleslangs': ['zh-TW', 'zh', 'en'],
-                'quiet': True,
-                'no_warnings': True,
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                subtitles = info.get('subtitles', {}) or info.get('automatic_captions', {})
-                lang_priority = ['zh-TW', 'zh-Hant', 'zh', 'zh-Hans', 'en']
-                selected_lang = None
-                
-                for lang in lang_priority:
-                     if lang in subtitles:
-                         selected_lang = lang
-                         break
-                
-                if not selected_lang and subtitles:
-                    selected_lang = list(subtitles.keys())[0]
-                    
-                if selected_lang:
-                    print(f"✅ 找到字幕語言: {selected_lang}")
-                    try:
-                        temp_filename = f"temp_sub_{video_id}"
-                        ydl_opts_download = {
-                            'skip_download': True,
-                            'writesubtitles': True,
-                            'writeautomaticsub': True,
-                            'subtitleslangs': [selected_lang],
-                            'outtmpl': temp_filename,
-                            'quiet': True,
-                            'no_warnings': True,
-                            'extractor_args': {'youtube': {'player_client': ['android']}},
-                        }
-                        
-                        with yt_dlp.YoutubeDL(ydl_opts_download) as ydl_down:
-                            ydl_down.download([url])
-                        
-                        expected_file = f"{temp_filename}.{selected_lang}.vtt"
-                        if not os.path.exists(expected_file):
-                             for f in os.listdir('.'):
-                                 if f.startswith(temp_filename) and f.endswith('.vtt'):
-                                     expected_file = f
-                                     break
-                        
-                        if os.path.exists(expected_file):
-                            with open(expected_file, 'r', encoding='utf-8') as f:
-                                raw_content = f.read()
-                            os.remove(expected_file)
-                            lines = raw_content.splitlines()
-                            text_lines = []
-                            for line in lines:
-                                if '-->' in line or line.strip() == 'WEBVTT' or not line.strip():
-                                    continue
-                                text_lines.append(line.strip())
-                            unique_lines = []
-                            last = ""
-                            for line in text_lines:
-                                if line != last:
-                                    unique_lines.append(line)
-                                    last = line
-                                    
-                            return " ".join(unique_lines)
-                    except Exception as dl_err:
-                        print(f"❌ yt-dlp 下載流程失敗: {dl_err}")
-        except Exception as yt_e:
-            print(f"❌ yt-dlp 備援失敗: {yt_e}")
+            if transcript_obj:
+                serializable = []
+                for item in transcript_obj:
+                    serializable.append({
+                        'text': item.text if hasattr(item, 'text') else item.get('text'),
+                        'start': item.start if hasattr(item, 'start') else item.get('start'),
+                        'duration': item.duration if hasattr(item, 'duration') else item.get('duration')
+                    })
+                pipeline_trace.annotate(transcript_source="api")
+                return _finish_transcript(file_path, serializable, save_to_file)
+            return None
+        except TranscriptsDisabled:
+            # 影片本身關閉字幕：這是影片的結論，不是端點故障
+            api_breaker.record_success()
+            record_negative_verdict(video_id, "TranscriptsDisabled")
             return None
+        except (NoTranscriptFound, VideoUnavailable) as e:
+            # 端點正常回應，只是沒有指定語言的字幕 / 影片不可用
+            api_breaker.record_success()
+            api_error = e
+            logger.error(f"❌ 傳統 API 獲取逐字稿失敗 ({video_id}): {e}")
+        except Exception as e:
+            api_breaker.record_failure(e)
+            api_error = e
+            logger.error(f"❌ 傳統 API 獲取逐字稿失敗 ({video_id}): {e}")
+
+    # 2. 備援: yt-dlp
+    logger.info("🔄 嘗試使用 yt-dlp 備援機制...")
+
+    try:
+        segments = get_breaker("ytdlp").call(fetch_subtitle_segments, video_id)
+    except CircuitOpenError:
+        logger.warning(f"🚫 yt-dlp 斷路器開啟中，略過 ({video_id})")
+        return None
+    except Exception as yt_e:
+        logger.error(f"❌ yt-dlp 備援失敗: {yt_e}")
+        return None
+
+    if not segments:
+        if isinstance(api_error, (NoTranscriptFound, VideoUnavailable)):
+            # 兩種來源都確認沒有可用字幕
+            record_negative_verdict(video_id, type(api_error).__name__)
+        return None
+
+    logger.info(f"✅ yt-dlp 取得字幕 ({video_id}): {len(segments)} 段")
+    pipeline_trace.annotate(transcript_source="yt-dlp")
+    return _finish_transcript(file_path, segments, save_to_file)
 
-def summarize_video(video_id, video_title=""):
-    print(f"🤖 正在為影片產生摘要: {video_id} - {video_title}...")
-    api_key = os.getenv("LLM_API_KEY")
-    base_url = os.getenv("LLM_BASE_URL")
+
+def _finish_transcript(file_path, raw_segments, save_to_file):
+    """正規化原始字幕；需要時同時快取原始與正規化版本，回傳正規化文字"""
+    normalized = normalize_segments(raw_segments)
+    if save_to_file:
+        try:
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump(raw_segments, f, ensure_ascii=False, indent=2)
+            save_normalized(file_path, normalized)
+            logger.info(f"✅ 逐字稿已緩存至: {file_path}")
+        except Exception as e:
+            logger.warning(f"⚠️ 緩存逐字稿失敗: {e}")
+    return segments_to_text(normalized)
+
+
+def build_summary_messages(transcript_text, model_name=None):
+    """摘要請求的 messages (同步與 Batch 模式共用)"""
+    model_name = model_name or os.getenv("LLM_MODEL", "gpt-4o")
+    # 以 token 預算打包逐字稿 (取代字元截斷)
+    user_prompt = fit_prompt(
+        PROMPT_TEMPLATE, "{transcript}", transcript_text,
+        model=model_name, system_prompt=SUMMARY_SYSTEM_PROMPT, max_input_tokens=SUMMARY_MAX_INPUT_TOKENS
+    )
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def summarize_video(video_id, video_title="", transcript_text=None):
+    """
+    產生影片摘要。
+    :param transcript_text: 已預取的逐字稿；None 時自行抓取
+    """
+    logger.info(f"🤖 正在為影片產生摘要: {video_id} - {video_title}...")
     model_name = os.getenv("LLM_MODEL", "gpt-4o")
     
-    if not api_key or not base_url:
-        print("⚠️ 未設定 LLM_API_KEY 或 LLM_BASE_URL，跳過摘要生成。")
+    if not is_configured():
+        logger.warning("⚠️ 未設定 LLM_API_KEY 或 LLM_BASE_URL，跳過摘要生成。")
         return None
 
-    transcript_text = get_transcript_text(video_id, save_to_file=True)
+    if transcript_text is None:
+        transcript_text = get_transcript_text(video_id, save_to_file=True)
     if not transcript_text:
         return None
     
-    if len(transcript_text) > 100000:
-        print("⚠️ 逐字稿過長，進行截斷...")
-        transcript_text = transcript_text[:100000]
-
+    partial_path = get_partial_summary_path(video_id)
+    parts = []
     try:
-        client = OpenAI(api_key=api_key, base_url=base_url)
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": "You are a professional analyzer that provides ONLY the Markdown output. No conversational filler."},
-                {"role": "user", "content": PROMPT_TEMPLATE.format(transcript=transcript_text)}
-            ],
-            temperature=0.7
+        stream = chat_completion_stream(
+            build_summary_messages(transcript_text, model_name), temperature=SUMMARY_TEMPERATURE,
+            feature="summary", video_id=video_id,
         )
-        summary = response.choices[0].message.content
-        if summary.startswith("```markdown"):
-            summary = summary.replace("```markdown", "", 1)
-        if summary.startswith("```"):
-            summary = summary.replace("```", "", 1)
-        if summary.endswith("```"):
-            summary = summary.rsplit("```", 1)[0]
-        return summary.strip()
+        # 邊生成邊寫入暫存檔，/api/summary/{id}/stream 可即時讀取
+        with open(partial_path, "w", encoding="utf-8") as partial:
+            for delta in stream:
+                parts.append(delta)
+                partial.write(delta)
+                partial.flush()
+        if not parts:
+            os.remove(partial_path)
+            return None
+        return clean_summary("".join(parts))
     except Exception as e:
-        print(f"❌生成摘要時發生錯誤: {e}")
+        logger.error(f"❌生成摘要時發生錯誤: {e}")
+        if parts:
+            # 串流中途失敗：不把不完整的內容存成正式摘要 (否則不會再重試)；.part 留著供檢視，下次生成時覆寫
+            logger.warning(f"⚠️ 摘要生成中斷，保留部分內容於 {partial_path} ({len(''.join(parts))} 字元)")
+        elif os.path.exists(partial_path):
+            os.remove(partial_path)
         return None
 
+def clean_summary(summary):
+    if summary.startswith("```markdown"):
+        summary = summary.replace("```markdown", "", 1)
+    if summary.startswith("```"):
+        summary = summary.replace("```", "", 1)
+    if summary.endswith("```"):
+        summary = summary.rsplit("```", 1)[0]
+    return summary.strip()
+
+def get_summary_path(video_id):
+    return f"summary_{video_id}.md"
+
+def get_partial_summary_path(video_id):
+    """生成中的摘要暫存檔 (串流讀取者會持續讀取；save_summary 寫好正式檔後刪除)"""
+    return f"summary_{video_id}.md.part"
+
 def save_summary(video_id, content):
-    filename = f"summary_{video_id}.md"
-    with open(filename, "w", encoding="utf-8") as f:
+    """
+    先把最終內容寫到獨立的暫存檔再原子替換為正式檔，不改寫串流中的 .part 檔；
+    正式檔就位後才刪除 .part，串流讀取者看到 .part 消失時一定讀得到正式檔。
+    """
+    filename = get_summary_path(video_id)
+    temp_path = f"{filename}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
         f.write(content)
-    print(f"✅ 摘要已儲存至: {filename}")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, filename)
+    try:
+        os.remove(get_partial_summary_path(video_id))
+    except FileNotFoundError:
+        pass
+    logger.info(f"✅ 摘要已儲存至: {filename}")
@@ -0,0 +1,200 @@
+"""
+Sweep Worker - 獨立的擷取程序
+檢查更新、backfill、新頻道解析與重新摘要 (抓 HTML/XML、解析 VTT、呼叫 LLM) 都在這個程序執行，不和 API 搶 GIL。
+API 與排程器只透過 control_channel 送出指令、讀取狀態。
+
+    python -m tasks.sweep_worker
+
+以 sweep_worker.lock 保證同一台主機只有一個 worker；dashboard 啟動時會自動帶起 worker
+(SWEEP_WORKER_AUTOSTART=0 可關閉，改為自行以上面的指令或 process manager 管理)。
+"""
+
+import os
+import sys
+import time
+import signal
+import sqlite3
+import threading
+import subprocess
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tasks import control_channel, metrics, profiler
+from tasks.process_lock import ProcessLock
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+WORKER_LOCK_FILE = "sweep_worker.lock"
+WORKER_LOG_FILE = "sweep_worker.log"
+SWEEP_WORKER_AUTOSTART = os.getenv("SWEEP_WORKER_AUTOSTART", "1") != "0"
+POLL_INTERVAL = 1.0
+HEARTBEAT_INTERVAL = 5.0
+
+UPDATE = "update"
+BACKFILL = "backfill"
+RESOLVE_CHANNEL = "resolve_channel"
+RESUMMARIZE = "resummarize"
+
+
+# === API / 排程器端 ===
+
+def is_worker_running() -> bool:
+    return ProcessLock(WORKER_LOCK_FILE).is_locked()
+
+
+def ensure_worker() -> bool:
+    """
+    worker 沒有在執行時在背景啟動一個 (獨立 session，不隨 API 程序的訊號結束)。
+    多個程序同時呼叫也沒關係：搶不到鎖的 worker 會直接結束。
+    :return: 是否啟動了新的 worker
+    """
+    if not SWEEP_WORKER_AUTOSTART or is_worker_running():
+        return False
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    python_path = os.pathsep.join(filter(None, [project_root, os.environ.get("PYTHONPATH")]))
+    with open(WORKER_LOG_FILE, 'a') as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "tasks.sweep_worker"],
+            cwd=os.getcwd(),
+            # worker 自己會寫 logs/sweep_worker.jsonl (有輪替)，stderr 不再重複輸出 JSON 到沒有輪替的 WORKER_LOG_FILE
+            env={"LOG_CONSOLE": "0", **os.environ, "PYTHONUNBUFFERED": "1", "PYTHONPATH": python_path},
+            stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    logger.info(f"🛠️ 已啟動 sweep worker (PID {process.pid})，log: {WORKER_LOG_FILE}")
+    return True
+
+
+def request_update() -> dict:
+    """送出檢查更新指令 (排程任務也指向這裡)；已有尚未完成的更新指令時沿用該指令"""
+    command, created = control_channel.enqueue(UPDATE)
+    ensure_worker()
+    if created:
+        logger.info(f"📨 已送出檢查更新指令 #{command['id']}")
+    return command
+
+
+def request_backfill(channel_url: str, batch_size: int, limit: int | None = None, relist: bool = False) -> tuple[dict, bool]:
+    command, created = control_channel.enqueue(BACKFILL, {
+        "channel_url": channel_url, "batch_size": batch_size, "limit": limit, "relist": relist,
+    })
+    ensure_worker()
+    return command, created
+
+
+def request_channel_resolve(channel_url: str) -> dict:
+    """新增頻道後在 worker 背景解析 channel_id 並預熱 RSS"""
+    command, _ = control_channel.enqueue(RESOLVE_CHANNEL, {"channel_url": channel_url})
+    ensure_worker()
+    return command
+
+
+def request_resummarize(video: dict) -> dict:
+    """為單部影片重新產生摘要 (例如取消重複判定後)"""
+    command, _ = control_channel.enqueue(RESUMMARIZE, {"id": video['id'], "title": video.get('title', '')})
+    ensure_worker()
+    return command
+
+
+def active_backfill_channels() -> set[str]:
+    return {c["payload"]["channel_url"] for c in control_channel.active_commands(BACKFILL)}
+
+
+# === Worker 端 ===
+
+def _execute(command: dict):
+    payload = command["payload"]
+    if command["kind"] == UPDATE:
+        from tasks.update_runner import run_update
+        return {"count": run_update()}
+    if command["kind"] == BACKFILL:
+        from tasks.backfill import run_backfill
+        return run_backfill(
+            payload["channel_url"], batch_size=payload["batch_size"],
+            limit=payload.get("limit"), relist=payload.get("relist", False),
+        )
+    if command["kind"] == RESOLVE_CHANNEL:
+        from tasks.monitor_task import warm_channel
+        return warm_channel(payload["channel_url"])
+    if command["kind"] == RESUMMARIZE:
+        from tasks.ingest_pipeline import resummarize
+        return {"summarized": bool(resummarize(payload))}
+    raise ValueError(f"未知的指令類型: {command['kind']}")
+
+
+class SweepWorker:
+    def __init__(self):
+        self.lock = ProcessLock(WORKER_LOCK_FILE)
+        self.stop_event = threading.Event()
+        self.current = None
+
+    def _heartbeat_loop(self):
+        # 長時間的 sweep 期間也持續更新心跳，API 才不會誤判 worker 已停止
+        while not self.stop_event.wait(HEARTBEAT_INTERVAL):
+            current = self.current
+            # 寫入忙碌中的 control.sqlite 偶爾會失敗 ("database is locked")；下一輪再試，心跳執行緒不能因此結束
+            try:
+                control_channel.set_worker_status(
+                    os.getpid(), "busy" if current else "idle", current["id"] if current else None
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 無法更新 worker 心跳: {e}")
+            # 讓 API 的 /metrics 與 /api/health_stats 看得到本程序的階段耗時
+            try:
+                metrics.save_snapshot()
+            except OSError as e:
+                logger.warning(f"⚠️ 無法寫入指標 snapshot: {e}")
+
+    def _handle_signal(self, signum, frame):
+        logger.info(f"🛑 收到訊號 {signum}，完成目前的指令後結束")
+        self.stop_event.set()
+
+    def run(self) -> int:
+        if not self.lock.acquire():
+            logger.warning(f"⚠️ 已有 sweep worker 在執行 (PID {self.lock.owner_pid()})")
+            return 1
+
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        profiler.install_signal_handler()
+        requeued = control_channel.requeue_running()
+        if requeued:
+            logger.info(f"♻️ 重新排入 {requeued} 個上次中斷的指令")
+        control_channel.set_worker_status(os.getpid(), "idle", started_at=time.time())
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="sweep-heartbeat", daemon=True)
+        heartbeat.start()
+        logger.info(f"🛠️ Sweep worker 已啟動 (PID {os.getpid()})")
+
+        try:
+            while not self.stop_event.is_set():
+                command = control_channel.claim_next()
+                if command is None:
+                    self.stop_event.wait(POLL_INTERVAL)
+                    continue
+
+                self.current = command
+                control_channel.set_worker_status(os.getpid(), "busy", command["id"])
+                logger.info(f"▶️ 執行指令 #{command['id']} {command['kind']} {command['payload'] or ''}")
+                try:
+                    result = _execute(command)
+                    control_channel.finish(command["id"], result=result)
+                except Exception as e:
+                    logger.error(f"❌ 指令 #{command['id']} 失敗: {e}")
+                    control_channel.finish(command["id"], error=str(e))
+                finally:
+                    self.current = None
+                    control_channel.set_worker_status(os.getpid(), "idle")
+        finally:
+            self.stop_event.set()
+            heartbeat.join(timeout=HEARTBEAT_INTERVAL)
+            control_channel.set_worker_status(os.getpid(), "stopped")
+            self.lock.release()
+            logger.info("👋 Sweep worker 已結束")
+        return 0
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("sweep_worker")
+    sys.exit(SweepWorker().run())
@@ -0,0 +1,172 @@
+"""
+Transcript Normalizer - 把逐條字幕整理成句子層級的段落，減少送進 LLM 的 token
+- 合併滾動式字幕的重疊部分 (只在字幕交界處去重；句中的疊字與重複詞如「謝謝」「研究研究」保持原樣)
+- 移除 [Music]、[音樂] 等非語音標記與常見贅詞
+- 合併成句子層級段落，只保留粗略時間戳
+原始逐字稿 (transcripts/{id}.json) 保持不變，正規化結果另存 transcripts/{id}.norm.json。
+"""
+
+import os
+import re
+import json
+import html
+
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+SEGMENT_MAX_SECONDS = 30
+SEGMENT_MAX_CHARS = 400
+
+# 只移除非語音的標記；[Figure 2]、[1] 這類括號內的內容是講者說的話，保留
+_NON_SPEECH_WORDS = r'music|applause|laughter|laughs|cheering|inaudible|silence|noise|音樂|掌聲|笑聲|歡呼|靜音'
+_NON_SPEECH_RE = re.compile(
+    rf'\[[^\]]{{0,40}}?(?:{_NON_SPEECH_WORDS})[^\]]{{0,40}}?\]|\([^)]*(?:{_NON_SPEECH_WORDS})[^)]*\)|♪[^♪]*♪|[♪♫]',
+    re.IGNORECASE,
+)
+_SPEAKER_RE = re.compile(r'^\s*(?:>>|-)\s*')
+_FILLER_RE = re.compile(r'(?<![\w])(?:um+|uh+|erm+|hmm+|mm+|ah+)(?![\w])[,.]?\s*|(?:嗯+|呃+)[，,]?', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+_SENTENCE_END_RE = re.compile(r'[。！？!?]$|(?<![A-Z])\.$')
+_CJK = '\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef'
+_CJK_CHAR_RE = re.compile(f'[{_CJK}]')
+
+
+def normalized_path(raw_path: str) -> str:
+    """transcripts/{id}.json -> transcripts/{id}.norm.json"""
+    base, _ = os.path.splitext(raw_path)
+    return f"{base}.norm.json"
+
+
+def clean_text(text: str) -> str:
+    """移除非語音標記、說話者標記與贅詞"""
+    text = html.unescape(text or "").replace('\n', ' ')
+    text = _NON_SPEECH_RE.sub(' ', text)
+    text = _SPEAKER_RE.sub('', text)
+    text = _FILLER_RE.sub('', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def split_tokens(text: str) -> list[str]:
+    # 英文以空白切詞，CJK 以單字為單位，方便比對重疊
+    tokens = []
+    for word in text.split(' '):
+        if _CJK_CHAR_RE.search(word):
+            tokens.extend(re.findall(f'[{_CJK}]|[^{_CJK}]+', word))
+        elif word:
+            tokens.append(word)
+    return tokens
+
+
+def _join_tokens(tokens: list[str]) -> str:
+    out = ""
+    for token in tokens:
+        if out and not (_CJK_CHAR_RE.match(token) and _CJK_CHAR_RE.search(out[-1])):
+            out += " "
+        out += token
+    return out
+
+
+def _strip_overlap(previous: list[str], current: list[str], max_overlap: int = 30) -> list[str]:
+    """
+    去掉 current 開頭與 previous 結尾重疊的部分 (滾動字幕)。
+    至少要重疊 2 個英文詞 / 3 個中文字，避免誤刪像 "the" 這種正常的重複。
+    """
+    limit = min(len(previous), len(current), max_overlap)
+    min_overlap = 3 if current and _CJK_CHAR_RE.match(current[0]) else 2
+    for size in range(limit, min_overlap - 1, -1):
+        if [t.lower() for t in previous[-size:]] == [t.lower() for t in current[:size]]:
+            return current[size:]
+    return current
+
+
+def normalize_segments(raw_segments: list[dict]) -> list[dict]:
+    """
+    :param raw_segments: [{'text', 'start', 'duration'}, ...] (原始字幕)
+    :return: [{'start': 秒 (整數), 'text': 句子層級段落}, ...]
+    """
+    segments = []
+    buffer = []
+    buffer_start = None
+    previous_tokens = []
+
+    def flush():
+        nonlocal buffer, buffer_start
+        text = _join_tokens(buffer)
+        if text:
+            segments.append({'start': int(buffer_start or 0), 'text': text})
+        buffer = []
+        buffer_start = None
+
+    for item in raw_segments:
+        tokens = split_tokens(clean_text(item.get('text', '')))
+        tokens = _strip_overlap(previous_tokens, tokens)
+        if not tokens:
+            continue
+        previous_tokens = (previous_tokens + tokens)[-30:]
+
+        start = item.get('start') or 0
+        if buffer_start is None:
+            buffer_start = start
+        buffer.extend(tokens)
+
+        text_so_far = tokens[-1]
+        too_long = start - buffer_start >= SEGMENT_MAX_SECONDS or sum(len(t) + 1 for t in buffer) >= SEGMENT_MAX_CHARS
+        if _SENTENCE_END_RE.search(text_so_far) or too_long:
+            flush()
+
+    if buffer:
+        flush()
+    return segments
+
+
+def segments_to_text(segments: list[dict]) -> str:
+    return _join_tokens([seg['text'] for seg in segments])
+
+
+def format_timestamp(seconds: int) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+def load_raw_segments(raw_path: str) -> list[dict] | None:
+    if not os.path.exists(raw_path):
+        return None
+    with open(raw_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and 'text' in data:
+        return [{'text': data['text'], 'start': 0, 'duration': 0}]
+    return None
+
+
+def save_normalized(raw_path: str, segments: list[dict]) -> None:
+    with open(normalized_path(raw_path), "w", encoding="utf-8") as f:
+        json.dump(segments, f, ensure_ascii=False, indent=1)
+
+
+def load_normalized_segments(raw_path: str) -> list[dict] | None:
+    """
+    讀取正規化逐字稿；快取不存在或比原始檔舊時重新產生並寫入快取。
+    :return: 段落列表，原始逐字稿不存在時回傳 None
+    """
+    norm_path = normalized_path(raw_path)
+    if os.path.exists(norm_path) and os.path.exists(raw_path) and os.path.getmtime(norm_path) >= os.path.getmtime(raw_path):
+        try:
+            with open(norm_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            pass
+
+    raw_segments = load_raw_segments(raw_path)
+    if raw_segments is None:
+        return None
+    segments = normalize_segments(raw_segments)
+    try:
+        save_normalized(raw_path, segments)
+    except OSError as e:
+        logger.warning(f"⚠️ 儲存正規化逐字稿失敗: {e}")
+    return segments
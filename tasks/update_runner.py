@@ -0,0 +1,89 @@
+"""
+Update Runner - 「檢查更新」的執行入口 (由 sweep worker 呼叫，也可直接執行)
+- run_update 以檔案鎖保證同時只有一次 check_updates 在執行 (跨 worker、CLI 與其他程序)
+- 最近一次結果寫在 update_status.json，任何程序都讀得到
+"""
+
+import os
+import sys
+import json
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tasks.process_lock import ProcessLock
+from tasks.log import get_logger
+
+logger = get_logger(__name__)
+
+UPDATE_STATUS_FILE = "update_status.json"
+UPDATE_LOCK_FILE = "update.lock"
+
+
+def _load_status() -> dict:
+    if os.path.exists(UPDATE_STATUS_FILE):
+        try:
+            with open(UPDATE_STATUS_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            pass
+    return {"started_at": None, "last_update_result": None, "last_error": None}
+
+
+def _save_status(status: dict) -> None:
+    tmp_path = f"{UPDATE_STATUS_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, UPDATE_STATUS_FILE)
+
+
+def is_update_running() -> bool:
+    return ProcessLock(UPDATE_LOCK_FILE).is_locked()
+
+
+def get_update_status() -> dict:
+    status = _load_status()
+    return {
+        "is_updating": is_update_running(),
+        "started_at": status.get("started_at"),
+        "last_update_result": status.get("last_update_result"),
+        "last_error": status.get("last_error"),
+    }
+
+
+def run_update() -> int | None:
+    """
+    執行一次 check_updates。已有其他程序在執行時直接略過。
+    :return: 新處理的影片數；略過或失敗時回傳 None
+    """
+    lock = ProcessLock(UPDATE_LOCK_FILE)
+    if not lock.acquire():
+        logger.info(f"⏭️ 更新已在執行中 (PID {lock.owner_pid()})，略過這次觸發")
+        return None
+
+    try:
+        status = _load_status()
+        status["started_at"] = datetime.now().isoformat()
+        _save_status(status)
+
+        from tasks.monitor_task import check_updates
+        try:
+            count = check_updates()
+        except Exception as e:
+            logger.error(f"❌ Update failed: {e}")
+            status["last_error"] = {"error": str(e), "timestamp": datetime.now().isoformat()}
+            _save_status(status)
+            return None
+
+        status["last_update_result"] = {"count": count, "timestamp": datetime.now().isoformat()}
+        status["last_error"] = None
+        _save_status(status)
+        return count
+    finally:
+        lock.release()
+
+
+if __name__ == "__main__":
+    from tasks import log
+    log.setup("update_runner")
+    run_update()
@@ -0,0 +1,45 @@
+"""
+YouTube Endpoints - YouTube 網址的單一出口
+- 頻道頁、RSS、/shorts、/watch 與逐字稿 API 都經過這裡組出網址
+- 設定 YOUTUBE_BASE_URL (例如 benchmarks/youtube_standin.py 的 http://127.0.0.1:8766) 時，
+  所有請求改送到該位址，不會碰到真正的 YouTube；未設定時行為與原本完全相同
+"""
+
+import os
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from youtube_transcript_api import YouTubeTranscriptApi
+
+CANONICAL_BASE_URL = "https://www.youtube.com"
+YOUTUBE_BASE_URL = os.getenv("YOUTUBE_BASE_URL", CANONICAL_BASE_URL).rstrip("/")
+
+
+def youtube_url(path: str) -> str:
+    """/watch?v=... -> {YOUTUBE_BASE_URL}/watch?v=..."""
+    return f"{YOUTUBE_BASE_URL}{path}"
+
+
+def rewrite(url: str) -> str:
+    """把 https://www.youtube.com/... (例如頻道清單中的網址) 改寫到 YOUTUBE_BASE_URL"""
+    if YOUTUBE_BASE_URL != CANONICAL_BASE_URL and url.startswith(CANONICAL_BASE_URL):
+        return YOUTUBE_BASE_URL + url[len(CANONICAL_BASE_URL):]
+    return url
+
+
+class _RewriteAdapter(HTTPAdapter):
+    """youtube-transcript-api 的網址寫死在套件內，在送出前改寫"""
+    def send(self, request, **kwargs):
+        request.url = rewrite(request.url)
+        return super().send(request, **kwargs)
+
+
+def transcript_api() -> YouTubeTranscriptApi:
+    """
+    逐字稿 API 物件 (非執行緒安全，每次使用建立一個)。
+    """
+    if YOUTUBE_BASE_URL == CANONICAL_BASE_URL:
+        return YouTubeTranscriptApi()
+    session = Session()
+    session.mount(CANONICAL_BASE_URL, _RewriteAdapter())
+    return YouTubeTranscriptApi(http_client=session)
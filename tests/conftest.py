@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 與其他進入點相同：把專案根目錄加入 sys.path，以便匯入 tasks 模組
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,93 @@
+import threading
+import time
+
+from tasks.adaptive_concurrency import AIMDLimiter, SUCCESS, OVERLOADED, INTERACTIVE, BATCH
+
+
+def test_additive_increase_when_saturated():
+    limiter = AIMDLimiter("test", initial=2, min_limit=1, max_limit=4, reserved=0)
+    for _ in range(20):
+        held = int(limiter.limit)
+        for _ in range(held):
+            assert limiter.acquire(timeout=0)
+        for _ in range(held):
+            limiter.release(SUCCESS, latency=0.1)
+    assert limiter.limit == 4
+    assert limiter.increases > 0
+
+
+def test_no_increase_while_underused():
+    limiter = AIMDLimiter("test", initial=2, min_limit=1, max_limit=4, reserved=0)
+    for _ in range(20):
+        assert limiter.acquire(timeout=0)
+        limiter.release(SUCCESS, latency=0.1)
+    assert limiter.limit == 2
+
+
+def test_slow_success_does_not_increase():
+    limiter = AIMDLimiter("test", initial=2, min_limit=1, max_limit=4, latency_target=1, reserved=0)
+    limiter.acquire(timeout=0)
+    limiter.release(SUCCESS, latency=5)
+    assert limiter.limit == 2
+
+
+def test_overload_halves_once_per_wave_and_honours_retry_after():
+    limiter = AIMDLimiter("test", initial=8, min_limit=1, max_limit=8, reserved=0)
+    for _ in range(3):
+        limiter.acquire(timeout=0)
+    for _ in range(3):
+        limiter.release(OVERLOADED, retry_after=0.2)
+    assert limiter.limit == 4
+    assert limiter.decreases == 1
+    # Retry-After 期間不放行
+    assert not limiter.acquire(timeout=0.05)
+    assert limiter.acquire(timeout=1)
+
+
+def test_limit_never_drops_below_minimum():
+    limiter = AIMDLimiter("test", initial=2, min_limit=1, max_limit=8, reserved=0)
+    limiter.last_decrease_at = 0
+    for _ in range(5):
+        limiter.acquire(timeout=0)
+        limiter.release(OVERLOADED, retry_after=0)
+        limiter.last_decrease_at = 0
+    assert limiter.limit == 1
+
+
+def test_reserved_capacity_is_only_for_interactive():
+    limiter = AIMDLimiter("test", initial=3, min_limit=1, max_limit=8, reserved=1)
+    assert limiter.acquire(timeout=0, priority=BATCH)
+    assert limiter.acquire(timeout=0, priority=BATCH)
+    assert not limiter.acquire(timeout=0, priority=BATCH)
+    assert limiter.acquire(timeout=0, priority=INTERACTIVE)
+    assert not limiter.acquire(timeout=0, priority=INTERACTIVE)
+
+
+def test_interactive_keeps_a_slot_at_minimum_limit():
+    limiter = AIMDLimiter("test", initial=1, min_limit=1, max_limit=8, reserved=1)
+    assert limiter.acquire(timeout=0, priority=BATCH)
+    assert limiter.acquire(timeout=0, priority=INTERACTIVE)
+
+
+def test_waiting_interactive_request_is_served_before_batch():
+    limiter = AIMDLimiter("test", initial=1, min_limit=1, max_limit=1, reserved=0)
+    assert limiter.acquire(timeout=0)
+    order = []
+
+    def take(priority):
+        if limiter.acquire(timeout=2, priority=priority):
+            order.append(priority)
+
+    batch = threading.Thread(target=take, args=(BATCH,))
+    batch.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=take, args=(INTERACTIVE,))
+    interactive.start()
+    time.sleep(0.05)
+
+    limiter.release(SUCCESS, latency=0.1)
+    interactive.join(timeout=2)
+    assert order == [INTERACTIVE]
+    limiter.release(SUCCESS, latency=0.1)
+    batch.join(timeout=2)
+    assert order == [INTERACTIVE, BATCH]
@@ -0,0 +1,11 @@
+import pytest
+
+from tasks import backfill
+
+
+@pytest.mark.parametrize("kwargs", [{"batch_size": 0}, {"batch_size": -3}, {"limit": 0}])
+def test_rejects_non_positive_sizes(kwargs):
+    with pytest.raises(ValueError):
+        backfill.run_backfill("https://www.youtube.com/@example", **kwargs)
+    # 驗證失敗時不能留下「執行中」的標記
+    assert "https://www.youtube.com/@example" not in backfill._running
@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+
+import pytest
+
+from benchmarks.llm_standin import make_server
+from tasks import batch_summarizer, llm_gateway, summarizer
+
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    """在背景執行 benchmarks/llm_standin，batch 立即完成"""
+    monkeypatch.chdir(tmp_path)
+    server = make_server(port=0, batch_delay=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    provider = llm_gateway.Provider(
+        "primary", "standin", f"http://127.0.0.1:{server.server_address[1]}/v1", "standin-model"
+    )
+    monkeypatch.setattr(batch_summarizer, "get_providers", lambda: [provider])
+    yield server.RequestHandlerClass.state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """把逐字稿、去重、資料庫與向量索引換成記錄呼叫的替身"""
+    calls = {"db": [], "embeddings": [], "usage": []}
+    transcripts = {"v1": "第一部影片的逐字稿", "v2": "第二部影片的逐字稿"}
+    monkeypatch.setattr(batch_summarizer, "prefetch_transcript", lambda video: transcripts.get(video["id"]))
+    monkeypatch.setattr(batch_summarizer, "check_duplicate", lambda video, text: None)
+    monkeypatch.setattr(batch_summarizer, "add_videos_to_db", lambda videos: calls["db"].extend(v["id"] for v in videos))
+    monkeypatch.setattr(batch_summarizer, "add_embeddings", lambda videos: calls["embeddings"].extend(v["id"] for v in videos))
+    monkeypatch.setattr(batch_summarizer.llm_usage, "budget_exceeded", lambda: False)
+    monkeypatch.setattr(
+        batch_summarizer.llm_usage, "record",
+        lambda feature, provider, model, **kwargs: calls["usage"].append((kwargs["video_id"], kwargs["price_factor"])),
+    )
+    return calls
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _videos():
+    return [{"id": "v1", "title": "一"}, {"id": "v2", "title": "二"}, {"id": "v3", "title": "沒有逐字稿"}]
+
+
+def test_prepare_submit_poll_apply_cycle(standin, pipeline):
+    [job_id] = batch_summarizer.prepare_jobs(_videos())
+    # 沒有逐字稿的影片不送 batch，直接寫入資料庫
+    assert pipeline["db"] == ["v3"]
+    job = batch_summarizer.load_jobs()[job_id]
+    assert job["status"] == batch_summarizer.PREPARED
+    assert set(job["videos"]) == {"v1", "v2"}
+
+    job = batch_summarizer.submit_job(job_id)
+    assert job["status"] == batch_summarizer.SUBMITTED
+    assert standin.batches[job["batch_id"]]["metadata"] == {"local_job_id": job_id}
+
+    assert _wait_for(lambda: batch_summarizer.poll_job(job_id)["status"] == batch_summarizer.DOWNLOADED)
+    assert os.path.exists(batch_summarizer.load_jobs()[job_id]["output_path"])
+
+    job = batch_summarizer.apply_job(job_id)
+    assert job["status"] == batch_summarizer.DONE
+    assert job["summarized"] == 2
+    for video_id in ("v1", "v2"):
+        with open(summarizer.get_summary_path(video_id), encoding="utf-8") as f:
+            assert f.read().startswith("## 內容摘要")
+    assert pipeline["db"] == ["v3", "v1", "v2"]
+    assert sorted(pipeline["embeddings"]) == ["v1", "v2"]
+    assert sorted(pipeline["usage"]) == [("v1", batch_summarizer.llm_usage.BATCH_PRICE_FACTOR),
+                                         ("v2", batch_summarizer.llm_usage.BATCH_PRICE_FACTOR)]
+
+    # 重複回寫不會再寫入資料庫或重複計費
+    batch_summarizer.apply_job(job_id)
+    assert pipeline["db"] == ["v3", "v1", "v2"]
+    assert len(pipeline["usage"]) == 2
+
+
+def test_run_batch_waits_until_every_job_is_applied(standin, pipeline):
+    [status] = batch_summarizer.run_batch(_videos(), wait=True, poll_interval=0.05)
+    assert status["status"] == batch_summarizer.DONE
+    assert status["applied"] == status["total"] == 2
+    assert batch_summarizer.pending_from_db() == []
+
+
+def test_submit_does_not_create_a_second_remote_batch_after_a_crash(standin, pipeline):
+    [job_id] = batch_summarizer.prepare_jobs(_videos())
+    first = batch_summarizer.submit_job(job_id)
+    # 模擬建立 batch 後、寫入 SUBMITTED 前中斷
+    batch_summarizer._update_job(job_id, status=batch_summarizer.PREPARED)
+
+    second = batch_summarizer.submit_job(job_id)
+    assert second["batch_id"] == first["batch_id"]
+    assert len(standin.batches) == 1
+
+
+def test_prepared_job_waits_while_the_budget_is_exceeded(standin, pipeline, monkeypatch):
+    [job_id] = batch_summarizer.prepare_jobs(_videos())
+    monkeypatch.setattr(batch_summarizer.llm_usage, "budget_exceeded", lambda: True)
+
+    assert batch_summarizer.advance_job(job_id)["status"] == batch_summarizer.PREPARED
+    assert standin.batches == {}
@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+from tasks import channel_registry, monitor_task
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://www.youtube.com/@Google/videos", "https://www.youtube.com/@google"),
+    ("https://www.youtube.com/@Google/featured", "https://www.youtube.com/@google"),
+    ("https://youtube.com/@LennysPodcast?si=abc123", "https://www.youtube.com/@lennyspodcast"),
+    ("youtube.com/@a16z", "https://www.youtube.com/@a16z"),
+    ("www.youtube.com/@a16z/", "https://www.youtube.com/@a16z"),
+    ("m.youtube.com/@a16z/streams", "https://www.youtube.com/@a16z"),
+    ("@YCombinator", "https://www.youtube.com/@ycombinator"),
+    ("https://www.youtube.com/channel/UCabcDEF123/videos", "https://www.youtube.com/channel/UCabcDEF123"),
+    ("https://www.youtube.com/user/SomeUser", "https://www.youtube.com/user/SomeUser"),
+])
+def test_normalize_channel_url(url, expected):
+    assert channel_registry.normalize_channel_url(url) == expected
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch?v=abc",
+    "https://example.com/@handle",
+    "https://www.youtube.com/@handle/not-a-tab",
+    "ftp://www.youtube.com/@handle",
+])
+def test_normalize_rejects_non_channel_urls(url):
+    assert channel_registry.normalize_channel_url(url) is None
+
+
+def test_default_channels_are_normalized():
+    normalized = [channel_registry.normalize_channel_url(url) for url in channel_registry.DEFAULT_CHANNELS]
+    assert None not in normalized
+    assert len(set(normalized)) == len(normalized)
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(channel_registry, "CHANNEL_DB", str(tmp_path / "channels.sqlite"))
+    monkeypatch.setattr(channel_registry, "DEFAULT_CHANNELS", [])
+    return channel_registry
+
+
+def test_existing_urls_are_normalized_on_open(registry):
+    conn = sqlite3.connect(registry.CHANNEL_DB)
+    conn.executescript(registry._SCHEMA)
+    conn.executemany("INSERT INTO channels (url, channel_id, added_at) VALUES (?, ?, ?)", [
+        ("https://www.youtube.com/@Google/videos", "UCgoogle", "1"),
+        ("https://www.youtube.com/@google", None, "2"),
+        ("https://www.youtube.com/@A16Z", None, "3"),
+    ])
+    conn.commit()
+    conn.close()
+
+    urls = {c["url"]: c["channel_id"] for c in registry.list_channels()}
+    assert urls == {"https://www.youtube.com/@google": "UCgoogle", "https://www.youtube.com/@a16z": None}
+
+
+def test_warm_channel_rejects_already_monitored_channel_id(registry, monkeypatch):
+    registry.add_channel("https://www.youtube.com/@google")
+    registry.update_channel("https://www.youtube.com/@google", channel_id="UCgoogle")
+    registry.add_channel("https://www.youtube.com/channel/UCgoogle")
+    monkeypatch.setattr(monitor_task, "get_channel_id_from_url", lambda url: "UCgoogle")
+    monkeypatch.setattr(monitor_task, "get_new_videos", lambda channel_id: pytest.fail("should not fetch RSS"))
+
+    result = monitor_task.warm_channel("https://www.youtube.com/channel/UCgoogle")
+
+    assert result["duplicate_of"] == "https://www.youtube.com/@google"
+    assert registry.get_channel("https://www.youtube.com/channel/UCgoogle") is None
+    assert registry.get_channel("https://www.youtube.com/@google")["channel_id"] == "UCgoogle"
@@ -0,0 +1,89 @@
+import pytest
+
+from tasks import context_packer
+from tasks.context_packer import count_tokens, fit_text, pack_chat
+
+# 不在 tiktoken 支援清單內的模型名稱：一律走估算，結果不受 tiktoken 是否安裝影響
+MODEL = "test-model"
+
+
+@pytest.fixture(autouse=True)
+def _no_context_override(monkeypatch):
+    monkeypatch.delenv("LLM_CONTEXT_TOKENS", raising=False)
+
+
+def test_count_tokens_estimate():
+    assert count_tokens("", MODEL) == 0
+    assert count_tokens("你好世界", MODEL) == 4
+    assert count_tokens("abcd efgh", MODEL) == 3
+    # 2 個 CJK 字 + 8 個其他字元 (約 2 tokens)
+    assert count_tokens("產品 manager", MODEL) == 2 + 2
+
+
+@pytest.mark.parametrize("model, expected", [
+    ("gpt-4o-mini", 128_000),
+    ("gpt-4", 8_192),
+    ("openrouter/gpt-4.1", 1_000_000),
+    ("Gemini-2.5-Flash", 1_000_000),
+    ("unknown-model", context_packer.DEFAULT_CONTEXT_TOKENS),
+])
+def test_context_window_uses_longest_prefix(model, expected):
+    assert context_packer.context_window(model) == expected
+
+
+def test_context_window_override(monkeypatch):
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS", "5000")
+    assert context_packer.context_window("gpt-4o") == 5000
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 10, 33])
+def test_coverage_order_is_a_permutation_starting_at_both_ends(n):
+    order = context_packer._coverage_order(n)
+    assert sorted(order) == list(range(n))
+    if n >= 2:
+        assert order[:2] == [0, n - 1]
+
+
+def test_fit_text_keeps_short_text_unchanged():
+    assert fit_text("短短一句。", 100, MODEL) == "短短一句。"
+
+
+def test_fit_text_drops_whole_sentences_evenly():
+    sentences = [f"第{i:02d}句的內容在這裡。" for i in range(40)]
+    text = "".join(sentences)
+    packed = fit_text(text, 120, MODEL)
+
+    assert count_tokens(packed, MODEL) <= 120
+    assert packed.startswith(sentences[0])
+    assert sentences[-1] in packed
+    assert "[...]" in packed
+    # 保留的句子都是完整的
+    kept = [s for s in sentences if s in packed]
+    assert 2 < len(kept) < len(sentences)
+    # 中段也有保留，而不是只留開頭
+    assert any(s in packed for s in sentences[15:25])
+
+
+def test_pack_chat_keeps_latest_message_and_drops_oldest_history(monkeypatch):
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS", "400")
+    monkeypatch.setattr(context_packer, "OUTPUT_RESERVE_TOKENS", 100)
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"舊訊息{i:02d}" * 5} for i in range(10)]
+    latest = {"role": "user", "content": "最新的問題是什麼？"}
+    transcript = "".join(f"逐字稿第{i:03d}句。" for i in range(200))
+
+    system_prompt, kept = pack_chat("逐字稿：{transcript}", "{transcript}", transcript, history + [latest], model=MODEL)
+
+    assert kept[-1] is latest
+    # 保留的是最近的連續歷史
+    assert kept[:-1] == history[len(history) - len(kept) + 1:]
+    assert len(kept) - 1 < len(history)
+    total = count_tokens(system_prompt, MODEL) + sum(
+        count_tokens(m["content"], MODEL) + context_packer.MESSAGE_OVERHEAD_TOKENS for m in kept
+    )
+    assert total <= context_packer.input_budget(MODEL)
+
+
+def test_pack_chat_without_messages():
+    system_prompt, kept = pack_chat("內容：{t}", "{t}", "一句話。", [], model=MODEL)
+    assert system_prompt == "內容：一句話。"
+    assert kept == []
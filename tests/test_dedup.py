@@ -0,0 +1,113 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+from tasks import dedup
+
+
+def _words(seed: int, count: int = 400) -> list[str]:
+    rng = random.Random(seed)
+    return [f"w{rng.randrange(5000)}" for _ in range(count)]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dedup, "FINGERPRINT_DB", str(tmp_path / "fingerprints.sqlite"))
+    monkeypatch.setattr(dedup, "DEDUP_MIN_SIMILARITY", 0.7)
+    return tmp_path
+
+
+def _summarize(video_id: str) -> None:
+    with open(dedup.get_summary_path(video_id), "w", encoding="utf-8") as f:
+        f.write("summary")
+
+
+def test_reupload_is_detected_through_the_index(store):
+    words = _words(1)
+    assert dedup.check_duplicate({"id": "original"}, " ".join(words)) is None
+    _summarize("original")
+
+    # 轉載：前後各多一小段
+    reupload = ["intro"] * 5 + words + ["outro"] * 5
+    assert dedup.check_duplicate({"id": "copy"}, " ".join(reupload)) == "original"
+    assert dedup.check_duplicate({"id": "other"}, " ".join(_words(2))) is None
+
+
+def test_match_without_summary_is_not_a_duplicate(store):
+    text = " ".join(_words(3))
+    assert dedup.check_duplicate({"id": "a"}, text) is None
+    assert dedup.check_duplicate({"id": "b"}, text) is None
+
+
+def test_ignored_video_is_never_a_duplicate(store):
+    text = " ".join(_words(4))
+    dedup.check_duplicate({"id": "a"}, text)
+    _summarize("a")
+    dedup.ignore_duplicate("b")
+    assert dedup.check_duplicate({"id": "b"}, text) is None
+
+
+def test_legacy_json_is_imported(store):
+    text = " ".join(_words(5))
+    signature = dedup.minhash(text)
+    with open(dedup.LEGACY_FINGERPRINT_FILE, "w", encoding="utf-8") as f:
+        json.dump({"signatures": {"old": signature.astype("<u4").tobytes().hex()}, "buckets": {}, "ignored": ["skip"]}, f)
+    _summarize("old")
+
+    assert dedup.check_duplicate({"id": "new"}, text) == "old"
+    assert dedup.check_duplicate({"id": "skip"}, text) is None
+
+
+def test_reset_clears_signatures_overrides_and_legacy_file(store):
+    text = " ".join(_words(6))
+    dedup.check_duplicate({"id": "a"}, text)
+    _summarize("a")
+    dedup.ignore_duplicate("b")
+    with open(dedup.LEGACY_FINGERPRINT_FILE, "w", encoding="utf-8") as f:
+        json.dump({"signatures": {}, "ignored": []}, f)
+
+    dedup.reset()
+
+    assert not (store / dedup.LEGACY_FINGERPRINT_FILE).exists()
+    with dedup._connect() as conn:
+        for table in ("signatures", "buckets", "ignored"):
+            assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+    # 重置後重新加入的影片不會對到舊簽章
+    assert dedup.check_duplicate({"id": "c"}, text) is None
+
+
+def test_minhash_requires_enough_tokens():
+    assert dedup.minhash(" ".join(_words(6, count=dedup.DEDUP_MIN_TOKENS - 1))) is None
+    signature = dedup.minhash(" ".join(_words(6)))
+    assert signature.shape == (dedup.NUM_PERMUTATIONS,)
+    assert signature.dtype == np.uint32
+
+
+def test_minhash_is_deterministic_and_case_insensitive():
+    text = " ".join(_words(7))
+    assert np.array_equal(dedup.minhash(text), dedup.minhash(text.upper()))
+
+
+def _shingles(words):
+    return {" ".join(words[i:i + dedup.SHINGLE_SIZE]) for i in range(len(words) - dedup.SHINGLE_SIZE + 1)}
+
+
+@pytest.mark.parametrize("overlap", [0.3, 0.6, 0.9])
+def test_similarity_estimates_jaccard(overlap):
+    base = _words(8, count=2000)
+    keep = int(len(base) * overlap)
+    other = base[:keep] + _words(9, count=len(base) - keep)
+    a, b = _shingles(base), _shingles(other)
+    true_jaccard = len(a & b) / len(a | b)
+
+    estimate = dedup.similarity(dedup.minhash(" ".join(base)), dedup.minhash(" ".join(other)))
+    # 64 個排列的標準差約 sqrt(J(1-J)/64) <= 0.0625
+    assert abs(estimate - true_jaccard) < 0.2
+
+
+def test_band_keys_cover_every_band():
+    keys = dedup._band_keys(dedup.minhash(" ".join(_words(10))))
+    assert [band for band, _ in keys] == list(range(dedup.LSH_BANDS))
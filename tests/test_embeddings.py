@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from tasks import embeddings, summarizer
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(summarizer, "TRANSCRIPT_DIR", str(tmp_path / "transcripts"))
+    monkeypatch.setattr(embeddings, "EMBEDDING_DIR", "embeddings")
+    monkeypatch.setattr(embeddings, "VECTORS_FILE", os.path.join("embeddings", "vectors.f32"))
+    monkeypatch.setattr(embeddings, "INDEX_FILE", os.path.join("embeddings", "index.json"))
+    monkeypatch.setattr(embeddings, "LOCK_FILE", os.path.join("embeddings", "index.lock"))
+    monkeypatch.setattr(embeddings, "EMBEDDING_MODEL", "")
+    monkeypatch.setattr(embeddings, "_cache", {"mtime": None, "index": None, "ids": [], "matrix": None})
+    embeddings._get_model.cache_clear()
+    yield tmp_path
+    embeddings._get_model.cache_clear()
+
+
+def _add(video_id, title, text):
+    with open(summarizer.get_summary_path(video_id), "w", encoding="utf-8") as f:
+        f.write(text)
+    return {"id": video_id, "title": title}
+
+
+def _build(*videos):
+    assert embeddings.add_videos(list(videos)) == len(videos)
+
+
+def test_default_backend_is_feature_hashing(index_dir):
+    _build(_add("a", "Python", "python decorators and generators"))
+    assert embeddings.model_name() == f"hashing-{embeddings.HASH_DIM}"
+    assert embeddings.load_index()["model"] == f"hashing-{embeddings.HASH_DIM}"
+
+
+def test_related_videos_are_ranked_by_shared_terms(index_dir):
+    _build(
+        _add("python1", "Python 生成器", "python generators yield lazy iteration python generators"),
+        _add("python2", "Python 迭代", "python generators and lazy iteration with itertools"),
+        _add("python3", "Python 套件", "python packaging with pyproject and wheels"),
+        _add("cooking", "滷肉飯", "braised pork rice soy sauce shallots"),
+    )
+
+    related = embeddings.related_videos("python1")
+    ids = [video_id for video_id, _ in related]
+    assert "python1" not in ids
+    assert ids[0] == "python2"
+    assert ids[-1] == "cooking"
+    scores = [score for _, score in related]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] > 0.5
+
+
+def test_related_videos_respects_k_and_unknown_ids(index_dir):
+    _build(
+        _add("a", "a", "alpha beta gamma"),
+        _add("b", "b", "alpha beta delta"),
+        _add("c", "c", "alpha epsilon zeta"),
+    )
+    assert [video_id for video_id, _ in embeddings.related_videos("a", k=1)] == ["b"]
+    assert len(embeddings.related_videos("a", k=10)) == 2
+    assert embeddings.related_videos("missing") == []
+
+
+def test_single_video_has_no_related(index_dir):
+    _build(_add("only", "only", "alpha beta"))
+    assert embeddings.related_videos("only") == []
+
+
+def test_updated_index_is_picked_up_by_readers(index_dir):
+    _build(_add("a", "a", "alpha beta gamma"), _add("c", "c", "unrelated words here"))
+    assert [video_id for video_id, _ in embeddings.related_videos("a")] == ["c"]
+
+    _build(_add("b", "b", "alpha beta gamma delta"))
+    # 強制讓 index.json 的 mtime 改變 (檔案系統時間解析度可能不足)
+    stat = os.stat(embeddings.INDEX_FILE)
+    os.utime(embeddings.INDEX_FILE, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert [video_id for video_id, _ in embeddings.related_videos("a")] == ["b", "c"]
+
+
+def test_videos_without_summary_or_transcript_are_skipped(index_dir):
+    assert embeddings.add_videos([{"id": "ghost", "title": "沒有內容"}]) == 0
+    assert embeddings.related_videos("ghost") == []
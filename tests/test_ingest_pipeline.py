@@ -0,0 +1,127 @@
+import time
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from tasks import ingest_pipeline, pipeline_trace
+
+
+def _done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _broken_embeddings(video_infos):
+    raise OSError("disk full")
+
+
+def test_embedding_failure_does_not_fail_a_saved_summary(monkeypatch):
+    saved = {}
+    monkeypatch.setattr(ingest_pipeline, "check_duplicate", lambda video_info, text: None)
+    monkeypatch.setattr(ingest_pipeline, "summarize_video", lambda video_id, title, transcript_text=None: "# 摘要")
+    monkeypatch.setattr(ingest_pipeline, "save_summary", lambda video_id, content: saved.update({video_id: content}))
+    monkeypatch.setattr(ingest_pipeline, "add_embeddings", _broken_embeddings)
+
+    result = ingest_pipeline.summarize_prefetched({"id": "vid", "title": "t"}, _done("逐字稿內容"))
+
+    assert result == "# 摘要"
+    assert saved == {"vid": "# 摘要"}
+
+
+def test_resummarize_survives_embedding_failure(monkeypatch):
+    monkeypatch.setattr(ingest_pipeline, "summarize_video", lambda video_id, title: "# 摘要")
+    monkeypatch.setattr(ingest_pipeline, "save_summary", lambda video_id, content: None)
+    monkeypatch.setattr(ingest_pipeline, "add_embeddings", _broken_embeddings)
+
+    assert ingest_pipeline.resummarize({"id": "vid", "title": "t"}) == "# 摘要"
+
+
+@pytest.fixture
+def stages(tmp_path, monkeypatch):
+    """pipeline_trace 寫到暫存資料庫；去重、存檔與向量換成不做事的替身"""
+    monkeypatch.setattr(pipeline_trace, "TRACE_DB", str(tmp_path / "traces.sqlite"))
+    monkeypatch.setattr(ingest_pipeline, "check_duplicate", lambda video_info, text: None)
+    monkeypatch.setattr(ingest_pipeline, "save_summary", lambda video_id, content: None)
+    monkeypatch.setattr(ingest_pipeline, "add_embeddings", lambda video_infos: None)
+    monkeypatch.setattr(ingest_pipeline, "prefetch_transcript", lambda video_info: f"{video_info['id']} 的逐字稿")
+
+
+def _videos(count):
+    return [{"id": f"v{i}", "title": str(i)} for i in range(count)]
+
+
+def test_on_done_runs_in_input_order_on_the_calling_thread(stages, monkeypatch):
+    def summarize(video_id, title, transcript_text=None):
+        # 越前面的影片越慢完成
+        time.sleep(0.05 * (5 - int(video_id[1:])))
+        return f"# {video_id}"
+
+    monkeypatch.setattr(ingest_pipeline, "summarize_video", summarize)
+    done = []
+    caller = threading.current_thread()
+
+    def on_done(video_info, summary_content):
+        assert threading.current_thread() is caller
+        done.append((video_info["id"], summary_content))
+
+    assert ingest_pipeline.run_pipeline(_videos(5), on_done, summary_workers=5) == 5
+    assert done == [(f"v{i}", f"# v{i}") for i in range(5)]
+
+
+def test_failed_summary_is_reported_as_none_and_the_rest_continue(stages, monkeypatch):
+    def summarize(video_id, title, transcript_text=None):
+        if video_id == "v1":
+            raise RuntimeError("boom")
+        return f"# {video_id}"
+
+    monkeypatch.setattr(ingest_pipeline, "summarize_video", summarize)
+    done = []
+    ingest_pipeline.run_pipeline(_videos(3), lambda video_info, content: done.append((video_info["id"], content)))
+    assert done == [("v0", "# v0"), ("v1", None), ("v2", "# v2")]
+
+
+def test_prefetch_overlaps_with_summarization(stages, monkeypatch):
+    next_prefetched = threading.Event()
+    overlapped = []
+
+    def prefetch(video_info):
+        if video_info["id"] == "v1":
+            next_prefetched.set()
+        return "逐字稿"
+
+    def summarize(video_id, title, transcript_text=None):
+        if video_id == "v0":
+            # 第一部還在摘要時，第二部的逐字稿應該已經在抓了
+            overlapped.append(next_prefetched.wait(5))
+        return "# 摘要"
+
+    monkeypatch.setattr(ingest_pipeline, "prefetch_transcript", prefetch)
+    monkeypatch.setattr(ingest_pipeline, "summarize_video", summarize)
+
+    ingest_pipeline.run_pipeline(_videos(3), lambda video_info, content: None, summary_workers=1)
+    assert overlapped == [True]
+
+
+def test_prefetch_is_bounded_by_the_buffer(stages, monkeypatch):
+    prefetched = []
+    in_flight = []
+
+    def prefetch(video_info):
+        prefetched.append(video_info["id"])
+        return "逐字稿"
+
+    def summarize(video_id, title, transcript_text=None):
+        if video_id == "v0":
+            time.sleep(0.3)
+            # 摘要卡住時，預取最多超前 buffer + 摘要中 + feeder 手上的一部
+            in_flight.append(len(prefetched))
+        return "# 摘要"
+
+    monkeypatch.setattr(ingest_pipeline, "prefetch_transcript", prefetch)
+    monkeypatch.setattr(ingest_pipeline, "summarize_video", summarize)
+
+    ingest_pipeline.run_pipeline(_videos(10), lambda video_info, content: None, buffer_size=2, summary_workers=1)
+    assert in_flight[0] <= 2 + 1 + 1
+    assert len(prefetched) == 10
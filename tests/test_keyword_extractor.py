@@ -0,0 +1,91 @@
+from collections import Counter
+
+import pytest
+
+from tasks import keyword_extractor
+from tasks.keyword_extractor import tokenize, score_documents, document_terms
+
+
+def test_english_terms_skip_stopwords_and_form_bigrams():
+    terms = tokenize("The product manager ships. Growth loops")
+    assert "the" not in terms
+    assert "product manager" in terms
+    # 句點隔開的詞不組成雙詞組
+    assert "ships growth" not in terms
+    assert "growth loops" in terms
+
+
+def test_document_terms_weights_title_and_drops_singletons():
+    counts = document_terms("Vector Databases", "Embedding models embedding search. Random aside.")
+    assert counts["vector databases"] >= keyword_extractor.TITLE_WEIGHT
+    assert counts["embedding"] == 2
+    assert "random" not in counts
+
+
+def test_score_documents_prefers_distinctive_terms():
+    docs = [
+        Counter({"startup": 3, "pricing": 4}),
+        Counter({"startup": 3, "hiring": 4}),
+        Counter({"startup": 3, "fundraising": 4}),
+    ]
+    df = {"startup": 3, "pricing": 1, "hiring": 1, "fundraising": 1}
+    tags = score_documents(docs, df, doc_count=3, k=1)
+    assert tags == [["Pricing"], ["Hiring"], ["Fundraising"]]
+
+
+def test_score_documents_zeroes_terms_in_most_documents():
+    doc_count = keyword_extractor.MIN_DOCS_FOR_MAX_DF
+    docs = [Counter({"podcast": 10, "pricing": 1})]
+    df = {"podcast": doc_count, "pricing": 1}
+    assert score_documents(docs, df, doc_count=doc_count, k=2) == [["Pricing"]]
+
+
+def test_score_documents_skips_terms_contained_in_a_higher_tag():
+    docs = [Counter({"product manager": 4, "product": 4, "roadmap": 2})]
+    df = {"product manager": 1, "product": 1, "roadmap": 1}
+    assert score_documents(docs, df, doc_count=5, k=2) == [["Product Manager", "Roadmap"]]
+
+
+def test_score_documents_handles_empty_documents():
+    assert score_documents([Counter(), Counter()], {}, doc_count=2) == [[], []]
+
+
+@pytest.fixture
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(keyword_extractor, "_store", None)
+    monkeypatch.setattr(keyword_extractor, "_store_mtime", None)
+    return tmp_path
+
+
+def _write_summary(video_id, text):
+    with open(keyword_extractor.get_summary_path(video_id), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_extract_tags_is_incremental_and_does_not_double_count(index_dir):
+    _write_summary("a", "# 標題\nkubernetes kubernetes operators operators")
+    _write_summary("b", "serverless serverless pricing pricing")
+    keyword_extractor.extract_tags([{"id": "a", "title": ""}, {"id": "b", "title": ""}])
+    # 重新擷取同一部影片時先扣除舊的詞
+    tags = keyword_extractor.extract_tags([{"id": "a", "title": ""}])
+
+    store = keyword_extractor.load_index()
+    assert store["df"]["kubernetes"] == 1
+    assert set(store["docs"]) == {"a", "b"}
+    assert tags["a"][0] in ("Kubernetes", "Operators", "Kubernetes Operators")
+    assert keyword_extractor.extract_tags([{"id": "missing", "title": ""}]) == {}
+
+
+def test_reset_drops_document_frequencies(index_dir):
+    _write_summary("a", "kubernetes kubernetes operators operators")
+    keyword_extractor.extract_tags([{"id": "a", "title": ""}])
+
+    keyword_extractor.reset()
+
+    assert not (index_dir / keyword_extractor.KEYWORD_INDEX_FILE).exists()
+    _write_summary("b", "serverless serverless pricing pricing")
+    keyword_extractor.extract_tags([{"id": "b", "title": ""}])
+    store = keyword_extractor.load_index()
+    assert set(store["docs"]) == {"b"}
+    assert "kubernetes" not in store["df"]
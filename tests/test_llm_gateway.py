@@ -0,0 +1,208 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from tasks import llm_gateway
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FakeClient:
+    """只實作 gateway 用到的 client.chat.completions.create"""
+
+    def __init__(self, handler):
+        self.calls = []
+
+        def create(**kwargs):
+            self.calls.append(time.time())
+            return handler(**kwargs)
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+def _response(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=None)
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+
+def _provider(name, handler):
+    provider = llm_gateway.Provider(name, "key", f"http://{name}.invalid/v1", f"{name}-model")
+    provider._client = FakeClient(handler)
+    return provider
+
+
+@pytest.fixture
+def usage(monkeypatch):
+    records = []
+    monkeypatch.setattr(
+        llm_gateway.llm_usage, "record",
+        lambda feature, provider, model, **kwargs: records.append((provider, kwargs["outcome"])),
+    )
+    return records
+
+
+@pytest.fixture
+def use_providers(monkeypatch):
+    def install(*providers):
+        monkeypatch.setattr(llm_gateway, "get_providers", lambda: list(providers))
+        return providers
+    return install
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _assert_released(*providers):
+    # 背景跑完的輸家請求也要歸還名額
+    assert _wait_until(lambda: all(p.limiter.status()["in_flight"] == 0 for p in providers))
+
+
+def test_hedge_is_sent_only_after_the_p95_and_the_loser_is_recorded_as_cancelled(use_providers, usage):
+    release_primary = threading.Event()
+    primary = _provider("primary", lambda **kw: (release_primary.wait(5), _response("slow"))[1])
+    fallback = _provider("fallback", lambda **kw: _response("fast"))
+    primary.latencies.extend([0.2] * llm_gateway.HEDGE_MIN_SAMPLES)
+    use_providers(primary, fallback)
+
+    started = time.time()
+    try:
+        assert llm_gateway.chat_completion([{"role": "user", "content": "hi"}], hedge=True, timeout=5) == "fast"
+        # 避險請求在主請求超過 p95 (0.2s) 之後才送出
+        assert fallback._client.calls[0] - started >= 0.2
+    finally:
+        release_primary.set()
+
+    assert _wait_until(lambda: ("primary", "cancelled") in usage)
+    assert ("fallback", "ok") in usage
+    assert ("primary", "ok") not in usage
+    _assert_released(primary, fallback)
+
+
+def test_no_hedge_when_the_primary_answers_within_the_p95(use_providers, usage):
+    primary = _provider("primary", lambda **kw: _response("ok"))
+    fallback = _provider("fallback", lambda **kw: _response("fallback"))
+    primary.latencies.extend([1.0] * llm_gateway.HEDGE_MIN_SAMPLES)
+    use_providers(primary, fallback)
+
+    assert llm_gateway.chat_completion([{"role": "user", "content": "hi"}], hedge=True, timeout=5) == "ok"
+    assert fallback._client.calls == []
+    _assert_released(primary, fallback)
+
+
+def test_fails_over_after_an_error(use_providers, usage):
+    def broken(**kw):
+        raise RuntimeError("boom")
+
+    primary = _provider("primary", broken)
+    fallback = _provider("fallback", lambda **kw: _response("fallback"))
+    use_providers(primary, fallback)
+
+    assert llm_gateway.chat_completion([{"role": "user", "content": "hi"}], hedge=False, timeout=5) == "fallback"
+    assert primary.errors == 1
+    assert usage == [("primary", "error"), ("fallback", "ok")]
+    _assert_released(primary, fallback)
+
+
+def test_fails_over_after_a_429_and_backs_off_the_primary(use_providers, usage):
+    def limited(**kw):
+        raise RateLimitError("slow down")
+
+    primary = _provider("primary", limited)
+    fallback = _provider("fallback", lambda **kw: _response("fallback"))
+    use_providers(primary, fallback)
+
+    assert llm_gateway.chat_completion([{"role": "user", "content": "hi"}], hedge=False, timeout=5) == "fallback"
+    status = primary.limiter.status()
+    assert status["decreases"] == 1
+    assert status["blocked_for_s"] > 0
+    _assert_released(primary, fallback)
+
+
+def test_expired_deadline_raises_llm_unavailable(use_providers, usage):
+    release = threading.Event()
+    primary = _provider("primary", lambda **kw: (release.wait(5), _response("late"))[1])
+    use_providers(primary)
+
+    started = time.time()
+    try:
+        with pytest.raises(llm_gateway.LLMUnavailable):
+            llm_gateway.chat_completion([{"role": "user", "content": "hi"}], hedge=False, timeout=0.2)
+        assert time.time() - started < 2
+    finally:
+        release.set()
+    # 逾時後才回來的請求不算成功
+    assert _wait_until(lambda: ("primary", "cancelled") in usage)
+    _assert_released(primary)
+
+
+def test_stream_switches_provider_before_the_first_token(use_providers, usage):
+    def fails_immediately(**kw):
+        def stream():
+            raise RateLimitError("slow down")
+            yield  # pragma: no cover
+        return stream()
+
+    primary = _provider("primary", fails_immediately)
+    fallback = _provider("fallback", lambda **kw: iter([_chunk("a"), _chunk("b")]))
+    use_providers(primary, fallback)
+
+    assert list(llm_gateway.chat_completion_stream([{"role": "user", "content": "hi"}])) == ["a", "b"]
+    assert usage == [("primary", "error"), ("fallback", "ok")]
+    _assert_released(primary, fallback)
+
+
+def test_stream_does_not_switch_provider_after_the_first_token(use_providers, usage):
+    def fails_midway(**kw):
+        def stream():
+            yield _chunk("a")
+            raise ConnectionError("reset")
+        return stream()
+
+    primary = _provider("primary", fails_midway)
+    fallback = _provider("fallback", lambda **kw: iter([_chunk("b")]))
+    use_providers(primary, fallback)
+
+    received = []
+    with pytest.raises(ConnectionError):
+        for delta in llm_gateway.chat_completion_stream([{"role": "user", "content": "hi"}]):
+            received.append(delta)
+    assert received == ["a"]
+    assert fallback._client.calls == []
+    _assert_released(primary, fallback)
+
+
+def test_stream_closed_by_the_caller_releases_its_slot(use_providers, usage):
+    primary = _provider("primary", lambda **kw: iter([_chunk("a"), _chunk("b")]))
+    use_providers(primary)
+
+    stream = llm_gateway.chat_completion_stream([{"role": "user", "content": "hi"}])
+    assert next(stream) == "a"
+    stream.close()
+    assert usage == [("primary", "cancelled")]
+    _assert_released(primary)
+
+
+def test_stream_raises_llm_unavailable_when_every_provider_fails_before_output(use_providers, usage):
+    def broken(**kw):
+        raise RuntimeError("boom")
+
+    primary = _provider("primary", broken)
+    fallback = _provider("fallback", broken)
+    use_providers(primary, fallback)
+
+    with pytest.raises(llm_gateway.LLMUnavailable):
+        list(llm_gateway.chat_completion_stream([{"role": "user", "content": "hi"}]))
+    _assert_released(primary, fallback)
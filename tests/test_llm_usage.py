@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tasks import llm_usage
+from tasks.llm_usage import estimate_cost
+
+
+@pytest.fixture(autouse=True)
+def usage_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_usage, "USAGE_DB", str(tmp_path / "llm_usage.sqlite"))
+    monkeypatch.setattr(llm_usage, "LLM_DAILY_BUDGET_USD", None)
+    monkeypatch.setattr(llm_usage, "LLM_DAILY_TOKEN_BUDGET", None)
+    monkeypatch.setattr(llm_usage, "_pricing", None)
+    monkeypatch.delenv("LLM_PRICING", raising=False)
+    return tmp_path
+
+
+def test_cost_uses_input_and_output_prices():
+    assert estimate_cost("gpt-4o", 1_000_000, 100_000) == 2.5 + 1.0
+
+
+def test_cached_tokens_are_billed_at_the_cached_price():
+    # 600k 一般輸入 + 400k 快取輸入 + 1M 輸出
+    assert estimate_cost("gpt-4o", 1_000_000, 1_000_000, cached_tokens=400_000) == 1.5 + 0.5 + 10.0
+
+
+def test_model_is_matched_by_longest_prefix():
+    assert estimate_cost("gpt-4o-2024-08-06", 1_000_000, 0) == 2.5
+    # gpt-4o-mini 同時符合 gpt-4o 與 gpt-4o-mini，取較長者
+    assert estimate_cost("gpt-4o-mini-2024-07-18", 1_000_000, 0) == 0.15
+    assert estimate_cost("gpt-4.1-mini", 1_000_000, 0) == 0.40
+
+
+def test_unknown_model_or_missing_usage_has_no_cost():
+    assert estimate_cost("llama-3-local", 1000, 1000) is None
+    assert estimate_cost(None, 1000, 1000) is None
+    assert estimate_cost("gpt-4o", None, None) is None
+
+
+def test_batch_factor_and_pricing_override(monkeypatch):
+    assert estimate_cost("gpt-4o", 1_000_000, 0, factor=llm_usage.BATCH_PRICE_FACTOR) == 1.25
+    monkeypatch.setenv("LLM_PRICING", '{"llama-3-local": {"input": 1.0, "output": 2.0}}')
+    monkeypatch.setattr(llm_usage, "_pricing", None)
+    # 沒有 cached_input 時快取 tokens 以一般輸入價格計算
+    assert estimate_cost("llama-3-local", 1_000_000, 1_000_000, cached_tokens=500_000) == 3.0
+
+
+def test_no_budget_configured_never_pauses_work():
+    llm_usage.record("summary", "primary", "gpt-4o", prompt_tokens=10_000_000, completion_tokens=0)
+    assert llm_usage.budget_exceeded() is False
+
+
+def test_usd_budget(monkeypatch):
+    monkeypatch.setattr(llm_usage, "LLM_DAILY_BUDGET_USD", 1.0)
+    llm_usage.record("summary", "primary", "gpt-4o", prompt_tokens=200_000, completion_tokens=0)
+    assert llm_usage.budget_exceeded() is False
+    llm_usage.record("summary", "primary", "gpt-4o", prompt_tokens=200_000, completion_tokens=0)
+    assert llm_usage.budget_status()["spent_usd"] == 1.0
+    assert llm_usage.budget_exceeded() is True
+
+
+def test_token_budget_counts_calls_without_a_price(monkeypatch):
+    monkeypatch.setattr(llm_usage, "LLM_DAILY_TOKEN_BUDGET", 1000)
+    llm_usage.record("summary", "primary", "llama-3-local", prompt_tokens=900, completion_tokens=50)
+    assert llm_usage.budget_exceeded() is False
+    llm_usage.record("chat", "primary", "llama-3-local", prompt_tokens=40, completion_tokens=10)
+    assert llm_usage.budget_exceeded() is True
+
+
+def test_budget_resets_at_local_midnight(monkeypatch):
+    monkeypatch.setattr(llm_usage, "LLM_DAILY_BUDGET_USD", 1.0)
+    llm_usage.record("summary", "primary", "gpt-4o", prompt_tokens=1_000_000, completion_tokens=0)
+    assert llm_usage.budget_exceeded() is True
+
+    class Tomorrow(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(days=1)
+
+    monkeypatch.setattr(llm_usage, "datetime", Tomorrow)
+    status = llm_usage.budget_status()
+    assert status["spent_usd"] == 0
+    assert status["date"] == (datetime.now() + timedelta(days=1)).date().isoformat()
+    assert llm_usage.budget_exceeded() is False
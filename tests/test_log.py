@@ -0,0 +1,60 @@
+import io
+import json
+import logging
+
+import pytest
+
+from tasks import log
+
+
+@pytest.fixture
+def fresh_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(log, "LOG_DIR", str(tmp_path / "logs"))
+    log.shutdown()
+    yield log
+    log.shutdown()
+    monkeypatch.setattr(log, "_process", None)
+
+
+class _Stream(io.StringIO):
+    def __init__(self, tty: bool):
+        super().__init__()
+        self._tty = tty
+
+    def isatty(self):
+        return self._tty
+
+
+@pytest.mark.parametrize("mode, tty, expected", [
+    ("auto", True, "text"),
+    ("auto", False, "json"),
+    ("json", True, "json"),
+    ("text", False, "text"),
+    ("1", False, "text"),
+    ("0", False, None),
+])
+def test_console_format(monkeypatch, mode, tty, expected):
+    monkeypatch.setattr(log, "LOG_CONSOLE", mode)
+    monkeypatch.setattr(log.sys, "stderr", _Stream(tty))
+    assert log._console_format() == expected
+
+
+def test_get_logger_does_not_configure_logging(fresh_log, tmp_path):
+    fresh_log.get_logger("tests.library")
+    assert fresh_log._listener is None
+    assert not (tmp_path / "logs").exists()
+
+
+def test_non_tty_stderr_receives_json(fresh_log, monkeypatch, tmp_path):
+    stream = _Stream(tty=False)
+    monkeypatch.setattr(log, "LOG_CONSOLE", "auto")
+    monkeypatch.setattr(log.sys, "stderr", stream)
+    fresh_log.setup("pytest")
+    logging.getLogger("tests.console").warning("hello", extra={"video_id": "abc"})
+    fresh_log.shutdown()
+
+    entry = json.loads(stream.getvalue().strip().splitlines()[-1])
+    assert entry["msg"] == "hello"
+    assert entry["video_id"] == "abc"
+    assert entry["process"] == "pytest"
+    assert (tmp_path / "logs" / "pytest.jsonl").exists()
@@ -0,0 +1,81 @@
+import pytest
+
+from tasks import metrics
+from tasks.metrics import Histogram, quantile, render_prometheus
+
+
+def _snapshot(values, buckets=(1.0, 2.0, 4.0)):
+    histogram = Histogram(buckets)
+    for value in values:
+        histogram.observe(value)
+    return histogram.snapshot()
+
+
+def test_quantile_of_empty_histogram_is_none():
+    assert quantile(_snapshot([]), 0.5) is None
+
+
+def test_quantile_interpolates_within_bucket():
+    snap = _snapshot([0.5] * 10)
+    # 全部落在 (0, 1]：p50 線性內插到 0.5
+    assert quantile(snap, 0.5) == pytest.approx(0.5)
+    assert quantile(snap, 1.0) == pytest.approx(1.0)
+
+
+def test_quantile_spans_buckets():
+    snap = _snapshot([0.5] * 5 + [3.0] * 5)
+    assert quantile(snap, 0.5) == pytest.approx(1.0)
+    # 第 9.5 名落在 (2, 4]，該格 5 筆中的第 4.5 筆
+    assert quantile(snap, 0.95) == pytest.approx(2.0 + 2.0 * 4.5 / 5)
+
+
+def test_quantile_in_overflow_bucket_returns_largest_bound():
+    assert quantile(_snapshot([100.0] * 3), 0.99) == 4.0
+
+
+def test_bucket_boundaries_are_inclusive():
+    snap = _snapshot([1.0, 2.0])
+    assert snap["counts"] == [1, 1, 0, 0]
+
+
+def test_render_prometheus_histogram_counter_and_gauge():
+    snap = {
+        "timestamp": 0,
+        "histograms": [{"name": "req_seconds", "labels": {"route": "/a"}, **_snapshot([0.5, 3.0, 10.0])}],
+        "counters": [{"name": "jobs_total", "labels": {}, "value": 3.0}],
+        "gauges": [{"name": "in_flight", "labels": {"kind": 'x"y'}, "value": 1.5}],
+    }
+    text = render_prometheus({"api": snap})
+    lines = text.splitlines()
+
+    assert "# TYPE req_seconds histogram" in lines
+    assert 'req_seconds_bucket{le="1",process="api",route="/a"} 1' in lines
+    assert 'req_seconds_bucket{le="2",process="api",route="/a"} 1' in lines
+    assert 'req_seconds_bucket{le="4",process="api",route="/a"} 2' in lines
+    assert 'req_seconds_bucket{le="+Inf",process="api",route="/a"} 3' in lines
+    assert 'req_seconds_sum{process="api",route="/a"} 13.5' in lines
+    assert 'req_seconds_count{process="api",route="/a"} 3' in lines
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{process="api"} 3' in lines
+    assert 'in_flight{kind="x\\"y",process="api"} 1.5' in lines
+    assert text.endswith("\n")
+
+
+def test_render_prometheus_merges_processes_under_one_family():
+    snap = {"timestamp": 0, "histograms": [], "gauges": [],
+            "counters": [{"name": "sweep_videos_total", "labels": {}, "value": 2}]}
+    text = render_prometheus({"api": snap, "worker": snap})
+    assert text.count("# TYPE sweep_videos_total counter") == 1
+    assert text.count("# HELP sweep_videos_total") == 1
+    assert 'sweep_videos_total{process="worker"} 2' in text
+
+
+def test_module_level_observe_and_reset():
+    metrics.reset()
+    metrics.observe("test_seconds", 0.2, stage="x")
+    metrics.inc("test_total", stage="x")
+    snap = metrics.snapshot()
+    assert [h["count"] for h in snap["histograms"] if h["name"] == "test_seconds"] == [1]
+    assert [c["value"] for c in snap["counters"] if c["name"] == "test_total"] == [1]
+    metrics.reset()
+    assert metrics.snapshot()["histograms"] == []
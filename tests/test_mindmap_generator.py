@@ -0,0 +1,128 @@
+import pytest
+
+from tasks import mindmap_generator
+from tasks.mindmap_generator import summary_to_mermaid, generate_mindmap
+
+SUMMARY = """## 內容摘要
+第一句。第二句！
+
+## 主要問題
+* 問題一
+  * 子問題 A
+    * 更深層 B
+* **術語**：說明文字
+
+## 有條理的內容整理
+**[成長策略]**
+* 定價
+### 小標題
+- 項目
+
+> 引言不會出現
+---
+## 自訂章節
+1. 第一
+"""
+
+
+def test_headings_and_bullets_become_nested_branches():
+    assert summary_to_mermaid(SUMMARY, "影片標題").splitlines() == [
+        "mindmap",
+        "  root((影片標題))",
+        "    📝 內容摘要",
+        "      第一句。",
+        "      第二句！",
+        "    ❓ 主要問題",
+        "      問題一",
+        "        子問題 A",
+        # 清單最多兩層，更深的項目併入第二層
+        "        更深層 B",
+        "      術語",
+        "    🗂️ 有條理的內容整理",
+        "      成長策略",
+        "        定價",
+        "      小標題",
+        "        項目",
+        "    📌 自訂章節",
+        "      第一",
+    ]
+
+
+def test_mermaid_special_characters_are_removed():
+    summary = '## 內容摘要\n* 用 (括號) [連結](https://x.invoke) {x} <b>"q"</b> `code` #tag | pipe\n'
+    lines = summary_to_mermaid(summary, "標題 (完整版) [2024]").splitlines()
+    assert lines[1] == "  root((標題 完整版 2024))"
+    leaf = lines[3].strip()
+    assert not set('()[]{}<>"`*#|') & set(leaf)
+    assert leaf.startswith("用 括號 連結")
+    assert len(leaf) <= mindmap_generator.MAX_NODE_CHARS
+
+
+def test_long_nodes_are_truncated_and_children_capped():
+    items = "\n".join(f"* 項目{i} " + "很長" * 30 for i in range(20))
+    lines = summary_to_mermaid(f"## 主要問題\n{items}\n").splitlines()
+    leaves = lines[3:]
+    assert len(leaves) == mindmap_generator.MAX_CHILDREN
+    assert all(leaf.strip().endswith("…") for leaf in leaves)
+
+
+@pytest.mark.parametrize("summary", ["", "\n\n", "## 內容摘要\n## 主要問題\n", "沒有章節的文字\n* 項目\n"])
+def test_empty_or_heading_only_summary_has_nothing_to_draw(summary):
+    assert summary_to_mermaid(summary) is None
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(mindmap_generator, "MINDMAP_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    prompts = []
+
+    def chat_completion(messages, **kwargs):
+        prompts.append(messages[-1]["content"])
+        return "```mermaid\nmindmap\n  root((來自 LLM))\n```"
+
+    monkeypatch.setattr(mindmap_generator, "is_configured", lambda: True)
+    monkeypatch.setattr(mindmap_generator, "chat_completion", chat_completion)
+    monkeypatch.setattr(mindmap_generator, "get_transcript_text", lambda video_id: "逐字稿內容")
+    return prompts
+
+
+def _write_summary(video_id, text):
+    with open(mindmap_generator.get_summary_path(video_id), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_summary_mode_does_not_call_the_llm(workdir, llm):
+    _write_summary("vid", SUMMARY)
+    result = generate_mindmap("vid", mode="summary")
+    assert result.startswith("mindmap\n  root((影片主題))")
+    assert llm == []
+    assert mindmap_generator.get_cached_mindmap("vid") == result
+
+
+def test_falls_back_to_transcript_without_a_summary(workdir, llm):
+    assert generate_mindmap("vid", mode="summary") == "mindmap\n  root((來自 LLM))"
+    assert len(llm) == 1 and "逐字稿內容" in llm[0]
+
+
+def test_falls_back_to_transcript_when_the_summary_has_no_sections(workdir, llm):
+    _write_summary("vid", "## 內容摘要\n")
+    assert generate_mindmap("vid", mode="summary") == "mindmap\n  root((來自 LLM))"
+    assert "逐字稿內容" in llm[0]
+
+
+def test_summary_llm_mode_sends_the_summary(workdir, llm):
+    _write_summary("vid", SUMMARY)
+    generate_mindmap("vid", mode="summary_llm")
+    assert "第一句" in llm[0] and "逐字稿內容" not in llm[0]
+
+
+def test_no_summary_no_transcript_returns_none(workdir, llm, monkeypatch):
+    monkeypatch.setattr(mindmap_generator, "get_transcript_text", lambda video_id: None)
+    assert generate_mindmap("vid") is None
+    assert not mindmap_generator.mindmap_exists("vid")
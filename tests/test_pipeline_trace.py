@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from tasks import pipeline_trace
+from tasks.pipeline_trace import Trace
+
+
+@pytest.fixture(autouse=True)
+def trace_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_trace, "TRACE_DB", str(tmp_path / "traces.sqlite"))
+    return tmp_path
+
+
+def _record(video_id, channel="A", outcome="summarized", steps=None, prompt_tokens=None,
+            transcript_source=None, finished_at=None):
+    trace = Trace(video_id, channel=channel, source="sweep")
+    for name, seconds in (steps or {}).items():
+        trace.add_step(name, seconds)
+    trace.annotate(prompt_tokens=prompt_tokens, completion_tokens=10 if prompt_tokens else None,
+                   transcript_source=transcript_source)
+    pipeline_trace.finish(trace, outcome)
+    if finished_at is not None:
+        with pipeline_trace._connect() as conn:
+            conn.execute("UPDATE traces SET finished_at = ? WHERE video_id = ?", (finished_at, video_id))
+
+
+def test_stage_and_annotate_write_to_the_active_trace():
+    trace = pipeline_trace.begin({"id": "vid", "title": "標題", "channel_title": "頻道"}, source="sweep")
+    with pipeline_trace.activate(trace):
+        with pipeline_trace.stage("llm"):
+            pass
+        with pipeline_trace.stage("llm"):
+            pass
+        pipeline_trace.annotate(prompt_tokens=100, completion_tokens=20)
+        pipeline_trace.annotate(prompt_tokens=50, completion_tokens=5)
+    pipeline_trace.annotate(prompt_tokens=999)  # 不在管線中：不做任何事
+    pipeline_trace.finish(trace, "summarized")
+
+    [row] = pipeline_trace.get_traces("vid")
+    assert row["channel"] == "頻道" and row["source"] == "sweep" and row["outcome"] == "summarized"
+    assert (row["prompt_tokens"], row["completion_tokens"]) == (150, 25)
+    assert set(row["steps"]) == {"llm"}
+
+
+def test_stats_groups_by_channel_with_step_percentiles():
+    for i in range(20):
+        _record(f"a{i}", "A", steps={"llm": float(i + 1), "transcript": 0.5}, prompt_tokens=100, transcript_source="api")
+    _record("b0", "B", outcome="no_transcript", steps={"transcript": 2.0})
+    _record("b1", "B", outcome="llm_failed", transcript_source="yt-dlp")
+
+    result = pipeline_trace.stats(hours=1, group_by="channel")
+    assert result["total_videos"] == 22
+    a, b = result["groups"]["A"], result["groups"]["B"]
+
+    assert a["videos"] == 20
+    assert a["outcomes"] == {"summarized": 20}
+    assert a["transcript_sources"] == {"api": 20}
+    assert (a["prompt_tokens"], a["completion_tokens"]) == (2000, 200)
+    assert a["steps"]["llm"] == {"count": 20, "total_s": 210.0, "avg_s": 10.5, "p95_s": 19.0}
+    assert a["steps"]["transcript"]["p95_s"] == 0.5
+
+    assert b["outcomes"] == {"no_transcript": 1, "llm_failed": 1}
+    assert b["transcript_sources"] == {"yt-dlp": 1}
+    assert b["steps"] == {"transcript": {"count": 1, "total_s": 2.0, "avg_s": 2.0, "p95_s": 2.0}}
+
+
+def test_stats_by_outcome_and_day_respect_the_time_window():
+    now = time.time()
+    _record("today", outcome="summarized")
+    _record("yesterday", outcome="duplicate", finished_at=now - 86400)
+    _record("old", outcome="summarized", finished_at=now - 10 * 86400)
+
+    by_outcome = pipeline_trace.stats(hours=48, group_by="outcome")
+    assert by_outcome["total_videos"] == 2
+    assert {k: g["videos"] for k, g in by_outcome["groups"].items()} == {"summarized": 1, "duplicate": 1}
+
+    by_day = pipeline_trace.stats(hours=48, group_by="day")
+    assert sorted(by_day["groups"]) == sorted({
+        time.strftime("%Y-%m-%d", time.localtime(now)),
+        time.strftime("%Y-%m-%d", time.localtime(now - 86400)),
+    })
+
+
+def test_stats_rejects_unknown_grouping():
+    with pytest.raises(ValueError):
+        pipeline_trace.stats(group_by="video")
+
+
+def test_finish_prunes_traces_past_retention(monkeypatch):
+    _record("old", finished_at=time.time() - 2 * 86400)
+    monkeypatch.setattr(pipeline_trace, "TRACE_RETENTION_DAYS", 1)
+    _record("new")
+    assert pipeline_trace.get_traces("old") == []
+    assert len(pipeline_trace.get_traces("new")) == 1
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+
+import pytest
+
+from tasks.process_lock import ProcessLock, locked
+
+
+@pytest.fixture
+def lock_path(tmp_path):
+    return str(tmp_path / "test.lock")
+
+
+def test_is_locked_reflects_holder(lock_path):
+    holder = ProcessLock(lock_path)
+    assert not ProcessLock(lock_path).is_locked()
+    assert holder.acquire()
+    assert ProcessLock(lock_path).is_locked()
+    assert ProcessLock(lock_path).owner_pid() == os.getpid()
+    holder.release()
+    assert not ProcessLock(lock_path).is_locked()
+    assert ProcessLock(lock_path).owner_pid() is None
+
+
+def test_is_locked_does_not_take_the_lock(lock_path):
+    probe = ProcessLock(lock_path)
+    contender = ProcessLock(lock_path)
+    # 探測不會取得鎖，也不會寫入鎖檔
+    assert not probe.is_locked()
+    assert contender.acquire()
+    with open(lock_path) as f:
+        before = f.read()
+    assert probe.is_locked()
+    with open(lock_path) as f:
+        assert f.read() == before
+    contender.release()
+
+
+def test_stale_pid_is_not_locked(lock_path):
+    with open(lock_path, 'w') as f:
+        f.write("999999999")
+    assert not ProcessLock(lock_path).is_locked()
+
+
+def test_non_blocking_acquire_fails_while_held(lock_path):
+    holder = ProcessLock(lock_path)
+    assert holder.acquire()
+    assert not ProcessLock(lock_path).acquire()
+    assert not ProcessLock(lock_path).acquire(timeout=0.05)
+    holder.release()
+    assert ProcessLock(lock_path).acquire()
+
+
+def test_locked_serializes_threads(lock_path):
+    active = []
+    overlaps = []
+
+    def worker():
+        with locked(lock_path):
+            active.append(1)
+            if len(active) > 1:
+                overlaps.append(1)
+            time.sleep(0.01)
+            active.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not overlaps
+
+
+def test_locked_times_out(lock_path):
+    holder = ProcessLock(lock_path)
+    holder.acquire()
+    with pytest.raises(TimeoutError):
+        with locked(lock_path, timeout=0.05):
+            pass
+    holder.release()
@@ -0,0 +1,98 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+from tasks import profiler
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(profiler, "_backend", lambda: "cprofile")
+    monkeypatch.setattr(profiler, "_state_checked", 0.0)
+    monkeypatch.setattr(profiler, "_state_mtime", None)
+    monkeypatch.setattr(profiler, "_state", {"enabled": False, "targets": [], "until": None})
+
+
+def _profiles():
+    return [p["name"] for p in profiler.list_profiles()]
+
+
+@profiler.profiled("check_updates")
+def sync_work(x):
+    return x * 2
+
+
+@profiler.profiled("check_updates")
+async def async_work(x):
+    await asyncio.sleep(0)
+    return x + 1
+
+
+@profiler.profiled("check_updates")
+def streamed():
+    for i in range(3):
+        # 迭代期間 profile 仍在進行
+        yield i, profiler._capture_lock.locked()
+
+
+@profiler.profiled("check_updates")
+async def async_streamed():
+    for i in range(3):
+        await asyncio.sleep(0)
+        yield i, profiler._capture_lock.locked()
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+def test_off_by_default_writes_nothing():
+    assert sync_work(2) == 4
+    assert asyncio.run(async_work(2)) == 3
+    assert _profiles() == []
+
+
+def test_on_profiles_sync_and_async_functions():
+    profiler.enable(["check_updates"])
+    assert sync_work(2) == 4
+    assert asyncio.run(async_work(2)) == 3
+    profiles = _profiles()
+    assert len(profiles) == 2
+    assert all(name.startswith("check_updates-") and name.endswith(".prof") for name in profiles)
+
+
+def test_generators_are_profiled_for_the_whole_iteration():
+    profiler.enable(["check_updates"])
+    assert list(streamed()) == [(0, True), (1, True), (2, True)]
+    assert asyncio.run(_collect(async_streamed())) == [(0, True), (1, True), (2, True)]
+    assert len(_profiles()) == 2
+    assert not profiler._capture_lock.locked()
+
+
+def test_only_enabled_targets_are_profiled():
+    profiler.enable(["/api/videos"])
+    assert sync_work(2) == 4
+    assert _profiles() == []
+
+
+def test_disable_and_expiry_turn_profiling_off():
+    profiler.enable(["check_updates"])
+    profiler.disable()
+    sync_work(1)
+    assert not profiler.status()["enabled"]
+
+    # 開啟時間已過 (模擬 PROFILE_DEFAULT_DURATION 到期)
+    profiler.enable(["check_updates"])
+    profiler._save_state({**profiler._load_state(), "until": time.time() - 1})
+    sync_work(1)
+    assert not profiler.is_active("check_updates")
+    assert _profiles() == []
+
+
+def test_unknown_target_is_rejected():
+    with pytest.raises(ValueError):
+        profiler.enable(["/api/unknown"])
+    assert not os.path.exists(profiler.PROFILE_STATE_FILE)
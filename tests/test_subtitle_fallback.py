@@ -0,0 +1,96 @@
+from tasks.subtitle_fallback import parse_vtt_stream, _select_track
+
+ROLLING_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.000 align:start position:0%
+ 
+hello<00:00:00.500><c> world</c>
+
+00:00:02.000 --> 00:00:02.010 align:start position:0%
+hello world
+ 
+
+00:00:02.010 --> 00:00:04.000 align:start position:0%
+hello world
+this<00:00:02.500><c> is</c><00:00:03.000><c> new</c>
+
+00:00:04.000 --> 00:00:04.010 align:start position:0%
+this is new
+ 
+"""
+
+
+def _texts(vtt: str) -> list[str]:
+    return [segment["text"] for segment in parse_vtt_stream(vtt.splitlines(keepends=True))]
+
+
+def test_rolling_auto_captions_are_deduplicated():
+    segments = parse_vtt_stream(ROLLING_VTT.splitlines(keepends=True))
+    assert [s["text"] for s in segments] == ["hello world", "this is new"]
+    assert segments[1]["start"] == 2.01
+    assert segments[1]["duration"] == 1.99
+
+
+def test_short_repeats_in_separate_cues_are_kept():
+    vtt = """WEBVTT
+
+1
+00:00:01.000 --> 00:00:02.000
+Yeah.
+
+2
+00:00:02.000 --> 00:00:03.000
+Right.
+
+3
+00:00:03.000 --> 00:00:04.000
+Yeah.
+"""
+    assert _texts(vtt) == ["Yeah.", "Right.", "Yeah."]
+
+
+def test_tags_entities_and_metadata_are_stripped():
+    vtt = """WEBVTT
+
+NOTE a comment
+
+01:00:00.000 --> 01:00:01.500
+<v Speaker>Fish &amp; chips</v>
+"""
+    segments = parse_vtt_stream(vtt.splitlines(keepends=True))
+    assert segments == [{"text": "Fish & chips", "start": 3600.0, "duration": 1.5}]
+
+
+def _track(lang):
+    return [{"ext": "json3", "url": f"https://subs.invalid/{lang}.json3"},
+            {"ext": "vtt", "url": f"https://subs.invalid/{lang}.vtt"}]
+
+
+def test_live_chat_tracks_are_skipped():
+    info = {
+        "subtitles": {"live_chat": [{"ext": "vtt", "url": "https://subs.invalid/chat"}]},
+        "automatic_captions": {"en": _track("en")},
+    }
+    assert _select_track(info) == ("en", "https://subs.invalid/en.vtt")
+
+
+def test_manual_subtitles_win_over_automatic_captions():
+    info = {
+        "subtitles": {"en": _track("en")},
+        # 自動字幕的語言優先順序較高，仍以人工字幕為準
+        "automatic_captions": {"zh-TW": _track("zh-TW")},
+    }
+    assert _select_track(info) == ("en", "https://subs.invalid/en.vtt")
+
+
+def test_language_priority_within_a_source():
+    info = {"subtitles": {"fr": _track("fr"), "en": _track("en"), "zh-Hant": _track("zh-Hant")}}
+    assert _select_track(info)[0] == "zh-Hant"
+    assert _select_track({"subtitles": {"fr": _track("fr")}})[0] == "fr"
+
+
+def test_no_usable_track():
+    assert _select_track({}) == (None, None)
+    assert _select_track({"subtitles": {"en": [{"ext": "json3", "url": "x"}]}}) == (None, None)
@@ -0,0 +1,63 @@
+import os
+
+from tasks import summarizer
+
+
+def test_save_summary_leaves_partial_file_untouched_until_final_is_in_place(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    partial_path = summarizer.get_partial_summary_path("vid")
+    final_path = summarizer.get_summary_path("vid")
+    with open(partial_path, "w", encoding="utf-8") as f:
+        f.write("串流中的部分內容")
+
+    seen = []
+    real_replace = os.replace
+
+    def spy_replace(src, dst):
+        # 替換正式檔的當下，串流讀取者仍在讀的 .part 不可被改寫
+        with open(partial_path, encoding="utf-8") as f:
+            seen.append((src, dst, f.read()))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(summarizer.os, "replace", spy_replace)
+    summarizer.save_summary("vid", "# 最終摘要")
+
+    assert seen == [(f"{final_path}.tmp", final_path, "串流中的部分內容")]
+    with open(final_path, encoding="utf-8") as f:
+        assert f.read() == "# 最終摘要"
+    assert not os.path.exists(partial_path)
+    assert not os.path.exists(f"{final_path}.tmp")
+
+
+def test_save_summary_without_partial_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    summarizer.save_summary("vid", "內容")
+    with open(summarizer.get_summary_path("vid"), encoding="utf-8") as f:
+        assert f.read() == "內容"
+
+
+def _stream_then_fail(messages, **kwargs):
+    yield "## 內容摘要\n"
+    yield "前半段"
+    raise ConnectionError("stream reset")
+
+
+def test_summarize_video_mid_stream_failure_keeps_partial_and_saves_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(summarizer, "is_configured", lambda: True)
+    monkeypatch.setattr(summarizer, "chat_completion_stream", _stream_then_fail)
+
+    assert summarizer.summarize_video("vid", "標題", transcript_text="逐字稿") is None
+
+    # 不完整的內容不會成為正式摘要，影片仍算是「還沒有摘要」，之後會被重新摘要
+    assert not os.path.exists(summarizer.get_summary_path("vid"))
+    with open(summarizer.get_partial_summary_path("vid"), encoding="utf-8") as f:
+        assert f.read() == "## 內容摘要\n前半段"
+
+
+def test_summarize_video_complete_stream(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(summarizer, "is_configured", lambda: True)
+    monkeypatch.setattr(summarizer, "chat_completion_stream", lambda messages, **kwargs: iter(["```markdown\n", "## 內容摘要\n完整", "```"]))
+
+    assert summarizer.summarize_video("vid", "標題", transcript_text="逐字稿") == "## 內容摘要\n完整"
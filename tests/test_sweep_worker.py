@@ -0,0 +1,31 @@
+import sqlite3
+import threading
+
+from tasks import sweep_worker
+
+
+def test_heartbeat_survives_a_locked_control_db(monkeypatch):
+    worker = sweep_worker.SweepWorker()
+    calls = []
+    beats = threading.Event()
+
+    def set_worker_status(pid, status, command_id=None):
+        calls.append(status)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        if len(calls) >= 3:
+            beats.set()
+
+    monkeypatch.setattr(sweep_worker, "HEARTBEAT_INTERVAL", 0.01)
+    monkeypatch.setattr(sweep_worker.control_channel, "set_worker_status", set_worker_status)
+    monkeypatch.setattr(sweep_worker.metrics, "save_snapshot", lambda: None)
+
+    thread = threading.Thread(target=worker._heartbeat_loop, daemon=True)
+    thread.start()
+    try:
+        # 第一次寫入失敗後，心跳仍繼續
+        assert beats.wait(timeout=5)
+        assert thread.is_alive()
+    finally:
+        worker.stop_event.set()
+        thread.join(timeout=5)
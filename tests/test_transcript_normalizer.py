@@ -0,0 +1,46 @@
+from tasks.transcript_normalizer import clean_text, normalize_segments, segments_to_text, split_tokens
+
+
+def _normalize(*texts):
+    raw = [{'text': text, 'start': i * 2.0, 'duration': 2.0} for i, text in enumerate(texts)]
+    return segments_to_text(normalize_segments(raw))
+
+
+def test_keeps_zh_tw_reduplication():
+    text = "謝謝大家，我們剛剛慢慢看看 / 媽媽說常常要研究研究。"
+    assert _normalize(text) == text
+
+
+def test_keeps_repeated_english_words():
+    text = "I had had enough, very very tired."
+    assert _normalize(text) == text
+
+
+def test_strips_rolling_caption_overlap():
+    assert _normalize("we are going to talk about", "talk about scaling laws today.") == \
+        "we are going to talk about scaling laws today."
+
+
+def test_strips_rolling_caption_overlap_cjk():
+    assert _normalize("今天我們來談談", "來談談模型的擴展。") == "今天我們來談談模型的擴展。"
+
+
+def test_short_cjk_repeat_at_boundary_is_kept():
+    # 交界處只重複 2 個字 (低於 3 字門檻) 視為正常用語
+    assert _normalize("大家好謝謝", "謝謝你們。") == "大家好謝謝謝謝你們。"
+
+
+def test_removes_non_speech_markers():
+    assert clean_text("[Music] hello [音樂] world (applause) ♪ la la ♪") == "hello world"
+
+
+def test_keeps_bracketed_speech():
+    assert clean_text("see [Figure 2] and reference [1]") == "see [Figure 2] and reference [1]"
+
+
+def test_removes_fillers():
+    assert clean_text("um so uh this is 嗯，重點") == "so this is 重點"
+
+
+def test_split_tokens_cjk_chars_and_words():
+    assert split_tokens("GPT 模型 works") == ["GPT", "模", "型", "works"]